@@ -0,0 +1,333 @@
+############################################# ANALYTICS MODULE ################################################
+"""
+Incrementally materialized attendance aggregates.
+
+Attendance files only ever grow while a day is in progress, so each file is
+tracked by its size and read offset: a refresh parses only the bytes appended
+since the last one and folds their group-by counts into the file's partial
+aggregates. A file that changed in any other way is re-read on its own. The
+partials are kept per file and combined with vectorized pandas group-bys when
+a summary is requested, and they are cached on disk so a restart does not
+re-read years of history. The cache is a pickle, so it is kept in the user's own
+cache directory (ATTENDANCE_CACHE_DIR, else the platform's per-user cache
+folder) rather than in the shared Attendance folder, one file per attendance
+folder, and read and written under its file lock.
+
+Rates come from the per-session roster summaries (Attendance/Sessions_*.csv):
+attended expected students over expected students.
+"""
+
+import io
+import os
+import glob
+import pickle
+import hashlib
+import threading
+import numpy as np
+import pandas as pd
+from file_locks import FileLock
+from session_roster import StudentIndex
+
+COLUMNS = ['PRN', 'First Name', 'Last Name', 'Subject', 'Faculty', 'Date', 'Time', 'Department', 'Year']
+CACHE_VERSION = 2
+
+
+def default_cache_file(attendance_dir):
+    """Per-user analytics cache path for an attendance folder"""
+    root = os.environ.get('ATTENDANCE_CACHE_DIR')
+    if not root:
+        base = (os.environ.get('LOCALAPPDATA') or os.environ.get('XDG_CACHE_HOME')
+                or os.path.join(os.path.expanduser('~'), '.cache'))
+        root = os.path.join(base, 'attendance-system')
+    key = hashlib.sha1(os.path.abspath(attendance_dir).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(root, f"analytics_{key}.pkl")
+
+
+def read_attendance_frame(text, header):
+    """Parse attendance CSV rows (without the header line) into the standard columns
+
+    Legacy files have an "Id,,Name,,Date,,Time" header with dates as dd-mm-yyyy
+    and no subject; their rows are kept with an empty subject.
+    """
+    frame = pd.read_csv(io.StringIO(text), header=None, names=range(max(len(header), len(COLUMNS))),
+                        dtype=str, keep_default_na=False, on_bad_lines='skip').fillna('')
+    if header[:1] == ['Id']:
+        # Skip the empty separator columns of the legacy layout
+        column = {name: n for n, name in enumerate(header) if name}
+        frame = pd.DataFrame({'PRN': frame[column['Id']],
+                              'First Name': frame[column['Name']] if 'Name' in column else '',
+                              'Date': frame[column['Date']].str.replace('-', '/') if 'Date' in column else '',
+                              'Time': frame[column['Time']] if 'Time' in column else ''})
+        return frame.reindex(columns=COLUMNS, fill_value='')
+    frame = frame.iloc[:, :len(COLUMNS)]
+    frame.columns = COLUMNS
+    return frame
+
+
+class FilePartial:
+    """Aggregates of one attendance file and how far it has been read"""
+
+    def __init__(self):
+        self.signature = None
+        self.offset = 0
+        self.header = None
+        self.records = pd.Series(dtype=np.int64)     # (Date, Subject, Department) -> rows
+        self.students = pd.Series(dtype=np.int64)    # PRN -> rows
+        self.day_students = {}                       # Date -> set of PRNs
+        self.sessions = {}                           # Date -> set of (Subject, Time)
+
+    def fold(self, frame, departments):
+        """Add the counts of newly read rows and return them as a FilePartial delta"""
+        delta = FilePartial()
+        if frame.empty:
+            return delta
+        # Rows written without a department take it from the registry
+        frame = frame.assign(Department=frame['Department'].where(
+            frame['Department'] != '', frame['PRN'].map(departments).fillna('')))
+        delta.records = frame.groupby(['Date', 'Subject', 'Department']).size()
+        delta.students = frame.groupby('PRN').size()
+        for date, group in frame.groupby('Date'):
+            delta.day_students[date] = set(group['PRN'])
+            delta.sessions[date] = set(zip(group['Subject'], group['Time']))
+        self.merge(delta)
+        return delta
+
+    def merge(self, delta, sign=1):
+        """Add (or with sign=-1 remove) another partial's counts; sets are only ever added"""
+        self.records = add_counts(self.records, delta.records, sign)
+        self.students = add_counts(self.students, delta.students, sign)
+        if sign > 0:
+            for date, prns in delta.day_students.items():
+                self.day_students.setdefault(date, set()).update(prns)
+            for date, held in delta.sessions.items():
+                self.sessions.setdefault(date, set()).update(held)
+
+
+def add_counts(total, delta, sign=1):
+    """Add a count Series into another, dropping keys that fall to zero"""
+    if delta.empty:
+        return total
+    if total.empty:
+        return delta * sign
+    total = total.add(delta * sign, fill_value=0).astype(np.int64)
+    return total[total != 0] if sign < 0 else total
+
+
+class AttendanceAnalytics:
+    """Per-day, per-subject, per-department and per-student attendance aggregates"""
+
+    def __init__(self, attendance_dir="Attendance", cache_file=None, student_index=None):
+        self.attendance_dir = attendance_dir
+        self.cache_file = cache_file or default_cache_file(attendance_dir)
+        self.student_index = student_index or StudentIndex()
+        self.lock = threading.Lock()
+        self.partials = {}
+        self.totals = FilePartial()  # all partials combined, kept up to date as files change
+        self.summaries = {}  # session summary path -> (signature, DataFrame)
+        self.held = None     # all session summaries combined, rebuilt when one changes
+        self.load_cache()
+
+    def load_cache(self):
+        if not os.path.isfile(self.cache_file):
+            return
+        try:
+            with FileLock(self.cache_file):
+                with open(self.cache_file, 'rb') as file:
+                    version, partials, totals, summaries = pickle.load(file)
+            if version == CACHE_VERSION:
+                self.partials, self.totals, self.summaries = partials, totals, summaries
+        except (OSError, EOFError, pickle.UnpicklingError, ValueError, AttributeError):
+            pass
+
+    def save_cache(self):
+        os.makedirs(os.path.dirname(self.cache_file) or '.', exist_ok=True)
+        with FileLock(self.cache_file):
+            tmp_path = f"{self.cache_file}.tmp{os.getpid()}"
+            with open(tmp_path, 'wb') as file:
+                pickle.dump((CACHE_VERSION, self.partials, self.totals, self.summaries), file,
+                            pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.cache_file)
+
+    def registry_frame(self):
+        """Registry columns needed for names, departments and per-student rates"""
+        rows = list(self.student_index.refresh().values())
+        frame = pd.DataFrame({
+            'PRN': [r.get('PRN', r.get('ID', '')) or '' for r in rows],
+            'Name': [f"{r.get('First Name', r.get('NAME', '')) or ''} {r.get('Last Name', '') or ''}".strip()
+                     for r in rows],
+            'Department': [(r.get('Department') or '').strip() for r in rows],
+            'Year': [(r.get('Year') or '').strip() for r in rows],
+            'Semester': [(r.get('Semester') or '').strip() for r in rows]
+        })
+        return frame.drop_duplicates('PRN', keep='last')
+
+    def refresh(self):
+        """Fold new attendance rows and changed session summaries into the aggregates
+
+        Returns the number of files that had to be read.
+        """
+        with self.lock:
+            departments = self.registry_frame().set_index('PRN')['Department']
+            changed = rebuilt = 0
+            paths = (glob.glob(os.path.join(self.attendance_dir, "Attendance_*.csv"))
+                     + glob.glob(os.path.join(self.attendance_dir, "Segments", "Attendance_*.csv")))
+            for path in paths:
+                status = self.refresh_file(path, departments)
+                changed += status != 'unchanged'
+                rebuilt += status == 'rebuilt'
+            for path in set(self.partials) - set(paths):
+                self.remove_partial(self.partials.pop(path))
+                rebuilt += 1
+
+            summary_paths = glob.glob(os.path.join(self.attendance_dir, "Sessions_*.csv"))
+            for path in summary_paths:
+                signature = self.signature(path)
+                if self.summaries.get(path, (None,))[0] != signature:
+                    self.summaries[path] = (signature, pd.read_csv(path, dtype=str, keep_default_na=False))
+                    self.held = None
+                    rebuilt += 1
+            for path in set(self.summaries) - set(summary_paths):
+                del self.summaries[path]
+                self.held = None
+                rebuilt += 1
+
+            # Appends are cheap to pick up again from the cached offsets, so the
+            # cache is only rewritten when whole files had to be read
+            if rebuilt:
+                try:
+                    self.save_cache()
+                except OSError as e:
+                    print(f"Error saving analytics cache: {e}")
+            return changed + rebuilt
+
+    @staticmethod
+    def signature(path):
+        stat = os.stat(path)
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def refresh_file(self, path, departments):
+        """Read only what was appended to a file since the last refresh
+
+        Returns 'unchanged', 'appended' or 'rebuilt'.
+        """
+        signature = self.signature(path)
+        partial = self.partials.get(path)
+        if partial is not None and partial.signature == signature:
+            return 'unchanged'
+        status = 'appended'
+        if partial is None or signature[1] < partial.offset or signature[2] != partial.signature[2]:
+            # New, truncated or replaced (compacted segments are rewritten by
+            # rename): start over for this file only
+            if partial is not None:
+                self.remove_partial(partial)
+            partial = FilePartial()
+            status = 'rebuilt'
+
+        with open(path, 'rb') as file:
+            file.seek(partial.offset)
+            data = file.read()
+        # A partly written last line is left for the next refresh
+        data = data[:data.rfind(b'\n') + 1]
+        partial.offset += len(data)
+        text = data.decode('utf-8', errors='replace')
+        if partial.header is None and text:
+            header, text = text.split('\n', 1)
+            partial.header = header.strip().split(',')
+        if text.strip():
+            self.totals.merge(partial.fold(read_attendance_frame(text, partial.header), departments))
+        partial.signature = signature
+        self.partials[path] = partial
+        return status
+
+    def remove_partial(self, partial):
+        """Take a file's counts out of the totals and rebuild the sets of its days"""
+        self.totals.merge(partial, sign=-1)
+        for date in partial.day_students:
+            # The same day can appear in more than one file (the legacy naming)
+            others = [p for p in self.partials.values() if p is not partial and date in p.day_students]
+            self.totals.day_students[date] = set().union(*[p.day_students[date] for p in others])
+            self.totals.sessions[date] = set().union(*[p.sessions[date] for p in others])
+            if not others:
+                del self.totals.day_students[date], self.totals.sessions[date]
+
+    def session_summaries(self):
+        """All session roster summaries as one frame with numeric counts"""
+        if self.held is None:
+            frames = [frame for _, frame in self.summaries.values()]
+            held = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(
+                columns=['Subject', 'Date', 'Department', 'Year', 'Semester', 'Expected', 'Attended'])
+            self.held = held.assign(Expected=pd.to_numeric(held['Expected'], errors='coerce').fillna(0).astype(np.int64),
+                                    Attended=pd.to_numeric(held['Attended'], errors='coerce').fillna(0).astype(np.int64))
+        return self.held
+
+    def get_summary(self):
+        """Build the daily, subject, department and student tables from the aggregates"""
+        with self.lock:
+            records = self.totals.records
+            students = self.totals.students
+            day_students = {date: len(prns) for date, prns in self.totals.day_students.items()}
+            day_sessions = dict(self.totals.sessions)
+            held = self.session_summaries()
+        registry = self.registry_frame()
+
+        if records.empty:
+            records = pd.Series(dtype=np.int64, index=pd.MultiIndex.from_tuples(
+                [], names=['Date', 'Subject', 'Department']))
+        records.index.names = ['Date', 'Subject', 'Department']
+        sessions = pd.DataFrame([(date, subject) for date, held_sessions in day_sessions.items()
+                                 for subject, _ in held_sessions], columns=['Date', 'Subject'])
+
+        def with_rate(table, key):
+            rates = held.groupby(key)[['Expected', 'Attended']].sum()
+            table = table.join(rates, how='outer').fillna(0).astype(np.int64)
+            table['Rate'] = np.where(table['Expected'] > 0,
+                                     np.round(table['Attended'] / table['Expected'].where(table['Expected'] > 0, 1) * 100, 1),
+                                     np.nan)
+            return table
+
+        daily = pd.DataFrame({'Records': records.groupby(level='Date').sum(),
+                              'Students': pd.Series(day_students, dtype=np.int64),
+                              'Sessions': pd.Series({date: len(held) for date, held in day_sessions.items()}, dtype=np.int64)})
+        daily = with_rate(daily, 'Date')
+        daily = daily.iloc[np.argsort(pd.to_datetime(daily.index, format='%d/%m/%Y', errors='coerce').values,
+                                      kind='stable')]
+
+        subjects = pd.DataFrame({'Records': records.groupby(level='Subject').sum(),
+                                 'Sessions': sessions.groupby('Subject').size()})
+        subjects = with_rate(subjects.drop(index='', errors='ignore'), 'Subject')
+
+        departments = pd.DataFrame({'Records': records.groupby(level='Department').sum()})
+        departments = with_rate(departments.drop(index='', errors='ignore'),
+                                held['Department'].replace('', 'All'))
+
+        # A student was expected at every session whose cohort filters they match
+        student_table = registry.set_index('PRN')[['Name', 'Department']].copy()
+        student_table['Attended'] = students.reindex(student_table.index).fillna(0).astype(np.int64)
+        expected = np.zeros(len(student_table), dtype=np.int64)
+        if not held.empty:
+            cohorts = held.groupby(['Department', 'Year', 'Semester']).size()
+            for (department, year, semester), count in cohorts.items():
+                match = np.ones(len(registry), dtype=bool)
+                for column, value in (('Department', department), ('Year', year), ('Semester', semester)):
+                    if value:
+                        match &= registry[column].str.lower().values == value.lower()
+                expected += match * count
+        student_table['Expected'] = expected
+        student_table['Rate'] = np.where(expected > 0,
+                                         np.round(student_table['Attended'] / np.maximum(expected, 1) * 100, 1),
+                                         np.nan)
+
+        total_expected = held['Expected'].sum()
+        return {
+            'totals': {
+                'records': int(records.sum()),
+                'days': int(len(daily)),
+                'sessions': int(len(sessions)),
+                'students': int(len(student_table)),
+                'attendance_rate': round(float(held['Attended'].sum() / total_expected * 100), 1) if total_expected else None
+            },
+            'daily': daily,
+            'subjects': subjects.sort_values('Records', ascending=False),
+            'departments': departments.sort_values('Records', ascending=False),
+            'students': student_table.sort_values(['Rate', 'Attended'], ascending=[True, True], na_position='last')
+        }
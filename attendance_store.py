@@ -0,0 +1,312 @@
+############################################# ATTENDANCE STORE MODULE ################################################
+"""
+Partitioned attendance storage.
+
+Attendance is written to one CSV partition per day (Attendance_dd_mm_yyyy.csv).
+Once a day is over, the compactor merges its partition into a per-month
+segment (Segments/Attendance_yyyy_mm.csv) sorted by date and time, and records
+the byte range of every day in a small manifest (manifest.json). A date range
+query therefore opens one segment per month, seeks straight to the days it
+needs, and adds any daily partitions that have not been compacted yet.
+
+Files in the older layout (Attendance_dd-mm-yyyy.csv with an "Id,,Name,,Date,,Time"
+header) are read as well. The compactor folds them into the segments in
+the standard 9-column format and moves the originals to Legacy/.
+"""
+
+import os
+import io
+import csv
+import json
+import shutil
+import datetime
+import threading
+from file_locks import FileLock, atomic_write
+
+COLUMNS = ['PRN', 'First Name', 'Last Name', 'Subject', 'Faculty', 'Date', 'Time', 'Department', 'Year']
+MANIFEST_VERSION = 1
+
+
+def parse_date(date):
+    """Parse dd/mm/yyyy (or dd-mm-yyyy / dd_mm_yyyy) into a date, or None"""
+    try:
+        return datetime.datetime.strptime(date.replace('-', '/').replace('_', '/'), '%d/%m/%Y').date()
+    except (ValueError, AttributeError):
+        return None
+
+
+def format_date(day):
+    return day.strftime('%d/%m/%Y')
+
+
+def day_key(date):
+    """Canonical dd/mm/yyyy form of a date string (e.g. "1/1/2025" -> "01/01/2025"), or None"""
+    day = parse_date(date)
+    return format_date(day) if day else None
+
+
+def normalize_rows(rows, header):
+    """Convert rows of either attendance layout into the standard 9 columns"""
+    if header[:1] == ['Id']:
+        column = {name: n for n, name in enumerate(header) if name}
+
+        def field(row, name):
+            n = column.get(name)
+            return row[n] if n is not None and n < len(row) else ''
+
+        for row in rows:
+            if row:
+                yield [field(row, 'Id'), field(row, 'Name'), '', '', '',
+                       field(row, 'Date').replace('-', '/'), field(row, 'Time'), '', '']
+    else:
+        for row in rows:
+            if row:
+                yield (row + [''] * len(COLUMNS))[:len(COLUMNS)]
+
+
+def row_key(row):
+    """Identity of an attendance record: one student per subject session"""
+    return (row[0], row[3], row[5], row[6])
+
+
+def row_order(row):
+    return (parse_date(row[5]) or datetime.date.min, row[6], row[3], row[0])
+
+
+class AttendanceStore:
+    """Reads and compacts the day partitions, monthly segments and legacy files"""
+
+    def __init__(self, root="Attendance"):
+        self.root = root
+        self.segment_dir = os.path.join(root, "Segments")
+        self.legacy_dir = os.path.join(root, "Legacy")
+        self.manifest_path = os.path.join(root, "manifest.json")
+
+    def daily_path(self, date):
+        """Path of the day partition that new rows for a date are appended to"""
+        return os.path.join(self.root, f"Attendance_{date.replace('/', '_')}.csv")
+
+    def segment_path(self, month):
+        return os.path.join(self.segment_dir, f"Attendance_{month.replace('-', '_')}.csv")
+
+    def load_manifest(self):
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as file:
+                manifest = json.load(file)
+            if manifest.get('version') == MANIFEST_VERSION:
+                return manifest
+        except (OSError, ValueError):
+            pass
+        return {'version': MANIFEST_VERSION, 'segments': {}}
+
+    def daily_files(self):
+        """Map each day to its uncompacted partition files, including the legacy naming"""
+        files = {}
+        try:
+            names = os.listdir(self.root)
+        except OSError:
+            return files
+        for name in names:
+            if name.startswith('Attendance_') and name.endswith('.csv'):
+                day = parse_date(name[len('Attendance_'):-len('.csv')])
+                if day is not None:
+                    files.setdefault(day, []).append(os.path.join(self.root, name))
+        return files
+
+    @staticmethod
+    def read_file(path):
+        """All rows of a partition file in the standard columns"""
+        try:
+            with open(path, 'r', encoding='utf-8', newline='') as file:
+                reader = csv.reader(file)
+                header = next(reader, None)
+                return list(normalize_rows(reader, header)) if header else []
+        except OSError:
+            return []
+
+    @staticmethod
+    def segment_days(entry):
+        """Byte spans of a segment's days by date; keys that are not dates are skipped"""
+        spans = {}
+        for key, span in entry['days'].items():
+            day = parse_date(key)
+            if day is None:
+                print(f"Skipping unreadable day {key!r} in attendance segment {entry['file']}")
+                continue
+            spans[day] = span
+        return spans
+
+    def read_segment_days(self, month, entry, days, spans=None):
+        """Rows of the given days from a month segment, reading only their byte ranges"""
+        rows = []
+        path = os.path.join(self.root, entry['file'])
+        spans = self.segment_days(entry) if spans is None else spans
+        ranges = sorted(spans[day][:2] for day in days if day in spans)
+        if not ranges:
+            return rows
+        try:
+            with open(path, 'rb') as file:
+                for start, end in ranges:
+                    file.seek(start)
+                    text = file.read(end - start).decode('utf-8')
+                    rows.extend(csv.reader(io.StringIO(text, newline='')))
+        except OSError as e:
+            print(f"Error reading attendance segment {path}: {e}")
+        return rows
+
+    def read(self, start, end=None, subject=None):
+        """Attendance rows for dates from start to end (inclusive, dd/mm/yyyy), optionally one subject"""
+        first = parse_date(start)
+        last = parse_date(end) if end else first
+        if first is None or last is None:
+            return []
+        manifest = self.load_manifest()
+
+        rows = []
+        month = first.replace(day=1)
+        while month <= last:
+            key = month.strftime('%Y-%m')
+            entry = manifest['segments'].get(key)
+            if entry:
+                spans = self.segment_days(entry)
+                days = [day for day in spans if first <= day <= last]
+                rows.extend(self.read_segment_days(key, entry, days, spans))
+            month = (month + datetime.timedelta(days=32)).replace(day=1)
+
+        # Days not compacted yet (today, late writes for past days, legacy files)
+        for day, paths in sorted(self.daily_files().items()):
+            if first <= day <= last:
+                for path in paths:
+                    rows.extend(self.read_file(path))
+
+        # A crash between writing a segment and removing its partitions can leave
+        # rows in both places; each record is returned once
+        seen = set()
+        unique = []
+        for row in rows:
+            key = row_key(row)
+            if key in seen or (subject and subject != "All" and row[3] != subject):
+                continue
+            seen.add(key)
+            unique.append(row)
+        return unique
+
+    def compact(self, before=None):
+        """Merge day partitions older than `before` (default today) into their month segments
+
+        Returns the number of partition files merged.
+        """
+        cutoff = parse_date(before) if before else datetime.date.today()
+        by_month = {}
+        for day, paths in self.daily_files().items():
+            if day < cutoff:
+                by_month.setdefault(day.strftime('%Y-%m'), []).extend(paths)
+
+        merged = 0
+        with FileLock(self.manifest_path):
+            for month, paths in sorted(by_month.items()):
+                merged += self.compact_month(month, paths)
+        return merged
+
+    def compact_month(self, month, paths):
+        """Rewrite one month's segment with its partitions folded in (manifest lock held)"""
+        os.makedirs(self.segment_dir, exist_ok=True)
+        manifest = self.load_manifest()
+        segment = self.segment_path(month)
+
+        locks = [FileLock(path) for path in sorted(paths)]
+        for lock in locks:
+            lock.acquire()
+        try:
+            rows = self.read_file(segment) if os.path.isfile(segment) else []
+            for path in paths:
+                rows.extend(self.read_file(path))
+            # Days are indexed by their canonical form, so "1/1/2025" and "01/01/2025" are one day
+            unreadable = 0
+            for row in rows:
+                key = day_key(row[5])
+                if key is None:
+                    unreadable += 1
+                else:
+                    row[5] = key
+            if unreadable:
+                print(f"Warning: {unreadable} rows in {segment} have no valid date and cannot be queried by day")
+            seen = set()
+            rows = [row for row in sorted(rows, key=row_order)
+                    if not (row_key(row) in seen or seen.add(row_key(row)))]
+
+            # Write the segment and note where each day's rows start and end
+            buffer = io.StringIO(newline='')
+            writer = csv.writer(buffer)
+            writer.writerow(COLUMNS)
+            offset = len(buffer.getvalue().encode('utf-8'))
+            days = {}
+            for row in rows:
+                writer.writerow(row)
+                text = buffer.getvalue()
+                size = len(text.encode('utf-8'))
+                if parse_date(row[5]) is not None:
+                    start, _, count = days.get(row[5], (offset, None, 0))
+                    days[row[5]] = (start, size, count + 1)
+                offset = size
+            atomic_write(segment, buffer.getvalue())
+
+            manifest['segments'][month] = {
+                'file': os.path.relpath(segment, self.root),
+                'rows': len(rows),
+                'days': {day: list(span) for day, span in days.items()}
+            }
+            atomic_write(self.manifest_path, json.dumps(manifest, indent=1, sort_keys=True))
+
+            # The segment is durable; only now retire the merged partitions
+            for path in paths:
+                with open(path, 'r', encoding='utf-8', newline='') as file:
+                    header = next(csv.reader(file), [])
+                if header[:1] == ['Id']:
+                    os.makedirs(self.legacy_dir, exist_ok=True)
+                    shutil.move(path, os.path.join(self.legacy_dir, os.path.basename(path)))
+                else:
+                    os.remove(path)
+        finally:
+            for lock in locks:
+                lock.release()
+        return len(paths)
+
+    def rebuild_manifest(self):
+        """Re-index every segment on disk, for use after manual edits; returns the segment count"""
+        with FileLock(self.manifest_path):
+            manifest = {'version': MANIFEST_VERSION, 'segments': {}}
+            atomic_write(self.manifest_path, json.dumps(manifest))
+            if not os.path.isdir(self.segment_dir):
+                return 0
+            for name in sorted(os.listdir(self.segment_dir)):
+                if name.startswith('Attendance_') and name.endswith('.csv'):
+                    year, month = name[len('Attendance_'):-len('.csv')].split('_')
+                    self.compact_month(f"{year}-{month}", [])
+            return len(self.load_manifest()['segments'])
+
+
+class AttendanceCompactor:
+    """Background thread that periodically compacts finished days"""
+
+    def __init__(self, store, interval=3600.0):
+        self.store = store
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = None
+        self.last_merged = 0
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name='attendance-compactor', daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while not self.stopped.is_set():
+            try:
+                self.last_merged = self.store.compact()
+            except Exception as e:
+                print(f"Error compacting attendance: {e}")
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        self.stopped.set()
@@ -0,0 +1,219 @@
+############################################# BULK ENROLLMENT MODULE ################################################
+"""
+Bulk student enrollment from a roster CSV and a folder of existing photos or clips.
+
+Media for a student is found either in a sub-folder named after the PRN
+(photos/<PRN>/...) or in files whose name starts with the PRN (photos/<PRN>_1.jpg,
+photos/<PRN>.mp4). Faces are detected and cropped across a process pool into a
+staging folder, student records are written in one batch, and only then are the
+faces moved into TrainingImage under the serials the registry gave them. The
+model is trained once at the end.
+"""
+
+import os
+import csv
+import shutil
+import datetime
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+from face_crops import FaceNormalizer
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv')
+
+ROSTER_FIELDS = ['PRN', 'First Name', 'Last Name', 'Gender', 'Date of Birth', 'Roll Number',
+                 'Email', 'Phone Number', 'Department', 'Course', 'Year', 'Semester']
+
+# Per-process cascade and crop normalizer, created once by the pool initializer
+_face_cascade = None
+_normalizer = None
+
+
+def _init_worker(cascade_path, crop_settings):
+    global _face_cascade, _normalizer
+    _face_cascade = cv2.CascadeClassifier(cascade_path)
+    _normalizer = FaceNormalizer.from_settings(crop_settings)
+
+
+def _largest_face(gray):
+    faces = _face_cascade.detectMultiScale(gray, 1.3, 5)
+    if len(faces) == 0:
+        return None
+    return _normalizer.crop(gray, max(faces, key=lambda f: f[2] * f[3]))
+
+
+def _video_frames(path, max_frames):
+    """Yield up to max_frames grey frames spread evenly over a clip"""
+    video = cv2.VideoCapture(path)
+    try:
+        total = int(video.get(cv2.CAP_PROP_FRAME_COUNT)) or max_frames
+        step = max(1, total // max_frames)
+        index = 0
+        while True:
+            ret, frame = video.read()
+            if not ret:
+                break
+            if index % step == 0:
+                yield cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            index += 1
+    finally:
+        video.release()
+
+
+def extract_student_faces(task):
+    """Detect, crop and save training faces for one student (runs in a worker process)"""
+    serial, prn, first_name, last_name, media_paths, max_samples, output_dir = task
+    sample_count = 0
+    saved = []
+    errors = []
+
+    for path in media_paths:
+        if sample_count >= max_samples:
+            break
+        try:
+            if path.lower().endswith(VIDEO_EXTENSIONS):
+                frames = _video_frames(path, max_samples - sample_count)
+            else:
+                image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+                if image is None:
+                    errors.append(f"{os.path.basename(path)}: unreadable")
+                    continue
+                frames = [image]
+
+            found = False
+            for gray in frames:
+                face_img = _largest_face(gray)
+                if face_img is None:
+                    continue
+                found = True
+                sample_count += 1
+                filename = f"{output_dir}/{first_name}_{last_name}_{serial}_{prn}_{sample_count}.jpg"
+                cv2.imwrite(filename, face_img)
+                saved.append(filename)
+                if sample_count >= max_samples:
+                    break
+            if not found:
+                errors.append(f"{os.path.basename(path)}: no face detected")
+        except Exception as e:
+            errors.append(f"{os.path.basename(path)}: {e}")
+
+    return prn, saved, errors
+
+
+class BulkEnrollment:
+    """Enrolls a whole intake of students from a roster and existing media"""
+
+    def __init__(self, attendance_system, workers=None, max_samples=100, min_samples=1):
+        self.system = attendance_system
+        self.workers = workers or os.cpu_count() or 1
+        self.max_samples = max_samples
+        self.min_samples = min_samples
+
+    def read_roster(self, roster_csv):
+        """Read roster rows with whitespace trimmed"""
+        with open(roster_csv, 'r', newline='', encoding='utf-8-sig') as file:
+            return [{key.strip(): (value or '').strip() for key, value in row.items() if key}
+                    for row in csv.DictReader(file)]
+
+    def find_media(self, media_dir):
+        """Map each PRN to the photos and clips found for it"""
+        media = {}
+        for entry in sorted(os.listdir(media_dir)):
+            path = os.path.join(media_dir, entry)
+            if os.path.isdir(path):
+                files = [os.path.join(path, f) for f in sorted(os.listdir(path))
+                         if f.lower().endswith(IMAGE_EXTENSIONS + VIDEO_EXTENSIONS)]
+                media.setdefault(entry, []).extend(files)
+            elif entry.lower().endswith(IMAGE_EXTENSIONS + VIDEO_EXTENSIONS):
+                prn = os.path.splitext(entry)[0].split('_')[0]
+                media.setdefault(prn, []).append(path)
+        return media
+
+    def run(self, roster_csv, media_dir, train=True):
+        """Enroll every roster student and return a per-student report"""
+        roster = self.read_roster(roster_csv)
+        media = self.find_media(media_dir)
+        report = []
+        students = {}
+
+        registry = "StudentDetails/StudentDetails.csv"
+        known = set()
+        if os.path.isfile(registry):
+            with open(registry, 'r') as file:
+                known = {row[1] for row in csv.reader(file) if len(row) > 1}
+
+        for row in roster:
+            prn = row.get('PRN', '')
+            missing = [field for field in ROSTER_FIELDS if not row.get(field)]
+            if missing:
+                report.append({'PRN': prn, 'Status': 'Failed', 'Samples': 0,
+                               'Reason': f"Missing fields: {', '.join(missing)}"})
+            elif prn in known or prn in students:
+                report.append({'PRN': prn, 'Status': 'Failed', 'Samples': 0,
+                               'Reason': 'Student with this PRN already exists'})
+            elif not media.get(prn):
+                report.append({'PRN': prn, 'Status': 'Failed', 'Samples': 0,
+                               'Reason': 'No photos or clips found'})
+            else:
+                students[prn] = row
+
+        # Serials are given out when the records are written; until then the
+        # faces wait in a staging folder the trainer does not look into
+        staging = tempfile.mkdtemp(prefix=".enroll_", dir="TrainingImage")
+        try:
+            return self.enroll(students, media, report, staging, train)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    def enroll(self, students, media, report, staging, train):
+        """Extract faces into staging, register the students and move their faces into place"""
+        tasks = [(0, prn, row['First Name'], row['Last Name'], media[prn], self.max_samples, staging)
+                 for prn, row in students.items()]
+        results = []
+        if tasks:
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                     initargs=("haarcascade_frontalface_default.xml",
+                                               self.system.capture_normalizer.settings())) as pool:
+                results = list(pool.map(extract_student_faces, tasks, chunksize=4))
+
+        registration_date = datetime.datetime.now().strftime('%d/%m/%Y')
+        enrolled_rows = []
+        crops = {}
+        for prn, saved, errors in results:
+            row = students[prn]
+            sample_count = len(saved)
+            if sample_count < self.min_samples:
+                report.append({'PRN': prn, 'Status': 'Failed', 'Samples': sample_count,
+                               'Reason': f"Only {sample_count} face samples (need {self.min_samples}); "
+                                         + '; '.join(errors[:3])})
+                continue
+            enrolled_rows.append([None] + [row[field] for field in ROSTER_FIELDS] + [registration_date])
+            crops[prn] = saved
+            report.append({'PRN': prn, 'Status': 'Enrolled', 'Samples': sample_count,
+                           'Reason': '; '.join(errors[:3])})
+
+        duplicates = []
+        written = self.system.write_student_rows(enrolled_rows, duplicates) if enrolled_rows else 0
+        for row in enrolled_rows:
+            if row[0] is None:
+                continue
+            prn, first_name, last_name = row[1:4]
+            for n, filename in enumerate(crops[prn], 1):
+                os.replace(filename, f"TrainingImage/{first_name}_{last_name}_{row[0]}_{prn}_{n}.jpg")
+        # Registered by another process since the roster was checked; its staged faces are discarded
+        for entry in report:
+            if entry['Status'] == 'Enrolled' and entry['PRN'] in duplicates:
+                entry.update(Status='Failed', Samples=0, Reason='Student with this PRN already exists')
+        training = self.system.save_student_profile() if train and written else ''
+        return report, written, training
+
+    def write_report(self, report):
+        """Save the per-student report and return its path"""
+        os.makedirs("Reports", exist_ok=True)
+        filename = f"Reports/Enrollment_Report_{datetime.datetime.now().strftime('%d_%m_%Y_%H%M%S')}.csv"
+        with open(filename, 'w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=['PRN', 'Status', 'Samples', 'Reason'])
+            writer.writeheader()
+            writer.writerows(report)
+        return filename
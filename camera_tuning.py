@@ -0,0 +1,182 @@
+############################################# CAMERA TUNING MODULE ################################################
+"""
+Capture settings probe per camera.
+
+Opened with defaults, many USB cameras deliver uncompressed YUYV at a low frame
+rate and keep several frames queued inside the driver. When recognition is
+slower than the camera, every frame it gets is then that many frames old.
+
+The probe opens the camera with each combination of resolution, FOURCC, FPS
+and buffer size in a grid and measures:
+- fps: frames delivered per second when read as fast as possible
+- age_ms: median age of those frames, from the driver's capture timestamps
+  (only where the backend reports them, e.g. V4L2)
+- buffered_frames: frames handed back at once after a stall as long as a slow
+  recognition frame, i.e. frames that had been waiting in the queue
+- lag_ms: age of the frames a reader gets when it is slower than the camera
+  (from the timestamps, else buffered_frames times the stall), the latency a
+  session sees under load
+
+The setting with the lowest lag that meets the minimum width and frame rate is
+saved to Calibration/CaptureProfiles.json under the camera's profile name.
+AttendanceSystem applies it whenever it opens that camera.
+"""
+
+import time
+import datetime
+import itertools
+import statistics
+import cv2
+from file_locks import load_profile, save_profile
+from frame_sources import apply_capture_settings
+
+CAPTURE_PROFILES = "Calibration/CaptureProfiles.json"
+DEFAULT_CAPTURE = {'fourcc': '', 'width': 0, 'height': 0, 'fps': 0, 'buffer_size': 0}
+DEFAULT_CAPTURE_GRID = {
+    'resolution': ((640, 480), (1280, 720), (1920, 1080)),
+    'fourcc': ('MJPG', 'YUYV'),
+    'fps': (30, 60),
+    'buffer_size': (1,)
+}
+
+
+def load_capture_profile(name, path=CAPTURE_PROFILES):
+    """Capture settings saved for a camera profile, or the driver defaults if it was never tuned"""
+    profile = load_profile(name, path)
+    capture = dict(DEFAULT_CAPTURE)
+    if profile:
+        capture.update({key: profile['capture'][key] for key in DEFAULT_CAPTURE if key in profile['capture']})
+    return capture
+
+
+def save_capture_profile(name, profile, path=CAPTURE_PROFILES):
+    """Store a probe result under a camera profile name, keeping the other profiles"""
+    save_profile(name, profile, path)
+
+
+def frame_age_ms(capture):
+    """Age of the frame just read, from the backend's capture timestamp, or None if it has none
+
+    V4L2 stamps buffers with the monotonic clock; other backends report stream
+    positions, which are rejected by the plausibility check.
+    """
+    stamp = capture.get(cv2.CAP_PROP_POS_MSEC)
+    if stamp <= 0:
+        return None
+    age = time.monotonic() * 1000 - stamp
+    return age if 0 <= age < 5000 else None
+
+
+def probe_capture(index, settings, frames=60, warmup=10, stall=0.25):
+    """Open a camera with some capture settings and measure its frame rate and latency
+
+    Returns None if the camera cannot be opened or stops delivering frames.
+    """
+    capture = cv2.VideoCapture(index)
+    if not capture.isOpened():
+        return None
+    try:
+        actual = apply_capture_settings(capture, settings)
+        # The first frames after a format change are often slow or blank
+        for _ in range(warmup):
+            if not capture.read()[0]:
+                return None
+
+        ages, read = [], 0
+        start = time.perf_counter()
+        for _ in range(frames):
+            if not capture.read()[0]:
+                break
+            read += 1
+            age = frame_age_ms(capture)
+            if age is not None:
+                ages.append(age)
+        elapsed = time.perf_counter() - start
+        if not read:
+            return None
+        interval = elapsed / read
+
+        # Read like a session whose recognition is slower than the camera: once the queue
+        # has filled, every frame is as old as the frames waiting ahead of it
+        lags = []
+        for _ in range(5):
+            time.sleep(stall)
+            if not capture.read()[0]:
+                return None
+            age = frame_age_ms(capture)
+            if age is not None:
+                lags.append(age)
+        # Count the frames that were waiting: they come back without waiting for the camera
+        time.sleep(stall)
+        buffered = 0
+        for _ in range(32):
+            started = time.perf_counter()
+            if not capture.read()[0]:
+                break
+            if time.perf_counter() - started >= interval / 2:
+                break
+            buffered += 1
+        lag = statistics.median(lags[2:]) if len(lags) > 2 else buffered * stall * 1000
+
+        return {
+            'capture': dict(settings),
+            'actual': actual,
+            'fps': round(read / elapsed, 1) if elapsed else 0,
+            'age_ms': round(statistics.median(ages), 1) if ages else None,
+            'buffered_frames': buffered,
+            'lag_ms': round(lag, 1)
+        }
+    finally:
+        capture.release()
+
+
+def capture_grid(grid=None):
+    """Capture settings for every combination in a grid"""
+    grid = grid or DEFAULT_CAPTURE_GRID
+    for (width, height), fourcc, fps, buffer_size in itertools.product(
+            grid['resolution'], grid['fourcc'], grid['fps'], grid['buffer_size']):
+        yield {'fourcc': fourcc, 'width': width, 'height': height, 'fps': fps, 'buffer_size': buffer_size}
+
+
+def choose_capture(results, min_width=640, min_fps=15):
+    """Lowest-lag result the camera really ran at the requested size with enough width and frame rate
+
+    Lags within 10% (or 5 ms) of the best count as equal; among those the higher
+    frame rate, then the smaller frame (less detection work), wins.
+    """
+    usable = [r for r in results
+              if r['actual']['width'] == r['capture']['width'] and r['actual']['height'] == r['capture']['height']
+              and r['actual']['width'] >= min_width and r['fps'] >= min_fps]
+    if not usable:
+        return None
+    best_lag = min(r['lag_ms'] for r in usable)
+    near = [r for r in usable if r['lag_ms'] <= best_lag * 1.1 + 5]
+    return max(near, key=lambda r: (r['fps'], -r['actual']['width'] * r['actual']['height']))
+
+
+def tune_capture(index, grid=None, frames=60, warmup=10, stall=0.25, min_width=640, min_fps=15):
+    """Probe the grid on a camera and return the tuning result, or None if it cannot be opened"""
+    baseline = probe_capture(index, DEFAULT_CAPTURE, frames, warmup, stall)
+    if baseline is None:
+        return None
+    results = []
+    for settings in capture_grid(grid):
+        result = probe_capture(index, settings, frames, warmup, stall)
+        if result is not None:
+            results.append(result)
+    chosen = choose_capture(results, min_width, min_fps)
+    return {
+        'capture': chosen['capture'] if chosen else dict(DEFAULT_CAPTURE),
+        'actual': chosen['actual'] if chosen else baseline['actual'],
+        'fps': chosen['fps'] if chosen else baseline['fps'],
+        'age_ms': chosen['age_ms'] if chosen else baseline['age_ms'],
+        'buffered_frames': chosen['buffered_frames'] if chosen else baseline['buffered_frames'],
+        'lag_ms': chosen['lag_ms'] if chosen else baseline['lag_ms'],
+        'baseline': baseline,
+        'device': index,
+        'min_width': min_width,
+        'min_fps': min_fps,
+        'settings_tried': len(results),
+        'results': results,
+        'tuned': datetime.datetime.now().strftime('%d/%m/%Y %H:%M:%S')
+    }
@@ -0,0 +1,500 @@
+############################################# COMMAND LINE MODULE ################################################
+"""
+Headless command-line interface for batch operations.
+
+Runs without Tk or a display, so it can be used from cron jobs and servers.
+Every subcommand prints one JSON object and exits with 0 on success, 1 when the
+operation failed and 2 on invalid arguments. Modules are imported inside each
+subcommand so startup only pays for what that subcommand uses.
+
+    python main.py train
+    python main.py recognize lecture.mp4 --every 5
+    python main.py export --date 23/10/2025
+"""
+
+import os
+import sys
+import json
+import argparse
+import datetime
+from contextlib import redirect_stdout
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def _system(load_model=True, args=None):
+    from core_logic import AttendanceSystem
+    # One-shot commands compact explicitly with `compact` instead of in the background
+    return AttendanceSystem(interactive=False, load_model=load_model,
+                            gallery_dtype=getattr(args, 'gallery', None),
+                            gallery_medoids=getattr(args, 'medoids', None),
+                            gallery_shortlist=getattr(args, 'shortlist', 10),
+                            background_compaction=False,
+                            camera_profile=getattr(args, 'camera_profile', None),
+                            recognition_service=getattr(args, 'service', None))
+
+
+def _message_result(message):
+    """Turn a core status message into (ok, result)"""
+    return not message.startswith("Error"), {'message': message}
+
+
+def cmd_train(args):
+    system = _system()
+    ok, result = _message_result(system.save_student_profile(args.max_memory_mb))
+    result['training'] = system.last_training_stats
+    return ok, result
+
+
+def cmd_retrain(args):
+    system = _system()
+    ok, result = _message_result(system.update_student_profile(args.max_memory_mb))
+    result['training'] = system.last_training_stats
+    return ok, result
+
+
+def cmd_enroll(args):
+    return _message_result(_system().bulk_enroll_students(args.roster, args.media, workers=args.workers))
+
+
+def _iter_grey_frames(source, every):
+    """Yield (name, grey image) from an image, a directory of images or a video"""
+    import cv2
+    from frame_sources import open_frame_source
+
+    frames = open_frame_source(source, pacing='fast', read_ahead=8)
+    try:
+        while True:
+            ret, frame = frames.read()
+            if not ret:
+                break
+            index = frames.frames_read - 1
+            if index % every == 0:
+                yield frames.current_name, cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    finally:
+        frames.release()
+
+
+def cmd_recognize(args):
+    system = _system(args=args)
+    if not system.recognizer or not os.path.isfile("TrainingImageLabel/Trainner.yml"):
+        return False, {'message': "Error: No trained model found. Please train the system first."}
+    if not args.source.startswith('synthetic') and not os.path.exists(args.source):
+        return False, {'message': f"Error: {args.source} not found"}
+
+    if args.record:
+        if not all([args.subject, args.faculty]):
+            return False, {'message': "Error: --subject and --faculty are required with --record"}
+        system.begin_session(args.subject, args.faculty, args.date, args.time,
+                             args.department, args.year, args.semester)
+
+    frames, roster = [], None
+    try:
+        for name, gray in _iter_grey_frames(args.source, args.every):
+            faces = system.identify_faces(gray)
+            if args.record:
+                for face in faces:
+                    if face['label'] is not None:
+                        system.record_prediction(face['label'], face['confidence'],
+                                                 args.subject, args.faculty, args.date, args.time)
+            frames.append({'source': name, 'faces': faces})
+    finally:
+        if args.record:
+            roster = system.current_session['roster']
+            system.end_session()
+
+    recognized = sorted({face['student_id'] for frame in frames for face in frame['faces']
+                         if face['status'] == 'recognized'})
+    result = {'frames': len(frames), 'recognized': recognized}
+    if roster is not None:
+        result['session'] = roster.get_stats()
+        result['absent'] = [student.get('PRN', '') for student in roster.absentees()]
+    if args.details:
+        result['results'] = frames
+    return True, result
+
+
+def cmd_export(args):
+    system = _system(load_model=False)
+    return _message_result(system.export_attendance_report(args.date, args.format))
+
+
+def cmd_rebuild_index(args):
+    return True, _system(load_model=False).rebuild_indexes()
+
+
+def cmd_compact(args):
+    store = _system(load_model=False).attendance_store
+    merged = store.compact(args.before)
+    manifest = store.load_manifest()
+    return True, {'files_merged': merged,
+                  'segments': {month: entry['rows'] for month, entry in sorted(manifest['segments'].items())}}
+
+
+def cmd_gallery(args):
+    if args.evaluate:
+        from gallery import evaluate_galleries, write_gallery_report
+        system = _system(load_model=False)
+        if system.create_recognizer() is None:
+            return False, {'message': "Error: Face recognition not available. Please install opencv-contrib-python"}
+        rows = evaluate_galleries(system, args.holdout_every, max_queries=args.max_queries)
+        if not rows:
+            return False, {'message': "Error: Not enough training images to hold out a test set"}
+        return True, {'report': write_gallery_report(rows), 'results': rows}
+
+    system = _system(load_model=False, args=args)
+    system.recognizer = system.create_recognizer()
+    if system.recognizer is None or not os.path.isfile("TrainingImageLabel/Trainner.yml"):
+        return False, {'message': "Error: No trained model found. Please train the system first."}
+    system.ensure_model_loaded()
+    return True, system.refresh_gallery().get_stats()
+
+
+def _percentile(values, percent):
+    if not values:
+        return 0
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))], 2)
+
+
+def cmd_bench(args):
+    import time
+    from frame_pipeline import detect_faces
+
+    system = _system(args=args)
+    if args.source:
+        frames = [gray for _, gray in _iter_grey_frames(args.source, 1)][:args.frames]
+    else:
+        # Synthetic frames carry a few training crops so recognition is exercised too
+        import cv2
+        from frame_sources import SyntheticSource
+        samples = sorted(f for f in os.listdir("TrainingImage") if f.endswith('.jpg'))[:args.faces]
+        faces = [cv2.imread(os.path.join("TrainingImage", f), cv2.IMREAD_GRAYSCALE) for f in samples]
+        source = SyntheticSource(count=args.frames, face_images=[f for f in faces if f is not None])
+        frames = []
+        while True:
+            ret, frame = source.read()
+            if not ret:
+                break
+            frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+    if not frames:
+        return False, {'message': "Error: No frames to benchmark"}
+
+    detect_ms, frame_ms, face_count = [], [], 0
+    for gray in frames:
+        start = time.perf_counter()
+        faces = detect_faces(system.face_cascade, gray, **system.detector_config)
+        detected = time.perf_counter()
+        if system.recognizer is not None and os.path.isfile("TrainingImageLabel/Trainner.yml"):
+            system.recognition_pool.predict_all(system.predictor,
+                                                system.face_normalizer.crop_all(gray, faces))
+        done = time.perf_counter()
+        detect_ms.append((detected - start) * 1000)
+        frame_ms.append((done - start) * 1000)
+        face_count += len(faces)
+
+    total = sum(frame_ms) / 1000
+    return True, {
+        'frames': len(frames),
+        'faces': face_count,
+        'fps': round(len(frames) / total, 1) if total else 0,
+        'detect_ms': {'p50': _percentile(detect_ms, 50), 'p95': _percentile(detect_ms, 95)},
+        'frame_ms': {'p50': _percentile(frame_ms, 50), 'p95': _percentile(frame_ms, 95)},
+        'recognition': system.recognition_pool.get_stats()
+    }
+
+
+def _date(value):
+    """argparse type for a dd/mm/yyyy date, in its canonical form"""
+    from attendance_store import day_key
+    key = day_key(value)
+    if key is None:
+        raise argparse.ArgumentTypeError(f"invalid date {value!r}, expected dd/mm/yyyy")
+    return key
+
+
+def _add_gallery_arguments(command, default=None):
+    command.add_argument('--gallery', choices=('uint8', 'float16', 'float32'), default=default,
+                         help="Predict from a compact gallery stored in this format")
+    command.add_argument('--medoids', type=int, default=None, help="Keep at most this many samples per student")
+    command.add_argument('--shortlist', type=int, default=10,
+                         help="Students the coarse index passes to the exact gallery search (0: search all)")
+
+
+def cmd_loadtest(args):
+    from load_test import LoadTest
+    if not os.path.isfile("TrainingImageLabel/Trainner.yml"):
+        return False, {'message': "Error: No trained model found. Please train the system first."}
+    if args.source and not os.path.exists(args.source):
+        return False, {'message': f"Error: {args.source} not found"}
+
+    test = LoadTest(duration=args.duration, fps=args.fps, faces=args.faces, roster_size=args.roster_size,
+                    source=args.source, recognition_workers=args.workers, gallery=args.gallery)
+    if args.sessions:
+        step = test.run_step(args.sessions)
+        saturation = None
+        summary = {k: v for k, v in step.items() if k != 'per_session'}
+    else:
+        saturation = test.find_saturation(args.max_sessions)
+        summary = [{k: v for k, v in step.items() if k != 'per_session'} for step in test.steps]
+    return True, {'report': test.write_results(saturation), 'saturation_sessions': saturation, 'steps': summary}
+
+
+def cmd_tune_detector(args):
+    import cv2
+    from frame_sources import SyntheticSource, open_frame_source
+    from detector_tuning import DetectorTuner, collect_frames, load_labels, save_detector_profile
+
+    system = _system(load_model=False)
+    if not system.check_haarcascade_file():
+        return False, {'message': "Error: Missing haarcascade file"}
+    if args.source:
+        if not os.path.exists(args.source):
+            return False, {'message': f"Error: {args.source} not found"}
+        source = open_frame_source(args.source, pacing='fast')
+    else:
+        samples = sorted(f for f in os.listdir("TrainingImage") if f.endswith('.jpg'))[:args.faces]
+        faces = [cv2.imread(os.path.join("TrainingImage", f), cv2.IMREAD_GRAYSCALE) for f in samples]
+        source = SyntheticSource(count=None, face_images=[f for f in faces if f is not None])
+    labels = load_labels(args.labels) if args.labels else None
+    frames, truth = collect_frames(source, args.frames, args.every, labels)
+    if not frames:
+        return False, {'message': "Error: No frames to tune on"}
+
+    tuner = DetectorTuner(cv2.CascadeClassifier("haarcascade_frontalface_default.xml"), frames, truth,
+                          truth_source='labels' if labels else 'synthetic')
+    result = tuner.run(args.min_recall)
+    if not result['faces']:
+        return False, {'message': "Error: No faces in the tuning frames. Use footage with faces in view or --labels"}
+    if not result['recall']:
+        return False, {'message': "Error: No detector setting found the labeled faces"}
+    profile = args.profile or system.camera_profile
+    result['source'] = args.source or 'synthetic'
+    if not args.dry_run:
+        save_detector_profile(profile, result)
+    return True, {'profile': profile, 'saved': not args.dry_run,
+                  **{key: value for key, value in result.items() if key != 'pareto' or args.details}}
+
+
+def cmd_tune_camera(args):
+    from camera_tuning import DEFAULT_CAPTURE_GRID, tune_capture, save_capture_profile
+
+    grid = dict(DEFAULT_CAPTURE_GRID)
+    try:
+        if args.resolutions:
+            grid['resolution'] = [tuple(int(v) for v in r.lower().split('x')) for r in args.resolutions.split(',')]
+        if args.fps:
+            grid['fps'] = [int(v) for v in args.fps.split(',')]
+        if args.buffer_sizes:
+            grid['buffer_size'] = [int(v) for v in args.buffer_sizes.split(',')]
+    except ValueError:
+        return False, {'message': "Error: Invalid grid; use e.g. --resolutions 640x480,1280x720 --fps 30,60"}
+    if args.fourcc:
+        grid['fourcc'] = [code.strip().upper() for code in args.fourcc.split(',')]
+    if any(len(code) != 4 for code in grid['fourcc']):
+        return False, {'message': "Error: FOURCC codes have four characters, e.g. MJPG"}
+
+    result = tune_capture(args.device, grid, args.frames, args.warmup, args.stall_ms / 1000,
+                          args.min_width, args.min_fps)
+    if result is None:
+        return False, {'message': "Error: Could not access camera"}
+    if not result['settings_tried']:
+        return False, {'message': "Error: The camera delivered no frames with any setting in the grid"}
+    profile = args.profile or str(args.device)
+    if not args.dry_run:
+        save_capture_profile(profile, result)
+    return True, {'profile': profile, 'saved': not args.dry_run,
+                  **{key: value for key, value in result.items() if key != 'results' or args.details}}
+
+
+def cmd_serve(args):
+    import signal
+    from core_logic import AttendanceSystem
+    from recognition_service import RecognitionServer
+
+    # The daemon always holds the model itself, whatever the environment says
+    system = AttendanceSystem(interactive=False, recognition_workers=args.workers, gallery_dtype=args.gallery,
+                              gallery_medoids=args.medoids, gallery_shortlist=args.shortlist,
+                              background_compaction=False, recognition_service=False)
+    if not system.recognizer or not os.path.isfile("TrainingImageLabel/Trainner.yml"):
+        return False, {'message': "Error: No trained model found. Please train the system first."}
+    server = RecognitionServer(system, args.socket, batch_window=args.window_ms / 1000, max_batch=args.max_batch)
+    # Closing the listener ends serve_forever() and removes the socket file
+    signal.signal(signal.SIGTERM, lambda signum, frame: server.stop())
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+    except OSError as e:
+        return False, {'message': f"Error: {e}"}
+    return True, server.get_stats()
+
+
+def cmd_status_api(args):
+    import signal
+    from core_logic import AttendanceSystem
+    from status_api import StatusServer
+
+    # Serves what is on disk; sessions of other processes show up as their rows are written
+    system = AttendanceSystem(interactive=False, load_model=False, background_compaction=False, status_api=False)
+    try:
+        server = StatusServer(system, args.host, args.port, args.workers).start()
+    except OSError as e:
+        return False, {'message': f"Error: {e}"}
+    signal.signal(signal.SIGTERM, lambda signum, frame: server.stopped.set())
+    try:
+        while not server.stopped.wait(1.0):
+            pass
+    except KeyboardInterrupt:
+        pass
+    server.stop()
+    return True, server.get_stats()
+
+
+def build_parser():
+    today = datetime.datetime.now().strftime('%d/%m/%Y')
+    parser = argparse.ArgumentParser(prog='main.py', description="Face Recognition-based Attendance System")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    train = subparsers.add_parser('train', help="Train the model on all training images")
+    retrain = subparsers.add_parser('retrain', help="Add images captured since the last training to the model")
+    for command, handler in ((train, cmd_train), (retrain, cmd_retrain)):
+        command.add_argument('--max-memory-mb', type=int, default=None,
+                             help="Memory for decoded images per training chunk (default 256)")
+        command.set_defaults(handler=handler)
+
+    enroll = subparsers.add_parser('enroll', help="Bulk-enroll students from a roster and photo folder")
+    enroll.add_argument('--roster', required=True, help="Roster CSV file")
+    enroll.add_argument('--media', required=True, help="Folder of photos or clips per student")
+    enroll.add_argument('--workers', type=int, default=None, help="Face-cropping processes")
+    enroll.set_defaults(handler=cmd_enroll)
+
+    recognize = subparsers.add_parser('recognize', help="Recognize faces in a video, image or image folder")
+    recognize.add_argument('source', help="Video file, image file, folder of images or \"synthetic\"")
+    recognize.add_argument('--every', type=int, default=1, help="Process every Nth video frame")
+    recognize.add_argument('--details', action='store_true', help="Include per-frame face results")
+    recognize.add_argument('--record', action='store_true', help="Record attendance for recognized students")
+    recognize.add_argument('--subject')
+    recognize.add_argument('--faculty')
+    recognize.add_argument('--date', type=_date, default=today)
+    recognize.add_argument('--time', default=datetime.datetime.now().strftime('%H:%M'))
+    recognize.add_argument('--department', help="Expected cohort (default: the subject's cohort, else everyone)")
+    recognize.add_argument('--year')
+    recognize.add_argument('--semester')
+    _add_gallery_arguments(recognize)
+    recognize.add_argument('--camera-profile', help="Detector profile to use (default: camera 0's)")
+    recognize.add_argument('--service', nargs='?', const=True, default=None,
+                       help="Predict through the recognition service (optionally its socket path)")
+    recognize.set_defaults(handler=cmd_recognize)
+
+    export = subparsers.add_parser('export', help="Export the attendance report for a day")
+    export.add_argument('--date', type=_date, default=today)
+    export.add_argument('--format', default='csv')
+    export.set_defaults(handler=cmd_export)
+
+    subparsers.add_parser('rebuild-index', help="Rebuild derived indexes from the CSV files"
+                          ).set_defaults(handler=cmd_rebuild_index)
+
+    compact = subparsers.add_parser('compact', help="Merge finished days of attendance into monthly segments")
+    compact.add_argument('--before', type=_date, help="Compact days before this date (default today)")
+    compact.set_defaults(handler=cmd_compact)
+
+    bench = subparsers.add_parser('bench', help="Benchmark detection and recognition")
+    bench.add_argument('source', nargs='?', help="Video file, image or folder (synthetic frames if omitted)")
+    bench.add_argument('--frames', type=int, default=100)
+    bench.add_argument('--faces', type=int, default=4, help="Training crops placed in synthetic frames")
+    _add_gallery_arguments(bench)
+    bench.add_argument('--camera-profile', help="Detector profile to use (default: camera 0's)")
+    bench.add_argument('--service', nargs='?', const=True, default=None,
+                       help="Predict through the recognition service (optionally its socket path)")
+    bench.set_defaults(handler=cmd_bench)
+
+    loadtest = subparsers.add_parser('loadtest', help="Simulate concurrent sessions and find the saturation point")
+    loadtest.add_argument('--sessions', type=int, default=None,
+                          help="Run this many sessions once instead of searching for saturation")
+    loadtest.add_argument('--max-sessions', type=int, default=64)
+    loadtest.add_argument('--duration', type=float, default=20.0, help="Seconds per step")
+    loadtest.add_argument('--fps', type=float, default=15.0, help="Camera frame rate of synthetic sessions")
+    loadtest.add_argument('--faces', type=int, default=4, help="Faces in view per synthetic session")
+    loadtest.add_argument('--roster-size', type=int, default=60, help="Expected students per session")
+    loadtest.add_argument('--source', default=None, help="Recorded video to replay instead of synthetic frames")
+    loadtest.add_argument('--workers', type=int, default=1, help="Recognition threads per session")
+    loadtest.add_argument('--gallery', choices=('uint8', 'float16', 'float32'), default=None)
+    loadtest.set_defaults(handler=cmd_loadtest)
+
+    tune = subparsers.add_parser('tune-detector', help="Tune face detection settings for a camera on recorded frames")
+    tune.add_argument('source', nargs='?', help="Recording from the camera: video, image or folder (synthetic if omitted)")
+    tune.add_argument('--profile', help="Camera profile to save under (default: the camera index, 0)")
+    tune.add_argument('--labels', help="CSV of true faces (frame,x,y,w,h); default: exhaustive detection")
+    tune.add_argument('--frames', type=int, default=40, help="Frames to replay")
+    tune.add_argument('--every', type=int, default=1, help="Use every Nth frame")
+    tune.add_argument('--faces', type=int, default=4, help="Training crops placed in synthetic frames")
+    tune.add_argument('--min-recall', type=float, default=0.95,
+                      help="Required fraction of the best recall reached by any setting")
+    tune.add_argument('--dry-run', action='store_true', help="Report without saving the profile")
+    tune.add_argument('--details', action='store_true', help="Include the Pareto front")
+    tune.set_defaults(handler=cmd_tune_detector)
+
+    camera = subparsers.add_parser('tune-camera', help="Probe capture settings for a camera and keep the lowest-latency one")
+    camera.add_argument('device', nargs='?', type=int, default=0, help="Camera device index")
+    camera.add_argument('--profile', help="Camera profile to save under (default: the device index)")
+    camera.add_argument('--resolutions', help="Resolutions to try (default 640x480,1280x720,1920x1080)")
+    camera.add_argument('--fourcc', help="Pixel formats to try (default MJPG,YUYV)")
+    camera.add_argument('--fps', help="Frame rates to request (default 30,60)")
+    camera.add_argument('--buffer-sizes', help="Driver buffer sizes to try (default 1)")
+    camera.add_argument('--frames', type=int, default=60, help="Frames read per setting")
+    camera.add_argument('--warmup', type=int, default=10, help="Frames discarded after applying a setting")
+    camera.add_argument('--stall-ms', type=float, default=250.0, help="Simulated slow frame for the latency test")
+    camera.add_argument('--min-width', type=int, default=640, help="Narrowest frame width to accept")
+    camera.add_argument('--min-fps', type=float, default=15.0, help="Lowest achieved frame rate to accept")
+    camera.add_argument('--dry-run', action='store_true', help="Report without saving the profile")
+    camera.add_argument('--details', action='store_true', help="Include every probed setting")
+    camera.set_defaults(handler=cmd_tune_camera)
+
+    serve = subparsers.add_parser('serve', help="Run the shared recognition service for local processes")
+    serve.add_argument('--socket', default="Sessions/recognition.sock", help="Unix socket to listen on")
+    serve.add_argument('--window-ms', type=float, default=5.0, help="How long a batch waits for more requests")
+    serve.add_argument('--max-batch', type=int, default=64, help="Crops that close a batch early")
+    serve.add_argument('--workers', type=int, default=None, help="Recognition threads")
+    _add_gallery_arguments(serve)
+    serve.set_defaults(handler=cmd_serve)
+
+    status = subparsers.add_parser('status-api', help="Serve the JSON status and attendance API on its own")
+    status.add_argument('--host', default='127.0.0.1', help="Address to listen on (default 127.0.0.1)")
+    status.add_argument('--port', type=int, default=8765, help="Port to listen on")
+    status.add_argument('--workers', type=int, default=4, help="Request handler threads")
+    status.set_defaults(handler=cmd_status_api)
+
+    gallery = subparsers.add_parser('gallery', help="Build the compact gallery or compare gallery formats")
+    _add_gallery_arguments(gallery, default='uint8')
+    gallery.add_argument('--evaluate', action='store_true',
+                         help="Compare formats on held-out training images and write a report")
+    gallery.add_argument('--holdout-every', type=int, default=5, help="Hold out every Nth image per student")
+    gallery.add_argument('--max-queries', type=int, default=None, help="Limit the held-out images used")
+    gallery.set_defaults(handler=cmd_gallery)
+
+    return parser
+
+
+def main(argv=None):
+    """Run one subcommand and return the process exit code"""
+    args = build_parser().parse_args(argv)
+    try:
+        # Progress messages from the core go to stderr so stdout stays valid JSON
+        with redirect_stdout(sys.stderr):
+            from profiling import get_profiler
+            profiler = get_profiler()
+            profiler.tick()
+            try:
+                ok, result = args.handler(args)
+            finally:
+                profiler.stop()
+    except Exception as e:
+        ok, result = False, {'message': f"Error: {e}"}
+
+    print(json.dumps({'command': args.command, 'ok': ok, 'result': result}, default=str))
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,23 +1,101 @@
 ############################################# CORE LOGIC MODULE ################################################
 import cv2
 import os
+import sys
 import csv
 import numpy as np
 from PIL import Image
-import pandas as pd
 import datetime
-import time
-import tkinter.messagebox as mess
+from frame_pipeline import MotionGate, FrameBudgetScheduler, RecognitionPool, RecognitionCache, detect_faces
+from session_journal import SessionJournal
+from file_locks import FileLock, SerialCounter
+from profiling import get_profiler
+from frame_sources import open_frame_source
+from detector_tuning import load_detector_profile
+from camera_tuning import load_capture_profile
+from event_bus import (EventBus, EventMetrics, SESSION_STARTED, SESSION_STOPPED, STUDENT_RECOGNIZED,
+                       ATTENDANCE_RECORDED, MODEL_SWAPPED)
+from face_crops import FaceNormalizer, CropCache, DEFAULT_FACE_SIZE
+from session_roster import StudentIndex, SessionRoster, resolve_cohort, student_key
+from attendance_store import AttendanceStore, AttendanceCompactor, COLUMNS as ATTENDANCE_COLUMNS, row_key, parse_date
+# Subsystems only some commands or settings use (the recognition service, the status API,
+# the gallery, the preview window, bulk enrollment, multi-process sessions) are imported
+# where they are used, so the CLI only loads what its command needs
 
 class AttendanceSystem:
-    def __init__(self):
+    def __init__(self, recognition_workers=None, interactive=True, load_model=True, camera_source=0,
+                 training_memory_mb=256, gallery_dtype=None, gallery_medoids=None, gallery_shortlist=10,
+                 background_compaction=True, camera_profile=None, recognition_service=None,
+                 face_size=DEFAULT_FACE_SIZE, equalize_faces=True, preview_fps=10.0, status_api=None):
+        self.interactive = interactive
+        self.camera_source = camera_source
+        # Detector settings tuned for this camera (see detector_tuning.py), or the defaults
+        self.camera_profile = str(camera_source) if camera_profile is None else camera_profile
+        self.detector_config = load_detector_profile(self.camera_profile)
+        # Capture settings probed for this camera (see camera_tuning.py); live cameras only
+        self.capture_config = load_capture_profile(self.camera_profile)
+        self.training_memory_mb = training_memory_mb
+        self.last_training_stats = {}
         self.recognizer = None
+        self.model_loaded = False
+        self.gallery_dtype = gallery_dtype
+        self.gallery_medoids = gallery_medoids
+        # Students the gallery's coarse index passes to the exact search; None or 0 searches everyone
+        self.gallery_shortlist = gallery_shortlist or None
+        self.gallery = None
+        # New captures and full trainings use the configured crop normalization;
+        # recognition and incremental training follow the settings of the saved model
+        self.capture_normalizer = FaceNormalizer(face_size, equalize_faces)
+        self.face_normalizer = FaceNormalizer(face_size, equalize_faces)
+        # Socket of a shared recognition daemon (see recognition_service.py); None reads
+        # ATTENDANCE_RECOGNITION_SERVICE, False always loads the model in this process
+        self.recognition_service = None
+        if recognition_service is not False and (recognition_service or os.environ.get('ATTENDANCE_RECOGNITION_SERVICE')):
+            from recognition_service import service_path
+            self.recognition_service = service_path(recognition_service)
+        self.recognition_client = None
         self.face_cascade = None
         self.camera = None
         self.is_attendance_active = False
         self.current_session = None
+        self.journal = None
+        self.student_index = StudentIndex()
+        self.analytics = None
+        self.attendance_store = AttendanceStore()
+        self.compactor = None
+        self.motion_gate = MotionGate()
+        self.frame_scheduler = FrameBudgetScheduler()
+        self.recognition_pool = RecognitionPool(recognition_workers)
+        self.recognition_cache = RecognitionCache()
+        self.profiler = get_profiler()
+        # Sessions publish what happens; writers, displays and metrics consume it on their own schedule
+        self.events = EventBus()
+        self.event_metrics = EventMetrics()
+        self.events.subscribe('metrics', self.event_metrics.handle)
+        self.attendance_writer = self.events.subscribe('attendance-writer', self.handle_attendance_event,
+                                                       types=(ATTENDANCE_RECORDED, STUDENT_RECOGNIZED),
+                                                       maxsize=1024, policy='block')
+        # Frames per second shown in the session window; 0 runs sessions without one
+        self.preview_fps = preview_fps
+        self.preview = None
         self.setup_directories()
-        self.load_face_recognizer()
+        if load_model:
+            self.load_face_recognizer()
+        self.recover_stale_journals()
+        if background_compaction:
+            self.compactor = AttendanceCompactor(self.attendance_store)
+            self.compactor.start()
+        # Local JSON status API (see status_api.py): an address, or None to read
+        # ATTENDANCE_STATUS_API; False never starts it
+        self.status_server = None
+        if status_api is not False and (status_api or os.environ.get('ATTENDANCE_STATUS_API')):
+            from status_api import StatusServer, api_address
+            address = api_address(status_api)
+            try:
+                if address:
+                    self.status_server = StatusServer(self, *address).start()
+            except OSError as e:
+                print(f"Error starting the status API on {address[0]}:{address[1]}: {e}")
         
     def setup_directories(self):
         """Create necessary directories"""
@@ -26,7 +104,8 @@ class AttendanceSystem:
             "TrainingImageLabel", 
             "StudentDetails",
             "Attendance",
-            "StudentProfiles"
+            "StudentProfiles",
+            "Sessions"
         ]
         
         for directory in directories:
@@ -36,7 +115,12 @@ class AttendanceSystem:
     def check_haarcascade_file(self):
         """Check if haarcascade file exists"""
         if not os.path.isfile("haarcascade_frontalface_default.xml"):
-            mess.showerror("Missing File", "haarcascade_frontalface_default.xml not found!")
+            if self.interactive:
+                # Imported here so headless use never loads Tk
+                import tkinter.messagebox as mess
+                mess.showerror("Missing File", "haarcascade_frontalface_default.xml not found!")
+            else:
+                print("Error: haarcascade_frontalface_default.xml not found!")
             return False
         return True
         
@@ -45,37 +129,135 @@ class AttendanceSystem:
         try:
             self.face_cascade = cv2.CascadeClassifier("haarcascade_frontalface_default.xml")
             
-            # Try different ways to create the face recognizer
-            try:
-                self.recognizer = cv2.face.LBPHFaceRecognizer_create()
-            except AttributeError:
-                try:
-                    self.recognizer = cv2.face_LBPHFaceRecognizer.create()
-                except AttributeError:
-                    print("Warning: Face recognition not available. Please install opencv-contrib-python")
-                    self.recognizer = None
-                    return False
+            self.recognizer = self.create_recognizer()
+            self.model_loaded = False
+            self.gallery = None
+            if self.recognizer is None:
+                print("Warning: Face recognition not available. Please install opencv-contrib-python")
+                return False
             
             # Try to load existing trained model
-            if self.recognizer and os.path.isfile("TrainingImageLabel/Trainner.yml"):
-                self.recognizer.read("TrainingImageLabel/Trainner.yml")
+            if os.path.isfile("TrainingImageLabel/Trainner.yml"):
+                self.face_normalizer = FaceNormalizer.for_model()
+                if self.face_normalizer.size is None and self.capture_normalizer.size is not None:
+                    print("Warning: the model was trained on raw face crops; retrain to use normalized crops")
+                # With a recognition service the model stays in the daemon's memory
+                if self.connect_recognition_service():
+                    self.recognition_cache.clear()
+                    self.events.publish(MODEL_SWAPPED, reason='loaded', predictor='service')
+                    return True
+                # A current compact gallery replaces the full model for prediction
+                if not self.load_gallery():
+                    self.ensure_model_loaded()
+                    self.refresh_gallery()
+                self.recognition_cache.clear()
+                self.events.publish(MODEL_SWAPPED, reason='loaded', predictor=type(self.predictor).__name__)
                 return True
             return False
         except Exception as e:
             print(f"Error loading face recognizer: {e}")
             return False
             
+    def create_recognizer(self):
+        """Create an empty LBPH recognizer, or None without opencv-contrib"""
+        # Try different ways to create the face recognizer
+        try:
+            return cv2.face.LBPHFaceRecognizer_create()
+        except AttributeError:
+            try:
+                return cv2.face_LBPHFaceRecognizer.create()
+            except AttributeError:
+                return None
+                
+    def ensure_model_loaded(self):
+        """Read the saved model into the recognizer if it is not in memory"""
+        if not self.model_loaded and self.recognizer and os.path.isfile("TrainingImageLabel/Trainner.yml"):
+            self.recognizer.read("TrainingImageLabel/Trainner.yml")
+            self.model_loaded = True
+            
+    def connect_recognition_service(self):
+        """Switch to the shared recognition daemon if one is configured and listening"""
+        if not self.recognition_service:
+            return False
+        if self.recognition_client is None:
+            from recognition_service import RecognitionClient
+            client = RecognitionClient(self.recognition_service, fallback=self.use_local_model)
+            if not client.connect():
+                print(f"Recognition service not reachable on {self.recognition_service}, loading the model locally")
+                return False
+            self.recognition_client = client
+        return True
+        
+    def use_local_model(self):
+        """Stop using the recognition daemon and load the model into this process"""
+        self.recognition_service = None
+        self.recognition_client = None
+        self.load_face_recognizer()
+        return self.predictor
+        
+    @property
+    def predictor(self):
+        """Object used for predictions: the recognition service client, the compact gallery, or the recognizer"""
+        if self.recognition_client is not None:
+            return self.recognition_client
+        return self.gallery if self.gallery is not None else self.recognizer
+        
+    def load_gallery(self):
+        """Load the saved gallery if gallery mode is on and it matches the current model"""
+        if not self.gallery_dtype:
+            return False
+        from gallery import QuantizedGallery, GALLERY_FILE
+        if not os.path.isfile(GALLERY_FILE):
+            return False
+        if os.path.getmtime(GALLERY_FILE) < os.path.getmtime("TrainingImageLabel/Trainner.yml"):
+            return False
+        gallery = QuantizedGallery.load(GALLERY_FILE, shortlist=self.gallery_shortlist)
+        if gallery.dtype != self.gallery_dtype or gallery.medoids != self.gallery_medoids:
+            return False
+        self.gallery = gallery
+        return True
+        
+    def refresh_gallery(self):
+        """Rebuild and save the gallery from the trained recognizer when gallery mode is on
+        
+        Once the gallery exists the recognizer's own copy of the histograms is
+        dropped; it is read back from disk only when the model is retrained.
+        """
+        if not self.gallery_dtype or not self.model_loaded:
+            return None
+        from gallery import QuantizedGallery, GALLERY_FILE
+        gallery = QuantizedGallery.from_recognizer(self.recognizer, self.gallery_dtype)
+        gallery.shortlist = self.gallery_shortlist
+        if self.gallery_medoids:
+            gallery.reduce_to_medoids(self.gallery_medoids)
+        gallery.save(GALLERY_FILE)
+        self.gallery = gallery
+        self.recognizer = self.create_recognizer()
+        self.model_loaded = False
+        return gallery
+        
     def get_next_serial_number(self):
-        """Get next serial number for student registration"""
+        """Allocate the next serial number for student registration"""
+        return self.allocate_serials(1)
+        
+    def allocate_serials(self, count):
+        """Atomically reserve count consecutive serial numbers and return the first"""
+        with FileLock("StudentDetails/StudentDetails.csv"):
+            return self.allocate_serials_locked(count)
+            
+    def allocate_serials_locked(self, count):
+        """Reserve serial numbers while the caller holds the registry lock"""
         csv_file = "StudentDetails/StudentDetails.csv"
+        # Seed the counter from the registry so it never reissues an existing serial
+        floor = 1
         if os.path.isfile(csv_file):
             with open(csv_file, 'r') as file:
-                reader = csv.reader(file)
-                rows = list(reader)
-                return len(rows)  # Return next serial number
-        return 1
+                rows = list(csv.reader(file))
+            serials = [int(row[0]) for row in rows[1:] if row and row[0].strip().isdigit()]
+            floor = max([len(rows)] + [serial + 1 for serial in serials])
+        return SerialCounter("StudentDetails/SerialCounter.txt").allocate(count, floor)
         
-    def take_student_images(self, prn, first_name, last_name, gender, dob, roll_number, email, phone, department, course, year, semester):
+    def take_student_images(self, prn, first_name, last_name, gender, dob, roll_number, email, phone, department, course, year, semester, source=None):
         """Take face images for student registration"""
         if not self.check_haarcascade_file():
             return "Error: Missing haarcascade file"
@@ -88,16 +270,16 @@ class AttendanceSystem:
         if self.student_exists(prn):
             return "Error: Student with this PRN already exists"
             
-        # Get next serial number
-        serial = self.get_next_serial_number()
-        
-        # Initialize camera
-        self.camera = cv2.VideoCapture(0)
+        # Initialize camera (or a recorded/synthetic source)
+        self.camera = open_frame_source(self.camera_source if source is None else source,
+                                        capture=self.capture_config)
         if not self.camera.isOpened():
             return "Error: Could not access camera"
             
         sample_count = 0
         max_samples = 100
+        # Crops are kept until the student is registered, which is when the serial they are named by is known
+        crops = []
         
         try:
             while sample_count < max_samples:
@@ -112,10 +294,7 @@ class AttendanceSystem:
                     cv2.rectangle(frame, (x, y), (x + w, y + h), (255, 0, 0), 2)
                     sample_count += 1
                     
-                    # Save face image
-                    face_img = gray[y:y + h, x:x + w]
-                    filename = f"TrainingImage/{first_name}_{last_name}_{serial}_{prn}_{sample_count}.jpg"
-                    cv2.imwrite(filename, face_img)
+                    crops.append(self.capture_normalizer.crop(gray, (x, y, w, h)))
                     
                     # Display progress
                     cv2.putText(frame, f"Sample: {sample_count}/{max_samples}", 
@@ -126,8 +305,15 @@ class AttendanceSystem:
                 if cv2.waitKey(100) & 0xFF == ord('q'):
                     break
                     
-            # Save student details
-            self.save_student_details(serial, prn, first_name, last_name, gender, dob, roll_number, email, phone, department, course, year, semester)
+            if not crops:
+                return "Error: No face captured"
+                
+            # Save student details, then the face images under the serial they were given
+            serial = self.save_student_details(prn, first_name, last_name, gender, dob, roll_number, email, phone, department, course, year, semester)
+            if serial is None:
+                return "Error: Student with this PRN already exists"
+            for n, face_img in enumerate(crops, 1):
+                cv2.imwrite(f"TrainingImage/{first_name}_{last_name}_{serial}_{prn}_{n}.jpg", face_img)
             
             return f"Successfully captured {sample_count} images for {first_name} {last_name}"
             
@@ -138,25 +324,75 @@ class AttendanceSystem:
                 self.camera.release()
             cv2.destroyAllWindows()
             
-    def save_student_details(self, serial, prn, first_name, last_name, gender, dob, roll_number, email, phone, department, course, year, semester):
-        """Save student details to CSV"""
+    def save_student_details(self, prn, first_name, last_name, gender, dob, roll_number, email, phone, department, course, year, semester):
+        """Save student details to CSV and return the new serial, or None if the PRN exists"""
+        row = [None, prn, first_name, last_name, gender, dob, roll_number, 
+               email, phone, department, course, year, semester, 
+               datetime.datetime.now().strftime('%d/%m/%Y')]
+        return row[0] if self.write_student_rows([row]) == 1 else None
+        
+    def write_student_rows(self, rows, skipped=None):
+        """Append student records under a single registry lock, returning how many were written
+        
+        PRNs that were already registered are left out, and appended to skipped if given.
+        Rows whose serial is None are given one under the same lock, so a serial is
+        only ever used up by a student who is actually registered.
+        """
         csv_file = "StudentDetails/StudentDetails.csv"
         
-        # Create CSV with headers if it doesn't exist
-        if not os.path.isfile(csv_file):
-            with open(csv_file, 'w', newline='') as file:
+        with FileLock(csv_file):
+            # Create CSV with headers if it doesn't exist
+            if not os.path.isfile(csv_file):
+                with open(csv_file, 'w', newline='') as file:
+                    writer = csv.writer(file)
+                    writer.writerow(['Serial', 'PRN', 'First Name', 'Last Name', 'Gender', 
+                                   'Date of Birth', 'Roll Number', 'Email', 'Phone Number',
+                                   'Department', 'Course', 'Year', 'Semester', 'Registration Date'])
+                                   
+            # Another writer may have registered the same PRN since it was checked
+            with open(csv_file, 'r', newline='') as file:
+                known = {row[1] for row in csv.reader(file) if len(row) > 1}
+            new_rows = []
+            for row in rows:
+                if row[1] in known:
+                    print(f"Skipping duplicate PRN {row[1]}")
+                    if skipped is not None:
+                        skipped.append(row[1])
+                    continue
+                known.add(row[1])
+                new_rows.append(row)
+            unassigned = [row for row in new_rows if row[0] is None]
+            if unassigned:
+                first_serial = self.allocate_serials_locked(len(unassigned))
+                for offset, row in enumerate(unassigned):
+                    row[0] = first_serial + offset
+                
+            # Add student records
+            with open(csv_file, 'a', newline='') as file:
                 writer = csv.writer(file)
-                writer.writerow(['Serial', 'PRN', 'First Name', 'Last Name', 'Gender', 
-                               'Date of Birth', 'Roll Number', 'Email', 'Phone Number',
-                               'Department', 'Course', 'Year', 'Semester', 'Registration Date'])
-        
-        # Add student record
-        with open(csv_file, 'a', newline='') as file:
-            writer = csv.writer(file)
-            writer.writerow([serial, prn, first_name, last_name, gender, dob, roll_number, 
-                           email, phone, department, course, year, semester, 
-                           datetime.datetime.now().strftime('%d/%m/%Y')])
+                writer.writerows(new_rows)
+        return len(new_rows)
                            
+    def bulk_enroll_students(self, roster_csv, media_dir, workers=None):
+        """Enroll students from a roster CSV and a folder of photos or clips, then train once"""
+        if not self.check_haarcascade_file():
+            return "Error: Missing haarcascade file"
+        if not os.path.isfile(roster_csv):
+            return "Error: Roster file not found"
+        if not os.path.isdir(media_dir):
+            return "Error: Photo folder not found"
+            
+        try:
+            from bulk_enroll import BulkEnrollment
+            enrollment = BulkEnrollment(self, workers=workers)
+            report, written, training = enrollment.run(roster_csv, media_dir)
+            report_file = enrollment.write_report(report)
+            failed = sum(1 for entry in report if entry['Status'] != 'Enrolled')
+            message = f"Enrolled {written} students, {failed} failed. Report saved to {report_file}"
+            return f"{message}\n{training}" if training else message
+        except Exception as e:
+            return f"Error during bulk enrollment: {str(e)}"
+            
     def student_exists(self, prn):
         """Check if student already exists"""
         csv_file = "StudentDetails/StudentDetails.csv"
@@ -168,49 +404,156 @@ class AttendanceSystem:
                         return True
         return False
         
-    def save_student_profile(self):
+    def save_student_profile(self, max_memory_mb=None):
         """Train and save the face recognition model"""
         try:
-            faces, ids = self.get_images_and_labels("TrainingImage")
-            if len(faces) == 0:
+            image_paths = self.get_training_image_paths("TrainingImage")
+            if len(image_paths) == 0:
                 return "Error: No training images found. Please take images first."
                 
-            self.recognizer.train(faces, np.array(ids))
+            count = self.train_in_chunks(image_paths, max_memory_mb, update=False)
+            if count == 0:
+                return "Error: No training images found. Please take images first."
             self.recognizer.save("TrainingImageLabel/Trainner.yml")
+            self.capture_normalizer.save()
+            self.face_normalizer = FaceNormalizer.from_settings(self.capture_normalizer.settings())
+            self.model_loaded = True
+            self.refresh_gallery()
+            self.recognition_cache.clear()
+            self.events.publish(MODEL_SWAPPED, reason='trained', predictor=type(self.predictor).__name__)
             
-            return f"Profile saved successfully! Trained on {len(faces)} images."
+            return f"Profile saved successfully! Trained on {count} images."
             
         except Exception as e:
             return f"Error saving profile: {str(e)}"
             
-    def get_images_and_labels(self, path):
-        """Get images and labels for training"""
-        image_paths = [os.path.join(path, f) for f in os.listdir(path) if f.endswith('.jpg')]
-        faces = []
-        ids = []
+    def update_student_profile(self, max_memory_mb=None):
+        """Extend the trained model with images added since it was last saved"""
+        model_file = "TrainingImageLabel/Trainner.yml"
+        if not os.path.isfile(model_file):
+            return self.save_student_profile(max_memory_mb)
+            
+        try:
+            image_paths = self.get_training_image_paths("TrainingImage", newer_than=os.path.getmtime(model_file))
+            if len(image_paths) == 0:
+                return "Model is up to date. No new training images found."
+                
+            self.ensure_model_loaded()
+            count = self.train_in_chunks(image_paths, max_memory_mb, update=True)
+            self.recognizer.save(model_file)
+            self.refresh_gallery()
+            self.recognition_cache.clear()
+            self.events.publish(MODEL_SWAPPED, reason='updated', predictor=type(self.predictor).__name__)
+            
+            return f"Profile updated successfully! Added {count} images."
+            
+        except Exception as e:
+            return f"Error updating profile: {str(e)}"
+            
+    def train_in_chunks(self, image_paths, max_memory_mb=None, update=False):
+        """Train on images streamed in memory-bounded chunks and return how many were used
         
-        for image_path in image_paths:
+        The first chunk trains the model (unless update is set) and every later chunk
+        extends it; LBPH keeps one histogram per sample, so the result is the same as
+        training on all images at once. Only one chunk of decoded images is held at a time.
+        """
+        budget = (max_memory_mb or self.training_memory_mb) * 1024 * 1024
+        stats = {'images': 0, 'chunks': 0, 'peak_chunk_mb': 0.0, 'memory_budget_mb': budget / 1024 / 1024}
+        # A full training switches the model to the configured crop settings
+        normalizer = self.face_normalizer if update else self.capture_normalizer
+        cache = CropCache(normalizer) if normalizer.size else None
+        
+        for faces, ids, chunk_bytes in self.iter_training_chunks(image_paths, budget, normalizer, cache):
+            if stats['chunks'] == 0 and not update:
+                self.recognizer.train(faces, np.array(ids))
+            else:
+                self.recognizer.update(faces, np.array(ids))
+            stats['images'] += len(faces)
+            stats['chunks'] += 1
+            stats['peak_chunk_mb'] = max(stats['peak_chunk_mb'], round(chunk_bytes / 1024 / 1024, 1))
+            if cache is not None:
+                # New crops go to disk with their chunk, so the cache holds no more than one chunk
+                cache.flush()
+            
+        if cache is not None:
+            stats['cached_crops'] = cache.hits
             try:
-                # Load image
-                pil_image = Image.open(image_path).convert('L')
-                image_np = np.array(pil_image, 'uint8')
-                
-                # Extract ID from filename (format: name_serial_prn_sample.jpg)
-                filename = os.path.basename(image_path)
-                id_part = filename.split('_')[2]  # Get serial number
-                face_id = int(id_part)
-                
-                faces.append(image_np)
-                ids.append(face_id)
-                
-            except Exception as e:
-                print(f"Error processing image {image_path}: {e}")
+                cache.save(keep=None if update else {os.path.basename(p) for p in image_paths})
+            except OSError as e:
+                print(f"Error saving training crop cache: {e}")
+            
+        try:
+            import resource
+            # ru_maxrss is in KiB on Linux and bytes on macOS
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            stats['peak_rss_mb'] = round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+        except ImportError:
+            stats['peak_rss_mb'] = None
+        self.last_training_stats = stats
+        return stats['images']
+        
+    def iter_training_chunks(self, image_paths, budget_bytes, normalizer=None, cache=None):
+        """Yield (faces, ids, bytes) chunks whose decoded images stay within the byte budget"""
+        faces, ids, chunk_bytes = [], [], 0
+        for image_path in image_paths:
+            sample = self.load_training_image(image_path, normalizer, cache)
+            if sample is None:
                 continue
+            faces.append(sample[0])
+            ids.append(sample[1])
+            chunk_bytes += sample[0].nbytes
+            if chunk_bytes >= budget_bytes:
+                yield faces, ids, chunk_bytes
+                faces, ids, chunk_bytes = [], [], 0
+        if faces:
+            yield faces, ids, chunk_bytes
+            
+    def get_training_image_paths(self, path, newer_than=None):
+        """List training images, optionally only those modified after a timestamp"""
+        image_paths = [os.path.join(path, f) for f in sorted(os.listdir(path)) if f.endswith('.jpg')]
+        if newer_than is not None:
+            image_paths = [p for p in image_paths if os.path.getmtime(p) > newer_than]
+        return image_paths
+        
+    def load_training_image(self, image_path, normalizer=None, cache=None):
+        """Load one normalized training image and its serial id, or None if it cannot be used"""
+        try:
+            # Extract ID from filename (format: name_serial_prn_sample.jpg)
+            filename = os.path.basename(image_path)
+            id_part = filename.split('_')[2]  # Get serial number
+            
+            image_np = cache.get(image_path) if cache is not None else None
+            if image_np is None:
+                pil_image = Image.open(image_path).convert('L')
+                image_np = (normalizer or self.face_normalizer).normalize(np.array(pil_image, 'uint8'))
+                if cache is not None:
+                    cache.add(image_path, image_np)
+            return image_np, int(id_part)
+            
+        except Exception as e:
+            print(f"Error processing image {image_path}: {e}")
+            return None
+            
+    def get_images_and_labels(self, path, newer_than=None):
+        """Get images and labels for training, optionally only those modified after a timestamp"""
+        faces = []
+        ids = []
+        
+        for image_path in self.get_training_image_paths(path, newer_than):
+            sample = self.load_training_image(image_path)
+            if sample is not None:
+                faces.append(sample[0])
+                ids.append(sample[1])
                 
         return faces, ids
         
-    def start_attendance(self, subject, faculty, date, time):
-        """Start attendance session"""
+    def start_attendance(self, subject, faculty, date, time, source=None, pacing='realtime',
+                         department=None, year=None, semester=None, preview_fps=None):
+        """Start attendance session
+        
+        preview_fps overrides the system's preview rate for this session; 0 runs
+        without a window, stopped by stop_attendance() or the end of the source.
+        """
         if not self.check_haarcascade_file():
             return "Error: Missing haarcascade file"
             
@@ -221,180 +564,471 @@ class AttendanceSystem:
         if not all([subject, faculty, date, time]):
             return "Error: All session details are required"
             
-        # Create session record
-        self.current_session = {
-            'subject': subject,
-            'faculty': faculty,
-            'date': date,
-            'time': time,
-            'start_time': datetime.datetime.now(),
-            'attended_students': set()
-        }
-        
-        self.is_attendance_active = True
+        # Create session record and resolve who is expected
+        self.begin_session(subject, faculty, date, time, department, year, semester)
+        roster = self.current_session['roster']
         
-        # Start camera for attendance
-        self.camera = cv2.VideoCapture(0)
+        # Start camera for attendance; recorded footage replays at its own frame rate
+        # unless pacing='fast', and is read ahead on a background thread
+        self.camera = open_frame_source(self.camera_source if source is None else source,
+                                        pacing=pacing, read_ahead=8, capture=self.capture_config)
         if not self.camera.isOpened():
+            self.end_session()
             return "Error: Could not access camera"
             
+        # Static scenes are only re-scanned when something moves or the forced interval expires,
+        # and the scheduler sheds detection work when frames run over budget
+        self.motion_gate.reset()
+        self.frame_scheduler.reset()
+        face_results = []
+        # Drawing and display run on the preview's own thread, at most preview_fps times a second
+        from preview import PreviewWindow
+        self.preview = PreviewWindow('Taking Attendance - Press Q to stop',
+                                     self.preview_fps if preview_fps is None else preview_fps,
+                                     draw=self.draw_attendance_overlay).start()
+            
         try:
             while self.is_attendance_active:
                 ret, frame = self.camera.read()
                 if not ret:
                     break
                     
-                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                faces = self.face_cascade.detectMultiScale(gray, 1.2, 5)
-                
-                for (x, y, w, h) in faces:
-                    cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
-                    
-                    # Recognize face
-                    face_roi = gray[y:y + h, x:x + w]
-                    try:
-                        id, confidence = self.recognizer.predict(face_roi)
-                        
-                        if confidence < 50:  # Lower confidence = better match
-                            student_info = self.get_student_info(id)
-                            if student_info:
-                                # Get student ID with flexible column mapping
-                                student_id = student_info.get('PRN', student_info.get('ID', str(id)))
-                                if student_id not in self.current_session['attended_students']:
-                                    self.current_session['attended_students'].add(student_id)
-                                    self.record_attendance(student_info, subject, faculty, date, time)
-                                    
-                                # Display name with flexible column mapping
-                                first_name = student_info.get('First Name', student_info.get('NAME', 'Unknown'))
-                                last_name = student_info.get('Last Name', '')
-                                display_name = f"{first_name} {last_name}".strip()
-                                
-                                cv2.putText(frame, display_name, 
-                                           (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-                                cv2.putText(frame, f"ID: {student_id}", 
-                                           (x, y + h + 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
-                            else:
-                                cv2.putText(frame, "Unknown Student", (x, y - 10), 
-                                           cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-                        else:
-                            cv2.putText(frame, "Low Confidence", (x, y - 10), 
-                                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-                    except Exception as e:
-                        print(f"Error in face recognition: {e}")
-                        cv2.putText(frame, "Recognition Error", (x, y - 10), 
-                                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-                
-                # Display session info
-                cv2.putText(frame, f"Subject: {subject}", (10, 30), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-                cv2.putText(frame, f"Faculty: {faculty}", (10, 60), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-                cv2.putText(frame, f"Attended: {len(self.current_session['attended_students'])}", (10, 90), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-                cv2.putText(frame, "Press Q to stop", (10, frame.shape[0] - 20), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+                self.frame_scheduler.begin_frame()
+                results = self.process_frame(frame, subject, faculty, date, time, self.camera.timestamp)
+                if results is not None:
+                    face_results = results
+                self.frame_scheduler.end_frame()
                 
-                cv2.imshow('Taking Attendance - Press Q to stop', frame)
+                # Skipped frames keep showing the overlays from the last scan
+                self.preview.submit(frame, {
+                    'faces': face_results,
+                    'subject': subject,
+                    'faculty': faculty,
+                    'attended': roster.attended_expected,
+                    'expected': len(roster.expected),
+                    'level': self.frame_scheduler.level,
+                    'recognition_ms': self.recognition_pool.last_frame_ms
+                })
                 
-                if cv2.waitKey(1) & 0xFF == ord('q'):
+                keys = self.preview.pending_keys()
+                if ord('q') in keys:
                     break
+                if ord('p') in keys:
+                    self.profiler.toggle()
+                self.profiler.tick()
                     
-            return f"Attendance session completed. {len(self.current_session['attended_students'])} students attended."
+            return f"Attendance session completed. {self.describe_attendance()}"
             
         except Exception as e:
             return f"Error during attendance: {str(e)}"
         finally:
             if self.camera:
                 self.camera.release()
-            cv2.destroyAllWindows()
-            self.is_attendance_active = False
+            self.preview.close()
+            # The session thread may be about to end; its cProfile capture is written now
+            self.profiler.release_thread()
+            self.end_session()
+            
+    def draw_attendance_overlay(self, frame, state):
+        """Draw the face boxes and session info on a preview frame"""
+        for result in state['faces']:
+            self.draw_face_result(frame, result)
+        lines = [
+            f"Subject: {state['subject']}",
+            f"Faculty: {state['faculty']}",
+            f"Attended: {state['attended']} of {state['expected']}",
+            f"Load level: {state['level']}",
+            f"Recognition: {state['recognition_ms']:.0f} ms"
+        ]
+        for n, line in enumerate(lines):
+            cv2.putText(frame, line, (10, 30 * (n + 1)), 
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+        cv2.putText(frame, "Press Q to stop", (10, frame.shape[0] - 20), 
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+            
+    def process_frame(self, frame, subject, faculty, date, time, timestamp=None):
+        """Detect, recognize and record the faces in one frame of a running session
+        
+        Returns the per-face results, or None when the motion gate or the frame
+        budget skipped the frame.
+        """
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if not (self.frame_scheduler.should_detect() and self.motion_gate.should_process(gray, timestamp)):
+            return None
+        faces = self.frame_scheduler.detect_faces(self.face_cascade, gray, self.detector_config)
+        selected = self.frame_scheduler.select_faces(faces)
+        return self.recognize_faces(gray, faces, selected, subject, faculty, date, time)
+        
+    def recognize_faces(self, gray, faces, selected, subject, faculty, date, time):
+        """Recognize the selected faces of a frame in parallel and record attendance for them"""
+        results = [{'box': tuple(int(v) for v in face), 'status': 'pending', 'name': '', 'student_id': ''}
+                   for face in faces]
+        indices = [i for i in range(len(faces)) if i in selected]
+        face_rois = self.face_normalizer.crop_all(gray, [results[i]['box'] for i in indices])
+        
+        # Crops that match a recent one reuse its prediction; only the rest go to the recognizer
+        keys = [self.recognition_cache.fingerprint(roi) for roi in face_rois]
+        predictions = [self.recognition_cache.lookup(key) for key in keys]
+        misses = [n for n, prediction in enumerate(predictions) if prediction is None]
+        fresh = self.recognition_pool.predict_all(self.predictor, [face_rois[n] for n in misses])
+        for n, prediction in zip(misses, fresh):
+            predictions[n] = prediction
+            if prediction is not None:
+                self.recognition_cache.store(keys[n], prediction)
+        
+        # Attendance is recorded on this thread, after all predictions are gathered
+        for i, prediction in zip(indices, predictions):
+            result = results[i]
+            if prediction is None:
+                result['status'] = 'error'
+                continue
+                
+            id, confidence = prediction
+            status, student_info = self.record_prediction(id, confidence, subject, faculty, date, time)
+            result['status'] = status
+            if student_info:
+                # Display name with flexible column mapping
+                first_name = student_info.get('First Name', student_info.get('NAME', 'Unknown'))
+                last_name = student_info.get('Last Name', '')
+                result.update(student_id=student_info.get('PRN', student_info.get('ID', str(id))),
+                              name=f"{first_name} {last_name}".strip())
+        return results
+        
+    def record_prediction(self, id, confidence, subject, faculty, date, time):
+        """Record attendance for a recognizer prediction, returning (status, student_info)"""
+        if confidence >= 50:  # Lower confidence = better match
+            return 'low_confidence', None
+            
+        # The session roster answers from memory; no file is read per frame
+        student_info = self.current_session['roster'].lookup(id)
+        if not student_info:
+            return 'unknown', None
+            
+        # Get student ID with flexible column mapping
+        student_id = student_key(student_info, id)
+        # The roster decides on this thread who is new; writing happens on the writer's thread
+        if self.current_session['roster'].mark(student_id):
+            row = self.build_attendance_row(student_info, subject, faculty, date, time)
+            self.events.publish(ATTENDANCE_RECORDED, student_id=student_id, row=row,
+                                subject=subject, date=date, time=time)
+        self.events.publish(STUDENT_RECOGNIZED, student_id=student_id, confidence=round(float(confidence), 2),
+                            subject=subject)
+        return 'recognized', student_info
+        
+    def handle_attendance_event(self, event):
+        """Writer subscriber: journal attendance and recognitions, or append rows without a journal"""
+        if event.type == ATTENDANCE_RECORDED:
+            if self.journal:
+                # Rows reach the CSV when the journal is compacted at session end
+                self.journal.record_attendance(event.data['student_id'], event.data['row'])
+            else:
+                self.write_attendance_rows(event.data['date'], [event.data['row']])
+        elif self.journal:
+            self.journal.record_recognition(event.data['student_id'], event.data['confidence'])
+        
+    def begin_session(self, subject, faculty, date, time, department=None, year=None, semester=None):
+        """Create the session record, resuming from its journal if the session was interrupted
+        
+        The expected roster is resolved once here from the department, year and
+        semester given, or from the subject's cohort in SubjectCohorts.csv; without
+        either, every registered student is expected.
+        """
+        roster = SessionRoster(self.student_index.refresh(), resolve_cohort(subject, department, year, semester))
+        self.current_session = {
+            'subject': subject,
+            'faculty': faculty,
+            'date': date,
+            'time': time,
+            'start_time': datetime.datetime.now(),
+            'roster': roster,
+            'attended_students': roster.attended
+        }
+        
+        self.journal = SessionJournal(SessionJournal.session_path("Sessions", subject, date))
+        resumed = False
+        try:
+            resumed = self.journal.open({'subject': subject, 'faculty': faculty, 'date': date, 'time': time})
+            for student_id in self.journal.attended:
+                roster.mark(student_id)
+            if resumed:
+                print(f"Resumed session from journal: {len(self.journal.attended)} students already marked")
+        except Exception as e:
+            print(f"Error opening session journal, recording directly: {e}")
+            self.journal = None
+            
+        self.is_attendance_active = True
+        self.events.publish(SESSION_STARTED, subject=subject, faculty=faculty, date=date, time=time,
+                            expected=len(roster.expected), attended=roster.attended_expected, resumed=resumed)
+        
+    def end_session(self):
+        """Finish the session and compact its journal into the attendance file"""
+        self.is_attendance_active = False
+        # Everything the session published reaches the journal before it is compacted
+        self.attendance_writer.flush()
+        if self.journal:
+            date = self.current_session['date']
+            try:
+                self.journal.compact(lambda rows: self.write_attendance_rows(date, rows, skip_existing=True))
+            except Exception as e:
+                print(f"Error compacting session journal: {e}")
+            self.journal = None
+        if self.current_session:
+            session = self.current_session
+            self.write_session_summary(session)
+            roster = session['roster']
+            self.events.publish(SESSION_STOPPED, subject=session['subject'], faculty=session['faculty'],
+                                date=session['date'], time=session['time'], expected=len(roster.expected),
+                                attended=roster.attended_expected,
+                                unexpected=len(roster.attended) - roster.attended_expected, rate=roster.rate)
+            
+    def describe_attendance(self):
+        """Summary of the current session's attendance against its roster"""
+        roster = self.current_session['roster']
+        message = (f"{roster.attended_expected} of {len(roster.expected)} expected students attended "
+                   f"({roster.rate}%).")
+        unexpected = len(roster.attended) - roster.attended_expected
+        if unexpected:
+            message += f" {unexpected} not on the roster."
+        return message
+        
+    def get_absentees(self):
+        """Expected students of the current session who have not been recognized yet"""
+        if not self.current_session:
+            return []
+        return self.current_session['roster'].absentees()
+        
+    def write_session_summary(self, session):
+        """Record the session's roster size and attendance in the day's session summary file"""
+        summary_file = f"Attendance/Sessions_{session['date'].replace('/', '_')}.csv"
+        roster = session['roster']
+        cohort = roster.cohort
+        row = [session['subject'], session['faculty'], session['date'], session['time'],
+               cohort.get('Department', ''), cohort.get('Year', ''), cohort.get('Semester', ''),
+               len(roster.expected), roster.attended_expected, len(roster.attended) - roster.attended_expected,
+               roster.rate]
+        
+        try:
+            with FileLock(summary_file):
+                rows = []
+                if os.path.isfile(summary_file):
+                    with open(summary_file, 'r', newline='') as file:
+                        rows = list(csv.reader(file))[1:]
+                # A resumed session replaces its earlier summary
+                rows = [r for r in rows if len(r) > 3 and (r[0], r[3]) != (row[0], row[3])] + [row]
+                with open(summary_file, 'w', newline='') as file:
+                    writer = csv.writer(file)
+                    writer.writerow(['Subject', 'Faculty', 'Date', 'Time', 'Department', 'Year', 'Semester',
+                                     'Expected', 'Attended', 'Unexpected', 'Rate'])
+                    writer.writerows(rows)
+        except Exception as e:
+            print(f"Error writing session summary: {e}")
+            
+    def recover_stale_journals(self):
+        """Write the rows of journals no live session owns into the attendance files
+        
+        Journals of earlier days are compacted and removed. Today's are kept after
+        their rows are written, so restarting the same subject still resumes them.
+        """
+        today = datetime.datetime.now().strftime('%d/%m/%Y')
+        for filename in os.listdir("Sessions"):
+            if not filename.endswith('.journal'):
+                continue
+            path = os.path.join("Sessions", filename)
+            owner = SessionJournal.claim(path)
+            if owner is None:
+                continue
+            try:
+                date = SessionJournal.read_header(path).get('date')
+                if not date:
+                    continue
+                journal = SessionJournal(path)
+                journal.replay()
+                self.write_attendance_rows(date, journal.rows, skip_existing=True)
+                if date != today:
+                    os.remove(path)
+            except Exception as e:
+                print(f"Error recovering session journal {filename}: {e}")
+            finally:
+                owner.release()
+        
+    def start_parallel_attendance(self, subject, faculty, date, time, workers=None, source=None,
+                                  department=None, year=None, semester=None):
+        """Start a headless attendance session using capture and recognition worker processes"""
+        if not self.check_haarcascade_file():
+            return "Error: Missing haarcascade file"
+            
+        if not self.recognizer or not os.path.isfile("TrainingImageLabel/Trainner.yml"):
+            return "Error: No trained model found. Please train the system first."
+            
+        if not all([subject, faculty, date, time]):
+            return "Error: All session details are required"
+            
+        self.begin_session(subject, faculty, date, time, department, year, semester)
+        
+        try:
+            from shared_frames import ParallelAttendanceSession
+            session = ParallelAttendanceSession(self, workers=workers,
+                                                source=self.camera_source if source is None else source)
+            stats = session.run(subject, faculty, date, time)
+            if stats['worker_errors'] and not stats['frames_processed']:
+                return f"Error: Recognition workers failed: {stats['worker_errors'][0]}"
+            if not stats.get('frames_captured'):
+                return "Error: Could not access camera"
+            return (f"Attendance session completed. {self.describe_attendance()} "
+                    f"Processed {stats['frames_processed']} frames on {stats['workers']} workers.")
+        except Exception as e:
+            return f"Error during attendance: {str(e)}"
+        finally:
+            self.end_session()
+            
+    def toggle_profiling(self):
+        """Start or stop a profiling capture without interrupting the session
+        
+        While a session runs, the capture starts on the session's own thread at its
+        next frame, so cProfile sees the attendance loop rather than the caller.
+        """
+        self.profiler.toggle()
+        self.profiler.tick(can_start=not self.is_attendance_active)
+        status = self.profiler.get_status()
+        if self.profiler.requested:
+            return f"Profiling starts with the next frame ({', '.join(status['modes'])})"
+        if status['active']:
+            return f"Profiling started ({', '.join(status['modes'])})"
+        return f"Profiling stopped. Output: {', '.join(status['last_outputs']) or 'none'}"
+        
+    def identify_faces(self, gray, detector=None):
+        """Detect and recognize faces in a grey image without recording attendance"""
+        faces = detect_faces(self.face_cascade, gray, **(detector or self.detector_config))
+        face_rois = self.face_normalizer.crop_all(gray, faces)
+        predictions = self.recognition_pool.predict_all(self.predictor, face_rois)
+        
+        results = []
+        for (x, y, w, h), prediction in zip(faces, predictions):
+            result = {'box': [int(x), int(y), int(w), int(h)], 'status': 'error',
+                      'label': None, 'confidence': None, 'student_id': '', 'name': ''}
+            if prediction is not None:
+                id, confidence = prediction
+                result.update(label=int(id), confidence=round(float(confidence), 2), status='low_confidence')
+                if confidence < 50:
+                    student_info = self.get_student_info(id)
+                    result['status'] = 'recognized' if student_info else 'unknown'
+                    if student_info:
+                        first_name = student_info.get('First Name', student_info.get('NAME', 'Unknown'))
+                        result.update(student_id=student_info.get('PRN', student_info.get('ID', str(id))),
+                                      name=f"{first_name} {student_info.get('Last Name', '')}".strip())
+            results.append(result)
+        return results
+        
+    def rebuild_indexes(self):
+        """Rebuild derived state from the CSV files and return what was done"""
+        summary = {}
+        
+        # Re-seeding happens inside the allocation; reserve nothing by allocating zero serials
+        summary['next_serial'] = self.allocate_serials(0)
+        
+        pending = [f for f in os.listdir("Sessions") if f.endswith('.journal')]
+        self.recover_stale_journals()
+        remaining = [f for f in os.listdir("Sessions") if f.endswith('.journal')]
+        summary['journals_recovered'] = len(pending) - len(remaining)
+        summary['attendance_segments'] = self.attendance_store.rebuild_manifest()
+        return summary
+        
+    def draw_face_result(self, frame, result):
+        """Draw the box and label for a recognized face"""
+        x, y, w, h = result['box']
+        cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
+        
+        if result['status'] == 'recognized':
+            cv2.putText(frame, result['name'], 
+                       (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+            cv2.putText(frame, f"ID: {result['student_id']}", 
+                       (x, y + h + 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
+        else:
+            labels = {
+                'unknown': "Unknown Student",
+                'low_confidence': "Low Confidence",
+                'error': "Recognition Error",
+                'pending': "Queued"
+            }
+            cv2.putText(frame, labels[result['status']], (x, y - 10), 
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
             
     def stop_attendance(self):
-        """Stop the attendance session"""
+        """Stop the attendance session
+        
+        May be called from another thread than the session's, so it only signals the
+        loop; the loop releases the camera and closes its preview window itself.
+        """
         self.is_attendance_active = False
-        if self.camera:
-            self.camera.release()
-        cv2.destroyAllWindows()
         return "Attendance session stopped"
         
     def get_student_info(self, serial_id):
         """Get student information by serial ID"""
-        csv_file = "StudentDetails/StudentDetails.csv"
-        if os.path.isfile(csv_file):
-            try:
-                with open(csv_file, 'r') as file:
-                    reader = csv.DictReader(file)
-                    for row in reader:
-                        # Try different possible column names for serial
-                        serial_key = None
-                        for key in ['Serial', 'SERIAL NO.', 'serial', 'SERIAL']:
-                            if key in row and row[key].strip():
-                                serial_key = key
-                                break
-                        
-                        if serial_key and int(row[serial_key]) == serial_id:
-                            return row
-            except Exception as e:
-                print(f"Error reading student info: {e}")
-                return None
-        return None
+        try:
+            return self.student_index.get(serial_id)
+        except (TypeError, ValueError):
+            return None
         
     def record_attendance(self, student_info, subject, faculty, date, time):
         """Record attendance in CSV file"""
-        attendance_file = f"Attendance/Attendance_{date.replace('/', '_')}.csv"
+        self.write_attendance_rows(date, [self.build_attendance_row(student_info, subject, faculty, date, time)])
         
-        # Create attendance file with headers if it doesn't exist
-        if not os.path.isfile(attendance_file):
-            with open(attendance_file, 'w', newline='') as file:
-                writer = csv.writer(file)
-                writer.writerow(['PRN', 'First Name', 'Last Name', 'Subject', 'Faculty', 
-                               'Date', 'Time', 'Department', 'Year'])
+    def build_attendance_row(self, student_info, subject, faculty, date, time):
+        """Build an attendance row with flexible column mapping"""
+        return [
+            student_info.get('PRN', student_info.get('ID', '')),
+            student_info.get('First Name', student_info.get('NAME', '')),
+            student_info.get('Last Name', ''),
+            subject,
+            faculty,
+            date,
+            time,
+            student_info.get('Department', ''),
+            student_info.get('Year', '')
+        ]
+        
+    def write_attendance_rows(self, date, rows, skip_existing=False):
+        """Append attendance rows to the day's CSV partition under a single lock acquisition"""
+        attendance_file = self.attendance_store.daily_path(date)
         
-        # Add attendance record with flexible column mapping
         try:
-            with open(attendance_file, 'a', newline='') as file:
-                writer = csv.writer(file)
-                writer.writerow([
-                    student_info.get('PRN', student_info.get('ID', '')),
-                    student_info.get('First Name', student_info.get('NAME', '')),
-                    student_info.get('Last Name', ''),
-                    subject,
-                    faculty,
-                    date,
-                    time,
-                    student_info.get('Department', ''),
-                    student_info.get('Year', '')
-                ])
+            with FileLock(attendance_file):
+                if skip_existing:
+                    # Makes journal compaction safe to repeat after a crash; a past
+                    # day may already have been compacted into its month segment
+                    existing = {row_key(r) for r in self.attendance_store.read(date)}
+                    rows = [r for r in rows if row_key(r) not in existing]
+                    
+                # Create attendance file with headers if it doesn't exist
+                if rows and not os.path.isfile(attendance_file):
+                    with open(attendance_file, 'w', encoding='utf-8', newline='') as file:
+                        writer = csv.writer(file)
+                        writer.writerow(ATTENDANCE_COLUMNS)
+                
+                if rows:
+                    with open(attendance_file, 'a', encoding='utf-8', newline='') as file:
+                        writer = csv.writer(file)
+                        writer.writerows(rows)
         except Exception as e:
             print(f"Error recording attendance: {e}")
             
-    def get_attendance_records(self, date=None, subject=None):
-        """Get attendance records with optional filters"""
-        records = []
-        
+    def get_attendance_records(self, date=None, subject=None, end_date=None):
+        """Get attendance records for a day, or a range of days up to end_date, with optional filters"""
         # If no date specified, use today
         if not date:
             date = datetime.datetime.now().strftime('%d/%m/%Y')
             
-        attendance_file = f"Attendance/Attendance_{date.replace('/', '_')}.csv"
-        
-        if os.path.isfile(attendance_file):
-            with open(attendance_file, 'r') as file:
-                reader = csv.DictReader(file)
-                for row in reader:
-                    # Apply subject filter if specified
-                    if subject and subject != "All" and row.get('Subject', '') != subject:
-                        continue
-                        
-                    records.append([
-                        row.get('PRN', ''),
-                        f"{row.get('First Name', '')} {row.get('Last Name', '')}",
-                        row.get('Subject', ''),
-                        row.get('Faculty', ''),
-                        row.get('Date', ''),
-                        row.get('Time', ''),
-                        'Present'
-                    ])
+        records = [[row[0], f"{row[1]} {row[2]}".strip(), row[3], row[4], row[5], row[6], 'Present']
+                   for row in self.attendance_store.read(date, end_date, subject)]
+                    
+        # Rows of a running session are still in its journal
+        session_day = parse_date(self.current_session['date']) if self.current_session else None
+        if (self.journal and session_day
+                and parse_date(date) <= session_day <= parse_date(end_date or date)):
+            for row in self.journal.rows:
+                if subject and subject != "All" and row[3] != subject:
+                    continue
+                records.append([row[0], f"{row[1]} {row[2]}", row[3], row[4], row[5], row[6], 'Present'])
                     
         return records
         
@@ -407,21 +1041,24 @@ class AttendanceSystem:
             'attendance_rate': 0
         }
         
-        # Count total students
-        csv_file = "StudentDetails/StudentDetails.csv"
-        if os.path.isfile(csv_file):
-            with open(csv_file, 'r') as file:
-                reader = csv.reader(file)
-                stats['total_students'] = len(list(reader)) - 1  # Subtract header
+        # Count total students from the cached registry
+        stats['total_students'] = len(self.student_index.refresh())
         
         # Count today's attendance
         today = datetime.datetime.now().strftime('%d/%m/%Y')
         today_records = self.get_attendance_records(today)
         stats['todays_attendance'] = len(today_records)
         
-        # Calculate attendance rate (simplified)
-        if stats['total_students'] > 0:
-            stats['attendance_rate'] = round((stats['todays_attendance'] / stats['total_students']) * 100, 1)
+        # Attendance rate over today's sessions, each measured against its own roster
+        summaries = {(r['Subject'], r['Time']): (int(r['Expected']), int(r['Attended']))
+                     for r in self.get_session_summaries(today)}
+        session = self.current_session
+        if self.is_attendance_active and session and session['date'] == today:
+            roster = session['roster']
+            summaries[(session['subject'], session['time'])] = (len(roster.expected), roster.attended_expected)
+        expected = sum(e for e, _ in summaries.values())
+        if expected > 0:
+            stats['attendance_rate'] = round(sum(a for _, a in summaries.values()) / expected * 100, 1)
             
         # Count unique subjects
         subjects = set()
@@ -432,6 +1069,25 @@ class AttendanceSystem:
         
         return stats
         
+    def get_analytics(self):
+        """Attendance analytics engine, created on first use so pandas is only loaded when needed"""
+        if self.analytics is None:
+            from analytics import AttendanceAnalytics
+            self.analytics = AttendanceAnalytics(student_index=self.student_index)
+        return self.analytics
+        
+    def get_session_summaries(self, date):
+        """Get the per-session roster summaries recorded for a day"""
+        summary_file = f"Attendance/Sessions_{date.replace('/', '_')}.csv"
+        if not os.path.isfile(summary_file):
+            return []
+        try:
+            with open(summary_file, 'r', newline='') as file:
+                return list(csv.DictReader(file))
+        except Exception as e:
+            print(f"Error reading session summaries: {e}")
+            return []
+            
     def export_attendance_report(self, date, format='csv'):
         """Export attendance report"""
         records = self.get_attendance_records(date)
@@ -0,0 +1,231 @@
+############################################# DETECTOR TUNING MODULE ################################################
+"""
+Haar cascade parameter autotuning per camera.
+
+The tuner replays frames from a camera's recorded footage (or synthetic frames)
+through the detector for every combination in a grid of scale factor,
+minNeighbors, min/max face size and input scale. For each setting it measures
+detection throughput and recall against ground truth, keeps the Pareto front
+(no other setting is both faster and finds more faces) and saves the fastest
+setting on the front that reaches the required recall as the camera's profile
+in Calibration/DetectorProfiles.json. AttendanceSystem loads the profile for
+its camera at startup.
+
+minNeighbors only decides how the cascade's raw candidate windows are grouped,
+so each scan is run once with minNeighbors 0 and grouped for every value in the
+grid, exactly as detectMultiScale would; this divides the tuning time by the
+number of minNeighbors values.
+
+Ground truth comes from, in order of preference:
+- a labels CSV with one face per row (frame, x, y, w, h; frame is the index
+  of the frame as read from the source),
+- the pasted face positions of a synthetic source,
+- the detections of an exhaustive reference setting (scale factor 1.05,
+  minNeighbors 3, full resolution), so recall is relative to the best the
+  cascade can do on that footage.
+"""
+
+import csv
+import time
+import datetime
+import itertools
+import cv2
+import numpy as np
+from file_locks import load_profile, save_profile
+from frame_pipeline import detect_faces
+
+DETECTOR_PROFILES = "Calibration/DetectorProfiles.json"
+DEFAULT_DETECTOR = {'scale_factor': 1.2, 'min_neighbors': 5, 'min_size': 0, 'max_size': 0, 'input_scale': 1.0}
+REFERENCE_DETECTOR = {'scale_factor': 1.05, 'min_neighbors': 3, 'min_size': 0, 'max_size': 0, 'input_scale': 1.0}
+DEFAULT_GRID = {
+    'scale_factor': (1.05, 1.1, 1.2, 1.3),
+    'min_neighbors': (3, 4, 5, 6),
+    'min_size': (0, 40, 80),
+    'max_size': (0, 320),
+    'input_scale': (1.0, 0.75, 0.5)
+}
+
+
+def load_detector_profile(name, path=DETECTOR_PROFILES):
+    """Detector settings saved for a camera profile, or the defaults if it was never tuned"""
+    profile = load_profile(name, path)
+    detector = dict(DEFAULT_DETECTOR)
+    if profile:
+        detector.update({key: profile['detector'][key] for key in DEFAULT_DETECTOR if key in profile['detector']})
+    return detector
+
+
+def save_detector_profile(name, profile, path=DETECTOR_PROFILES):
+    """Store a tuning result under a camera profile name, keeping the other profiles"""
+    save_profile(name, profile, path)
+
+
+def load_labels(csv_file):
+    """Map each frame index to its labeled face boxes"""
+    labels = {}
+    with open(csv_file, 'r', newline='') as file:
+        for row in csv.DictReader(file):
+            labels.setdefault(int(row['frame']), []).append(
+                tuple(int(float(row[key])) for key in ('x', 'y', 'w', 'h')))
+    return labels
+
+
+def overlap(a, b):
+    """Intersection over union of two (x, y, w, h) boxes"""
+    ix = max(0, min(a[0] + a[2], b[0] + b[2]) - max(a[0], b[0]))
+    iy = max(0, min(a[1] + a[3], b[1] + b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = a[2] * a[3] + b[2] * b[3] - inter
+    return inter / union if union else 0.0
+
+
+def match_boxes(detected, truth, min_overlap=0.4):
+    """Greedily pair detections with true faces; returns the number of true faces found"""
+    pairs = sorted(((overlap(d, t), i, j) for i, d in enumerate(detected) for j, t in enumerate(truth)), reverse=True)
+    used_d, used_t = set(), set()
+    for score, i, j in pairs:
+        if score < min_overlap:
+            break
+        if i not in used_d and j not in used_t:
+            used_d.add(i)
+            used_t.add(j)
+    return len(used_t)
+
+
+def scan_candidates(face_cascade, gray, scale_factor, min_size=0, max_size=0, input_scale=1.0):
+    """Ungrouped cascade hits (minNeighbors 0) at the input scale"""
+    if input_scale < 1.0:
+        gray = cv2.resize(gray, None, fx=input_scale, fy=input_scale, interpolation=cv2.INTER_AREA)
+    limits = {}
+    if min_size:
+        limits['minSize'] = (int(min_size * input_scale),) * 2
+    if max_size:
+        limits['maxSize'] = (int(max_size * input_scale),) * 2
+    return [list(map(int, r)) for r in face_cascade.detectMultiScale(gray, scale_factor, 0, **limits)]
+
+
+def group_candidates(candidates, min_neighbors, input_scale=1.0):
+    """Group raw hits the way detectMultiScale does and map them back to full size"""
+    if min_neighbors > 0 and candidates:
+        faces, _ = cv2.groupRectangles(candidates, min_neighbors, 0.2)
+    else:
+        faces = candidates
+    return [tuple(int(v / input_scale) for v in face) for face in np.reshape(faces, (-1, 4))]
+
+
+def pareto_front(results):
+    """Settings not beaten on both throughput and recall, fastest first"""
+    front = []
+    for result in sorted(results, key=lambda r: (-r['fps'], -r['recall'])):
+        if not front or result['recall'] > front[-1]['recall']:
+            front.append(result)
+    return front
+
+
+class DetectorTuner:
+    """Replays frames through the cascade over a parameter grid"""
+
+    def __init__(self, face_cascade, frames, truth=None, grid=None, truth_source=None):
+        # frames: grey frames; truth: per-frame lists of boxes, or None to use the reference setting
+        self.face_cascade = face_cascade
+        self.frames = frames
+        self.grid = grid or DEFAULT_GRID
+        if truth is None:
+            truth = [detect_faces(face_cascade, gray, **REFERENCE_DETECTOR) for gray in frames]
+            truth_source = 'reference'
+        self.truth = truth
+        self.truth_source = truth_source or 'labels'
+        self.results = []
+
+    def scans(self):
+        """Scan settings in the grid: everything except minNeighbors"""
+        keys = ['scale_factor', 'min_size', 'max_size', 'input_scale']
+        for values in itertools.product(*(self.grid.get(key, (DEFAULT_DETECTOR[key],)) for key in keys)):
+            scan = dict(zip(keys, values))
+            if not scan['max_size'] or scan['max_size'] > scan['min_size']:
+                yield scan
+
+    def score(self, detector, faces_per_frame, elapsed):
+        found = sum(match_boxes(faces, truth) for faces, truth in zip(faces_per_frame, self.truth))
+        detected_total = sum(len(faces) for faces in faces_per_frame)
+        true_total = sum(len(t) for t in self.truth)
+        return {
+            'detector': detector,
+            'fps': round(len(self.frames) / elapsed, 1) if elapsed else 0,
+            'detect_ms': round(elapsed / len(self.frames) * 1000, 2) if self.frames else 0,
+            'recall': round(found / true_total, 4) if true_total else 1.0,
+            'precision': round(found / detected_total, 4) if detected_total else 1.0
+        }
+
+    def evaluate_scan(self, scan, neighbor_values):
+        """Results for one scan setting combined with each minNeighbors value"""
+        candidates, scan_time = [], 0.0
+        for gray in self.frames:
+            start = time.perf_counter()
+            candidates.append(scan_candidates(self.face_cascade, gray, **scan))
+            scan_time += time.perf_counter() - start
+        results = []
+        for min_neighbors in neighbor_values:
+            start = time.perf_counter()
+            faces = [group_candidates(c, min_neighbors, scan['input_scale']) for c in candidates]
+            detector = {'scale_factor': scan['scale_factor'], 'min_neighbors': min_neighbors,
+                        'min_size': scan['min_size'], 'max_size': scan['max_size'],
+                        'input_scale': scan['input_scale']}
+            results.append(self.score(detector, faces, scan_time + time.perf_counter() - start))
+        return results
+
+    def evaluate(self, detector):
+        """Throughput, recall and precision of one setting, run as the attendance loop runs it"""
+        faces, elapsed = [], 0.0
+        for gray in self.frames:
+            start = time.perf_counter()
+            faces.append(detect_faces(self.face_cascade, gray, **detector))
+            elapsed += time.perf_counter() - start
+        return self.score(detector, faces, elapsed)
+
+    def run(self, min_recall=0.95):
+        """Evaluate the whole grid and return the tuning result
+
+        The chosen setting is the fastest on the Pareto front whose recall is at
+        least min_recall of the best recall any setting achieved.
+        """
+        self.results = []
+        neighbor_values = self.grid.get('min_neighbors', (DEFAULT_DETECTOR['min_neighbors'],))
+        for scan in self.scans():
+            self.results.extend(self.evaluate_scan(scan, neighbor_values))
+        front = pareto_front(self.results)
+        best_recall = max((r['recall'] for r in front), default=0)
+        chosen = next((r for r in front if r['recall'] >= best_recall * min_recall), front[-1] if front else None)
+        return {
+            'detector': chosen['detector'] if chosen else dict(DEFAULT_DETECTOR),
+            'fps': chosen['fps'] if chosen else 0,
+            'recall': chosen['recall'] if chosen else 0,
+            'precision': chosen['precision'] if chosen else 0,
+            'baseline': self.evaluate(dict(DEFAULT_DETECTOR)),
+            'min_recall': min_recall,
+            'frames': len(self.frames),
+            'faces': sum(len(t) for t in self.truth),
+            'truth': self.truth_source,
+            'settings_tried': len(self.results),
+            'pareto': front,
+            'tuned': datetime.datetime.now().strftime('%d/%m/%Y %H:%M:%S')
+        }
+
+
+def collect_frames(source, max_frames=40, every=1, labels=None):
+    """Read grey frames (and their ground truth, if known) from an opened frame source"""
+    frames, truth = [], []
+    index = 0
+    while len(frames) < max_frames:
+        ret, frame = source.read()
+        if not ret:
+            break
+        if index % every == 0:
+            frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame)
+            if labels is not None:
+                truth.append(labels.get(index, []))
+            elif hasattr(source, 'face_boxes'):
+                truth.append(list(source.face_boxes))
+        index += 1
+    source.release()
+    return frames, (truth if len(truth) == len(frames) and truth else None)
@@ -0,0 +1,201 @@
+############################################# EVENT BUS MODULE ################################################
+"""
+In-process publish/subscribe bus for attendance events.
+
+The session loop publishes what happens (a session started or stopped, a
+student was recognized, attendance was recorded, the model was swapped) and
+returns at once. Each subscriber has its own bounded queue:
+- a handler subscriber is served by its own thread, so a slow writer never
+  holds up the video loop or the other subscribers;
+- a poll subscriber (handler=None) is drained by its owner, e.g. the Tk thread
+  on a timer.
+
+When a queue is full, policy decides: 'block' makes the publisher wait for
+room (backpressure, for subscribers that must not lose events, such as the
+attendance writer), 'drop_oldest' discards the oldest queued event (for
+displays and metrics, which only need to catch up).
+"""
+
+import time
+import queue
+import threading
+import itertools
+
+SESSION_STARTED = 'session_started'
+SESSION_STOPPED = 'session_stopped'
+STUDENT_RECOGNIZED = 'student_recognized'
+ATTENDANCE_RECORDED = 'attendance_recorded'
+MODEL_SWAPPED = 'model_swapped'
+
+
+class Event:
+    """One published event: a type, its data, a wall-clock time and a bus-wide sequence number"""
+
+    __slots__ = ('type', 'data', 'ts', 'seq')
+
+    def __init__(self, type, data, seq):
+        self.type = type
+        self.data = data
+        self.ts = time.time()
+        self.seq = seq
+
+    def to_dict(self):
+        return {'type': self.type, 'ts': self.ts, 'seq': self.seq, **self.data}
+
+
+class Subscription:
+    """A subscriber's bounded queue, and the thread that feeds its handler"""
+
+    def __init__(self, name, handler=None, types=None, maxsize=1000, policy='drop_oldest'):
+        if policy not in ('block', 'drop_oldest'):
+            raise ValueError(f"Unknown queue policy: {policy}")
+        self.name = name
+        self.handler = handler
+        self.types = set(types) if types else None
+        self.policy = policy
+        self.queue = queue.Queue(maxsize)
+        self.delivered = 0
+        self.dropped = 0
+        self.errors = 0
+        self.blocked_ms = 0.0
+        self.closed = False
+        self.thread = None
+        if handler is not None:
+            self.thread = threading.Thread(target=self._run, name=f'events-{name}', daemon=True)
+            self.thread.start()
+
+    def wants(self, event):
+        return not self.closed and (self.types is None or event.type in self.types)
+
+    def offer(self, event):
+        """Queue an event, waiting for room or dropping the oldest one as the policy says"""
+        if self.policy == 'block':
+            try:
+                self.queue.put_nowait(event)
+            except queue.Full:
+                start = time.perf_counter()
+                self.queue.put(event)
+                self.blocked_ms += (time.perf_counter() - start) * 1000
+            return
+        while True:
+            try:
+                self.queue.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.queue.task_done()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def drain(self, limit=None):
+        """Queued events, oldest first (for poll subscribers)"""
+        events = []
+        while limit is None or len(events) < limit:
+            try:
+                events.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+            self.queue.task_done()
+        self.delivered += len(events)
+        return events
+
+    def flush(self):
+        """Wait until the handler has processed every event queued so far"""
+        if self.thread is not None:
+            self.queue.join()
+
+    def _run(self):
+        while True:
+            event = self.queue.get()
+            try:
+                if event is None:
+                    return
+                self.handler(event)
+                self.delivered += 1
+            except Exception as e:
+                self.errors += 1
+                print(f"Error in event subscriber {self.name}: {e}")
+            finally:
+                self.queue.task_done()
+
+    def close(self):
+        """Stop the handler thread after it has processed the events already queued"""
+        self.closed = True
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join(timeout=5)
+            self.thread = None
+
+    def get_stats(self):
+        return {
+            'policy': self.policy,
+            'queued': self.queue.qsize(),
+            'capacity': self.queue.maxsize,
+            'delivered': self.delivered,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'blocked_ms': round(self.blocked_ms, 1)
+        }
+
+
+class EventBus:
+    """Fans published events out to the subscribers interested in them"""
+
+    def __init__(self):
+        self.subscriptions = []
+        self.lock = threading.Lock()
+        self.sequence = itertools.count(1)
+        self.published = 0
+
+    def subscribe(self, name, handler=None, types=None, maxsize=1000, policy='drop_oldest'):
+        """Add a subscriber; without a handler, its owner collects events with drain()"""
+        subscription = Subscription(name, handler, types, maxsize, policy)
+        with self.lock:
+            self.subscriptions = self.subscriptions + [subscription]
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscriptions = [s for s in self.subscriptions if s is not subscription]
+        subscription.close()
+
+    def publish(self, type, **data):
+        """Deliver an event to every interested subscriber and return it"""
+        with self.lock:
+            event = Event(type, data, next(self.sequence))
+            self.published += 1
+            subscriptions = self.subscriptions
+        for subscription in subscriptions:
+            if subscription.wants(event):
+                subscription.offer(event)
+        return event
+
+    def close(self):
+        with self.lock:
+            subscriptions, self.subscriptions = self.subscriptions, []
+        for subscription in subscriptions:
+            subscription.close()
+
+    def get_stats(self):
+        return {'published': self.published,
+                'subscribers': {s.name: s.get_stats() for s in self.subscriptions}}
+
+
+class EventMetrics:
+    """Running counts of published events, for status displays and exporters"""
+
+    def __init__(self):
+        self.counts = {}
+        self.last = {}
+        self.lock = threading.Lock()
+
+    def handle(self, event):
+        with self.lock:
+            self.counts[event.type] = self.counts.get(event.type, 0) + 1
+            self.last[event.type] = event.ts
+
+    def get_stats(self):
+        with self.lock:
+            return {'events': dict(self.counts), 'last_event': dict(self.last)}
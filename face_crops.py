@@ -0,0 +1,231 @@
+############################################# FACE CROPS MODULE ################################################
+"""
+Face crop normalization shared by capture, training and recognition.
+
+Every face is cut as a square around the detector's box (padded by repeating
+the border where it runs off the frame), resized to a fixed size and
+optionally histogram-equalized. LBPH cost then no longer depends on how close
+a student sits to the camera, and training and recognition see crops prepared
+the same way. The per-frame path writes into preallocated buffers.
+
+The settings a model was trained with are saved next to it in
+TrainingImageLabel/Normalization.json. A model without that file predates
+normalization and is used with raw crops until it is retrained.
+
+CropCache keeps the normalized training crops in one append-only array file,
+so retraining does not decode and normalize every JPEG again.
+"""
+
+import os
+import json
+import cv2
+import numpy as np
+from file_locks import FileLock, atomic_write
+
+NORMALIZATION_FILE = "TrainingImageLabel/Normalization.json"
+CROP_CACHE = "TrainingImageLabel/CropCache"
+DEFAULT_FACE_SIZE = 100
+
+
+class FaceNormalizer:
+    """Cuts and normalizes face crops; size=None passes crops through unchanged"""
+
+    def __init__(self, size=DEFAULT_FACE_SIZE, equalize=True, margin=0.0):
+        # margin: extra context around the detector's box, as a fraction of its side
+        self.size = size
+        self.equalize = equalize
+        self.margin = margin
+        self.buffers = np.empty((0, size, size), dtype=np.uint8) if size else None
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(settings.get('size'), settings.get('equalize', False), settings.get('margin', 0.0))
+
+    def settings(self):
+        return {'size': self.size, 'equalize': self.equalize, 'margin': self.margin}
+
+    @classmethod
+    def for_model(cls, path=NORMALIZATION_FILE):
+        """Normalizer matching a saved model: its recorded settings, or pass-through for older models"""
+        try:
+            with open(path, 'r') as file:
+                return cls.from_settings(json.load(file))
+        except (OSError, ValueError):
+            return cls(size=None)
+
+    def save(self, path=NORMALIZATION_FILE):
+        """Record these settings as the ones the saved model was trained with"""
+        atomic_write(path, json.dumps(self.settings()))
+
+    def region(self, gray, box):
+        """Square region around a box, padded by repeating the edge where it leaves the image"""
+        x, y, w, h = (int(v) for v in box)
+        if self.size is None:
+            return gray[y:y + h, x:x + w]
+        side = int(round(max(w, h) * (1 + self.margin)))
+        x0 = int(round(x + w / 2 - side / 2))
+        y0 = int(round(y + h / 2 - side / 2))
+        rows, cols = gray.shape[:2]
+        if x0 >= 0 and y0 >= 0 and x0 + side <= cols and y0 + side <= rows:
+            return gray[y0:y0 + side, x0:x0 + side]
+        inside = gray[max(0, y0):min(rows, y0 + side), max(0, x0):min(cols, x0 + side)]
+        return cv2.copyMakeBorder(inside, max(0, -y0), max(0, y0 + side - rows),
+                                  max(0, -x0), max(0, x0 + side - cols), cv2.BORDER_REPLICATE)
+
+    def normalize(self, crop, out=None):
+        """Resize (padding to a square first) and equalize a crop, into out if given"""
+        if self.size is None:
+            return crop
+        height, width = crop.shape[:2]
+        if height != width:
+            side = max(height, width)
+            crop = cv2.copyMakeBorder(crop, (side - height) // 2, side - height - (side - height) // 2,
+                                      (side - width) // 2, side - width - (side - width) // 2,
+                                      cv2.BORDER_REPLICATE)
+        if out is None:
+            out = np.empty((self.size, self.size), dtype=np.uint8)
+        interpolation = cv2.INTER_AREA if crop.shape[0] > self.size else cv2.INTER_LINEAR
+        cv2.resize(crop, (self.size, self.size), dst=out, interpolation=interpolation)
+        if self.equalize:
+            cv2.equalizeHist(out, dst=out)
+        return out
+
+    def crop(self, gray, box, out=None):
+        """One normalized face from a grey frame"""
+        return self.normalize(self.region(gray, box), out)
+
+    def crop_all(self, gray, boxes):
+        """Normalized faces of a frame, written into reused buffers
+
+        The crops are views that stay valid until the next call; copy any that
+        must be kept longer.
+        """
+        if self.size is None:
+            return [self.region(gray, box) for box in boxes]
+        if len(boxes) > len(self.buffers):
+            self.buffers = np.empty((max(len(boxes), 2 * len(self.buffers)), self.size, self.size), dtype=np.uint8)
+        return [self.crop(gray, box, self.buffers[n]) for n, box in enumerate(boxes)]
+
+
+class CropCache:
+    """Normalized training crops in an append-only array file, keyed by image path and mtime"""
+
+    def __init__(self, normalizer, path=CROP_CACHE):
+        self.normalizer = normalizer
+        self.data_path = f"{path}.bin"
+        self.index_path = f"{path}.json"
+        self.entries = {}
+        self.rows = 0
+        self.pending = []
+        self.data = None
+        self.hits = 0
+        self.load()
+
+    def read_index(self):
+        """(entries, rows) of the cache on disk; empty if it was made with other settings"""
+        try:
+            with open(self.index_path, 'r') as file:
+                index = json.load(file)
+        except (OSError, ValueError):
+            return {}, 0
+        rows = index.get('rows', 0)
+        row_bytes = self.normalizer.size ** 2
+        if (index.get('settings') != self.normalizer.settings() or not os.path.isfile(self.data_path)
+                or os.path.getsize(self.data_path) < rows * row_bytes):
+            return {}, 0
+        return {name: tuple(entry) for name, entry in index.get('entries', {}).items()}, rows
+
+    def map(self, rows):
+        size = self.normalizer.size
+        return np.memmap(self.data_path, dtype=np.uint8, mode='r', shape=(rows, size, size)) if rows else None
+
+    def load(self):
+        # Under the lock, so the index and the data file it describes belong together
+        with FileLock(self.index_path):
+            self.entries, self.rows = self.read_index()
+            self.data = self.map(self.rows)
+
+    def get(self, image_path):
+        """Cached crop for an image that has not changed since it was cached, else None"""
+        entry = self.entries.get(os.path.basename(image_path))
+        if entry is None or self.data is None or entry[0] >= self.rows:
+            return None
+        try:
+            if os.stat(image_path).st_mtime_ns != entry[1]:
+                return None
+        except OSError:
+            return None
+        self.hits += 1
+        return np.array(self.data[entry[0]])
+
+    def add(self, image_path, crop):
+        try:
+            self.pending.append((os.path.basename(image_path), os.stat(image_path).st_mtime_ns, crop))
+        except OSError:
+            pass
+
+    def flush(self):
+        """Write the crops added so far, so they are not held in memory; drops them if that fails"""
+        try:
+            self.save()
+        except OSError as e:
+            print(f"Error saving training crop cache: {e}")
+            self.pending = []
+
+    def save(self, keep=None):
+        """Append new crops and write the index; rewrites the file when most rows are stale
+
+        keep is the set of image file names still in the training set.
+        """
+        if not self.pending and keep is None:
+            return
+        row_bytes = self.normalizer.size ** 2
+        with FileLock(self.index_path):
+            # Another process may have added crops since this cache was loaded
+            entries, start = self.read_index()
+            if keep is not None:
+                entries = {name: entry for name, entry in entries.items() if name in keep}
+            live = sorted(entries.items(), key=lambda item: item[1][0])
+            self.data = None
+            if start and len(live) < start / 2 and self.compact(start, live):
+                entries = {name: (n, entry[1]) for n, (name, entry) in enumerate(live)}
+                start = len(live)
+            with open(self.data_path, 'r+b' if os.path.isfile(self.data_path) else 'wb') as file:
+                # Bytes past the indexed rows are from an interrupted save
+                if os.fstat(file.fileno()).st_size > start * row_bytes:
+                    file.truncate(start * row_bytes)
+                file.seek(start * row_bytes)
+                for n, (name, mtime, crop) in enumerate(self.pending):
+                    file.write(np.ascontiguousarray(crop, dtype=np.uint8).tobytes())
+                    entries[name] = (start + n, mtime)
+            rows = start + len(self.pending)
+            atomic_write(self.index_path, json.dumps({'settings': self.normalizer.settings(),
+                                                      'rows': rows, 'entries': entries}))
+        self.pending = []
+        self.entries = entries
+        self.rows = rows
+        self.data = self.map(rows)
+
+    def compact(self, rows, live, batch=1024):
+        """Copy the live rows into a new data file and swap it in; returns False if it could not be
+
+        The file is replaced rather than rewritten in place, so a process that
+        still maps the old one keeps reading valid rows.
+        """
+        tmp_path = f"{self.data_path}.tmp{os.getpid()}"
+        old = self.map(rows)
+        positions = [entry[0] for _, entry in live]
+        with open(tmp_path, 'wb') as file:
+            for first in range(0, len(positions), batch):
+                file.write(np.ascontiguousarray(old[positions[first:first + batch]]).tobytes())
+            file.flush()
+            os.fsync(file.fileno())
+        del old
+        try:
+            os.replace(tmp_path, self.data_path)
+        except OSError as e:
+            # Windows will not replace a file another process has mapped; compact on a later save
+            print(f"Could not compact training crop cache: {e}")
+            os.remove(tmp_path)
+            return False
+        return True
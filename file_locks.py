@@ -0,0 +1,175 @@
+############################################# FILE LOCKS MODULE ################################################
+"""
+Advisory locks and an atomic serial counter for the shared CSV files.
+
+Several camera processes or GUI instances may write the same student registry
+and attendance files on a network share. Each writer holds a lock on a sidecar
+"<file>.lock" while it writes, and student serials come from a counter file that
+is only read and advanced under the registry lock. Per-camera calibration
+profiles are named entries of a shared JSON file, read with load_profile and
+updated under its lock with save_profile.
+
+The holder removes the sidecar when it releases the lock, so lock files do not
+pile up next to day partitions and journals that are later deleted. A waiter
+that wins the lock on a sidecar that was removed meanwhile opens the new one
+and tries again.
+"""
+
+import os
+import json
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class FileLock:
+    """Advisory inter-process lock held on a sidecar .lock file"""
+
+    def __init__(self, path, timeout=30.0, poll_interval=0.01):
+        self.lock_path = f"{path}.lock"
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.file = None
+
+    def _try_lock(self):
+        try:
+            if fcntl:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                self.file.seek(0)
+                msvcrt.locking(self.file.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+
+    def _is_current(self):
+        """Whether the locked file is still the one at lock_path"""
+        if not fcntl:
+            # Windows cannot remove a file another process has open
+            return True
+        try:
+            held = os.fstat(self.file.fileno())
+            current = os.stat(self.lock_path)
+        except OSError:
+            return False
+        return (held.st_dev, held.st_ino) == (current.st_dev, current.st_ino)
+
+    def _remove(self):
+        try:
+            os.remove(self.lock_path)
+        except OSError:
+            pass
+
+    def acquire(self):
+        """Block until the lock is held, raising TimeoutError after the timeout"""
+        self.file = open(self.lock_path, 'a+')
+        deadline = time.monotonic() + self.timeout
+        while True:
+            if self._try_lock():
+                if self._is_current():
+                    return
+                # The previous holder removed this sidecar; lock the one at the path now
+                self.file.close()
+                self.file = open(self.lock_path, 'a+')
+                continue
+            if time.monotonic() >= deadline:
+                self.file.close()
+                self.file = None
+                raise TimeoutError(f"Timed out waiting for lock on {self.lock_path}")
+            time.sleep(self.poll_interval)
+
+    def release(self):
+        """Release the lock and remove the sidecar file"""
+        if self.file is None:
+            return
+        try:
+            if fcntl:
+                # Removed while still held, so no one can lock it and then see it vanish
+                self._remove()
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+            else:
+                self.file.seek(0)
+                msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self.file.close()
+            self.file = None
+        if not fcntl:
+            # Fails harmlessly while another process has the sidecar open
+            self._remove()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+def atomic_write(path, text):
+    """Replace a file's contents so readers never see a partial write
+
+    Text is written as UTF-8 without newline translation, so byte offsets
+    computed from the encoded text hold on every platform.
+    """
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, 'w', encoding='utf-8', newline='') as file:
+        file.write(text)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_profile(name, path):
+    """The entry saved under a profile name in a JSON profiles file, or None"""
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            return json.load(file).get(str(name))
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def save_profile(name, profile, path):
+    """Store an entry under a profile name, keeping the file's other profiles"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with FileLock(path):
+        profiles = {}
+        if os.path.isfile(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as file:
+                    profiles = json.load(file)
+            except ValueError:
+                pass
+        profiles[str(name)] = profile
+        atomic_write(path, json.dumps(profiles, indent=2, sort_keys=True))
+
+
+class SerialCounter:
+    """Monotonic counter stored in a small text file
+
+    Callers must hold the lock that guards the counter while allocating.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def allocate(self, count=1, floor=1):
+        """Reserve count consecutive serials and return the first one
+
+        floor is the lowest serial that may be handed out, used to seed the
+        counter from existing records the first time it is created.
+        """
+        current = floor
+        if os.path.isfile(self.path):
+            with open(self.path, 'r') as file:
+                try:
+                    current = max(int(file.read().strip()), floor)
+                except ValueError:
+                    pass
+        atomic_write(self.path, str(current + count))
+        return current
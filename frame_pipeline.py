@@ -0,0 +1,358 @@
+############################################# FRAME PIPELINE MODULE ################################################
+"""
+Helpers used by the attendance loop to decide how much work each camera frame gets
+"""
+
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+
+
+def detect_faces(face_cascade, gray, scale_factor=1.2, min_neighbors=5, min_size=0, max_size=0, input_scale=1.0):
+    """Run the cascade on a (possibly downscaled) grey frame and return full-size boxes
+
+    min_size and max_size are face widths in full-frame pixels; 0 means no limit.
+    """
+    if input_scale < 1.0:
+        gray = cv2.resize(gray, None, fx=input_scale, fy=input_scale, interpolation=cv2.INTER_AREA)
+    limits = {}
+    if min_size:
+        limits['minSize'] = (int(min_size * input_scale),) * 2
+    if max_size:
+        limits['maxSize'] = (int(max_size * input_scale),) * 2
+    faces = face_cascade.detectMultiScale(gray, scale_factor, min_neighbors, **limits)
+    if input_scale < 1.0:
+        return [tuple(int(v / input_scale) for v in face) for face in faces]
+    return [tuple(int(v) for v in face) for face in faces]
+
+
+class MotionGate:
+    """Cheap change detector that lets the attendance loop skip static frames"""
+
+    def __init__(self, scale=0.125, block_size=8, pixel_threshold=15,
+                 block_ratio=0.05, force_interval=2.0):
+        # scale:           downsampling factor applied before differencing
+        # block_size:      side of the motion-energy blocks on the small frame
+        # pixel_threshold: grey-level change for a small pixel to count as moving
+        # block_ratio:     fraction of moving pixels that marks a block as active
+        # force_interval:  seconds between forced full scans, even when static
+        self.scale = scale
+        self.block_size = block_size
+        self.pixel_threshold = pixel_threshold
+        self.block_ratio = block_ratio
+        self.force_interval = force_interval
+        self.reset()
+
+    def reset(self):
+        """Forget the reference frame so the next frame is always scanned"""
+        self.reference = None
+        self.last_scan = float('-inf')
+        self.frames_seen = 0
+        self.frames_scanned = 0
+
+    def _shrink(self, gray):
+        """Downsample and blur a grey frame for differencing"""
+        small = cv2.resize(gray, None, fx=self.scale, fy=self.scale,
+                           interpolation=cv2.INTER_AREA)
+        return cv2.GaussianBlur(small, (3, 3), 0)
+
+    def motion_energy(self, small):
+        """Return the largest per-block fraction of changed pixels"""
+        diff = cv2.absdiff(small, self.reference)
+        moving = (diff > self.pixel_threshold).astype(np.float32)
+        rows = moving.shape[0] // self.block_size * self.block_size
+        cols = moving.shape[1] // self.block_size * self.block_size
+        if rows == 0 or cols == 0:
+            return float(moving.mean()) if moving.size else 0.0
+        blocks = moving[:rows, :cols].reshape(rows // self.block_size, self.block_size,
+                                             cols // self.block_size, self.block_size)
+        return float(blocks.mean(axis=(1, 3)).max())
+
+    def should_process(self, gray, now=None):
+        """Return True when the frame differs enough from the last scanned one
+
+        now is the frame's timestamp in seconds; replayed footage passes its media
+        time so forced scans land on the same frames on every run.
+        """
+        self.frames_seen += 1
+        small = self._shrink(gray)
+        if now is None:
+            now = time.monotonic()
+
+        scan = (self.reference is None
+                or self.reference.shape != small.shape
+                or now - self.last_scan >= self.force_interval
+                or self.motion_energy(small) >= self.block_ratio)
+
+        if scan:
+            # Differences are measured against the last scanned frame, so slow
+            # drift accumulates until it is large enough to trigger a scan
+            self.reference = small
+            self.last_scan = now
+            self.frames_scanned += 1
+        return scan
+
+    def get_stats(self):
+        """Get counters for scanned and skipped frames"""
+        skipped = self.frames_seen - self.frames_scanned
+        return {
+            'frames_seen': self.frames_seen,
+            'frames_scanned': self.frames_scanned,
+            'frames_skipped': skipped,
+            'skip_rate': round(skipped / self.frames_seen * 100, 1) if self.frames_seen else 0
+        }
+
+
+class FrameBudgetScheduler:
+    """Degrades per-frame work under load to hold a target frame rate"""
+
+    # Degradation levels as (detect every Nth frame, detection scale, max faces recognized)
+    LEVELS = [
+        (1, 1.0, None),
+        (2, 1.0, None),
+        (2, 0.75, 8),
+        (3, 0.5, 4),
+        (4, 0.5, 2),
+    ]
+
+    def __init__(self, target_fps=15, smoothing=0.2, overload_frames=5, recover_frames=30):
+        # overload_frames: consecutive slow frames before stepping up a level
+        # recover_frames:  consecutive fast frames before stepping back down
+        self.target_fps = target_fps
+        self.budget = 1.0 / target_fps
+        self.smoothing = smoothing
+        self.overload_frames = overload_frames
+        self.recover_frames = recover_frames
+        self.reset()
+
+    def reset(self):
+        """Return to full quality and clear timing history"""
+        self.level = 0
+        self.frame_index = 0
+        self.frame_start = None
+        self.avg_cost = 0.0
+        self.slow_streak = 0
+        self.fast_streak = 0
+        self.rotation = 0
+
+    @property
+    def detect_every(self):
+        return self.LEVELS[self.level][0]
+
+    @property
+    def detection_scale(self):
+        return self.LEVELS[self.level][1]
+
+    @property
+    def max_faces(self):
+        return self.LEVELS[self.level][2]
+
+    def begin_frame(self):
+        """Mark the start of processing for a new frame"""
+        self.frame_start = time.perf_counter()
+        self.frame_index += 1
+
+    def should_detect(self):
+        """Return True when this frame should run detection at the current level"""
+        return self.frame_index % self.detect_every == 0
+
+    def detect_faces(self, face_cascade, gray, detector):
+        """Run the cascade with the camera's detector settings, shrunk further by the current level"""
+        settings = dict(detector)
+        settings['input_scale'] = settings.get('input_scale', 1.0) * self.detection_scale
+        return detect_faces(face_cascade, gray, **settings)
+
+    def select_faces(self, faces):
+        """Return indices of the faces to recognize this frame
+
+        When the cap is active the faces are ordered left to right and a
+        rotating window is taken, so every seat gets its turn.
+        """
+        limit = self.max_faces
+        if limit is None or len(faces) <= limit:
+            return set(range(len(faces)))
+
+        order = sorted(range(len(faces)), key=lambda i: (faces[i][0], faces[i][1]))
+        start = self.rotation % len(order)
+        self.rotation += limit
+        return {order[(start + i) % len(order)] for i in range(limit)}
+
+    def end_frame(self):
+        """Record the cost of the current frame and adjust the degradation level"""
+        if self.frame_start is None:
+            return
+        cost = time.perf_counter() - self.frame_start
+        self.frame_start = None
+
+        if self.avg_cost == 0.0:
+            self.avg_cost = cost
+        else:
+            self.avg_cost += self.smoothing * (cost - self.avg_cost)
+
+        # Hysteresis: step up quickly when over budget, step down only after a
+        # sustained stretch well under it so the level does not oscillate
+        if self.avg_cost > self.budget:
+            self.slow_streak += 1
+            self.fast_streak = 0
+        elif self.avg_cost < self.budget * 0.6:
+            self.fast_streak += 1
+            self.slow_streak = 0
+        else:
+            self.slow_streak = 0
+            self.fast_streak = 0
+
+        if self.slow_streak >= self.overload_frames and self.level < len(self.LEVELS) - 1:
+            self.level += 1
+            self.slow_streak = 0
+        elif self.fast_streak >= self.recover_frames and self.level > 0:
+            self.level -= 1
+            self.fast_streak = 0
+
+    def get_stats(self):
+        """Get the current degradation level and frame cost"""
+        return {
+            'level': self.level,
+            'max_level': len(self.LEVELS) - 1,
+            'avg_frame_ms': round(self.avg_cost * 1000, 1),
+            'effective_fps': round(1.0 / self.avg_cost, 1) if self.avg_cost else 0,
+            'target_fps': self.target_fps,
+            'detect_every': self.detect_every,
+            'detection_scale': self.detection_scale,
+            'max_faces': self.max_faces
+        }
+
+
+class RecognitionPool:
+    """Reusable thread pool that runs recognizer predictions for all faces in a frame"""
+
+    def __init__(self, workers=None):
+        # OpenCV releases the GIL inside predict(), so threads give real parallelism
+        self.workers = workers or min(8, os.cpu_count() or 1)
+        self.executor = None
+        self.frames = 0
+        self.faces = 0
+        self.last_frame_ms = 0.0
+        self.total_ms = 0.0
+
+    def _predict(self, recognizer, face_roi):
+        try:
+            return recognizer.predict(face_roi)
+        except Exception as e:
+            print(f"Error in face recognition: {e}")
+            return None
+
+    def predict_all(self, recognizer, face_rois):
+        """Return a (label, confidence) tuple per crop, or None where prediction failed"""
+        start = time.perf_counter()
+        if hasattr(recognizer, 'predict_many'):
+            # A recognition service client answers the whole frame in one round trip
+            try:
+                predictions = recognizer.predict_many(face_rois) if face_rois else []
+            except Exception as e:
+                print(f"Error in face recognition: {e}")
+                predictions = [None] * len(face_rois)
+        elif self.workers <= 1 or len(face_rois) <= 1:
+            predictions = [self._predict(recognizer, roi) for roi in face_rois]
+        else:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                   thread_name_prefix='recognition')
+            predictions = list(self.executor.map(lambda roi: self._predict(recognizer, roi), face_rois))
+
+        if face_rois:
+            self.last_frame_ms = (time.perf_counter() - start) * 1000
+            self.total_ms += self.last_frame_ms
+            self.frames += 1
+            self.faces += len(face_rois)
+        return predictions
+
+    def get_stats(self):
+        """Get per-frame recognition timings"""
+        return {
+            'workers': self.workers,
+            'frames': self.frames,
+            'faces': self.faces,
+            'last_frame_ms': round(self.last_frame_ms, 1),
+            'avg_frame_ms': round(self.total_ms / self.frames, 1) if self.frames else 0
+        }
+
+    def shutdown(self):
+        """Stop the worker threads"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+
+class RecognitionCache:
+    """Bounded LRU cache of predictions keyed by a perceptual hash of the face crop"""
+
+    def __init__(self, capacity=256, ttl=2.0, hash_size=16, max_distance=20):
+        # hash_size:    the crop is reduced to hash_size x hash_size gradient bits
+        # max_distance: Hamming distance under which two crops count as the same
+        self.capacity = capacity
+        self.ttl = ttl
+        self.hash_size = hash_size
+        self.max_distance = max_distance
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    def fingerprint(self, face_roi):
+        """Difference hash of the normalized crop, as an int"""
+        small = cv2.resize(face_roi, (self.hash_size + 1, self.hash_size), interpolation=cv2.INTER_AREA)
+        small = cv2.equalizeHist(small)
+        bits = (small[:, 1:] > small[:, :-1]).flatten()
+        return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+    def lookup(self, key):
+        """Return the cached (label, confidence) for a near-identical crop, or None"""
+        now = time.monotonic()
+        best_key = None
+        best_distance = self.max_distance + 1
+        stale = []
+
+        for cached_key, (prediction, stored_at) in self.entries.items():
+            if now - stored_at > self.ttl:
+                stale.append(cached_key)
+                continue
+            distance = bin(cached_key ^ key).count('1')
+            if distance < best_distance:
+                best_key, best_distance = cached_key, distance
+
+        for cached_key in stale:
+            del self.entries[cached_key]
+        self.expired += len(stale)
+
+        if best_key is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(best_key)
+        return self.entries[best_key][0]
+
+    def store(self, key, prediction):
+        """Remember a prediction, evicting the least recently used entry when full"""
+        self.entries[key] = (prediction, time.monotonic())
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        """Drop every entry, e.g. after the recognition model changes"""
+        self.entries.clear()
+
+    def get_stats(self):
+        """Get hit-rate statistics"""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self.entries),
+            'capacity': self.capacity,
+            'hits': self.hits,
+            'misses': self.misses,
+            'expired': self.expired,
+            'hit_rate': round(self.hits / lookups * 100, 1) if lookups else 0
+        }
@@ -0,0 +1,306 @@
+############################################# FRAME SOURCES MODULE ################################################
+"""
+Pluggable frame sources for capture, attendance and benchmarking.
+
+Every source has the cv2.VideoCapture reading interface (isOpened, read, release)
+so it can stand in for a camera anywhere. Sources other than live devices are
+deterministic: the same footage yields the same frames in the same order, and
+each frame carries a media timestamp so time-based logic (such as the motion
+gate's forced scans) behaves the same on every replay.
+
+Source specs accepted by open_frame_source():
+    0, "1"                  camera device index
+    "lecture.mp4"           video file
+    "frames/" or "a.jpg"    directory of images (sorted by name) or a single image
+    "synthetic"             generated frames, optionally "synthetic:1280x720"
+"""
+
+import os
+import time
+import queue
+import threading
+import cv2
+import numpy as np
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+class FrameSource:
+    """Base class: paced frame reading with a media timestamp per frame"""
+
+    def __init__(self, fps=30.0, pacing='fast'):
+        # pacing: 'realtime' delivers frames at fps, 'fast' as quickly as they can be read
+        self.fps = fps
+        self.pacing = pacing
+        self.frames_read = 0
+        self.timestamp = 0.0
+        self.started_at = None
+
+    def isOpened(self):
+        return True
+
+    @property
+    def current_name(self):
+        """Name of the last frame read (its index, or a file name for image sequences)"""
+        return self.frames_read - 1
+
+    def _read(self):
+        """Return (ret, frame) from the underlying source"""
+        raise NotImplementedError
+
+    def _media_time(self):
+        return self.frames_read / self.fps if self.fps else 0.0
+
+    def read(self):
+        ret, frame = self._read()
+        if not ret:
+            return False, None
+        self.timestamp = self._media_time()
+        self.frames_read += 1
+
+        if self.pacing == 'realtime':
+            now = time.monotonic()
+            if self.started_at is None:
+                self.started_at = now - self.timestamp
+            delay = self.started_at + self.timestamp - now
+            if delay > 0:
+                time.sleep(delay)
+        return True, frame
+
+    def release(self):
+        pass
+
+
+def decode_fourcc(value):
+    """Four-character code from the number cv2 reports, or '' if the backend has none"""
+    code = int(value)
+    return ''.join(chr((code >> 8 * i) & 0xFF) for i in range(4)).strip('\x00 ') if code > 0 else ''
+
+
+def apply_capture_settings(capture, settings):
+    """Request capture settings on an open camera and return what it actually runs with
+    
+    settings holds fourcc, width, height, fps and buffer_size; empty or 0 values
+    keep the driver's default. The pixel format is set first because many drivers
+    only offer the larger resolutions and frame rates in MJPG.
+    """
+    if settings.get('fourcc'):
+        capture.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*settings['fourcc']))
+    if settings.get('width') and settings.get('height'):
+        capture.set(cv2.CAP_PROP_FRAME_WIDTH, settings['width'])
+        capture.set(cv2.CAP_PROP_FRAME_HEIGHT, settings['height'])
+    if settings.get('fps'):
+        capture.set(cv2.CAP_PROP_FPS, settings['fps'])
+    if settings.get('buffer_size'):
+        capture.set(cv2.CAP_PROP_BUFFERSIZE, settings['buffer_size'])
+    return {
+        'fourcc': decode_fourcc(capture.get(cv2.CAP_PROP_FOURCC)),
+        'width': int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        'height': int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        'fps': round(capture.get(cv2.CAP_PROP_FPS), 1),
+        'buffer_size': int(capture.get(cv2.CAP_PROP_BUFFERSIZE))
+    }
+
+
+class DeviceSource(FrameSource):
+    """Live camera by device index; always real time"""
+
+    def __init__(self, index=0, capture=None):
+        # capture: settings for apply_capture_settings(), e.g. a tuned camera profile
+        super().__init__(pacing='fast')
+        self.capture = cv2.VideoCapture(index)
+        self.settings = None
+        if capture and self.capture.isOpened():
+            self.settings = apply_capture_settings(self.capture, capture)
+        self.fps = self.capture.get(cv2.CAP_PROP_FPS) or 30.0
+        self.opened_at = time.monotonic()
+
+    def isOpened(self):
+        return self.capture.isOpened()
+
+    def _read(self):
+        return self.capture.read()
+
+    def _media_time(self):
+        return time.monotonic() - self.opened_at
+
+    def release(self):
+        self.capture.release()
+
+
+class VideoFileSource(FrameSource):
+    """Recorded video file"""
+
+    def __init__(self, path, pacing='fast', loop=False):
+        super().__init__(pacing=pacing)
+        self.path = path
+        self.loop = loop
+        self.capture = cv2.VideoCapture(path)
+        self.fps = self.capture.get(cv2.CAP_PROP_FPS) or 30.0
+
+    def isOpened(self):
+        return self.capture.isOpened()
+
+    def _read(self):
+        ret, frame = self.capture.read()
+        if not ret and self.loop and self.frames_read:
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.capture.read()
+        return ret, frame
+
+    def release(self):
+        self.capture.release()
+
+
+class ImageSequenceSource(FrameSource):
+    """Directory of still images in name order, or a single image"""
+
+    def __init__(self, path, fps=30.0, pacing='fast', loop=False):
+        super().__init__(fps=fps, pacing=pacing)
+        if os.path.isdir(path):
+            self.paths = [os.path.join(path, f) for f in sorted(os.listdir(path))
+                          if f.lower().endswith(IMAGE_EXTENSIONS)]
+        else:
+            self.paths = [path] if os.path.isfile(path) else []
+        self.loop = loop
+        self.index = 0
+
+    def isOpened(self):
+        return bool(self.paths)
+
+    @property
+    def current_name(self):
+        return os.path.basename(self.paths[(self.index - 1) % len(self.paths)]) if self.paths else ''
+
+    def _read(self):
+        while self.index < len(self.paths) or (self.loop and self.paths):
+            path = self.paths[self.index % len(self.paths)]
+            self.index += 1
+            frame = cv2.imread(path)
+            if frame is not None:
+                return True, frame
+        return False, None
+
+
+class SyntheticSource(FrameSource):
+    """Deterministic generated frames, optionally with face images moving across them
+
+    face_images are grey or BGR crops (for example from TrainingImage) pasted at
+    seeded positions that drift slowly, so the detection and recognition paths
+    see realistic work. Without them the frames are textured noise.
+    """
+
+    def __init__(self, width=640, height=480, count=300, fps=30.0, pacing='fast',
+                 face_images=None, face_size=120, seed=0):
+        super().__init__(fps=fps, pacing=pacing)
+        self.width = width
+        self.height = height
+        self.count = count
+        rng = np.random.default_rng(seed)
+        self.background = cv2.GaussianBlur(
+            rng.integers(60, 200, (height, width, 3), dtype=np.uint8), (0, 0), 3)
+        self.faces = []
+        for image in face_images or []:
+            face = cv2.resize(image, (face_size, face_size))
+            if face.ndim == 2:
+                face = cv2.cvtColor(face, cv2.COLOR_GRAY2BGR)
+            x = int(rng.integers(0, max(1, width - face_size)))
+            y = int(rng.integers(0, max(1, height - face_size)))
+            dx, dy = rng.uniform(-1, 1, 2)
+            self.faces.append((face, x, y, dx, dy))
+        self.noise = rng.integers(0, 8, (8, height, width, 3), dtype=np.uint8)
+        self.face_boxes = []
+
+    def _read(self):
+        n = self.frames_read
+        if self.count is not None and n >= self.count:
+            return False, None
+        frame = cv2.add(self.background, self.noise[n % len(self.noise)])
+        # Where the faces were pasted, usable as ground truth when this source is read directly
+        self.face_boxes = []
+        for face, x, y, dx, dy in self.faces:
+            size = face.shape[0]
+            fx = int(x + dx * n) % max(1, self.width - size)
+            fy = int(y + dy * n) % max(1, self.height - size)
+            frame[fy:fy + size, fx:fx + size] = face
+            self.face_boxes.append((fx, fy, size, size))
+        return True, frame
+
+
+class BufferedSource(FrameSource):
+    """Reads ahead from another source on a background thread
+
+    The buffer never drops frames, so replay stays deterministic; the reader
+    only blocks if it consumes faster than the source can decode.
+    """
+
+    def __init__(self, source, size=8):
+        super().__init__(fps=source.fps, pacing=source.pacing)
+        self.source = source
+        self.source.pacing = 'fast'  # pacing is applied when frames leave the buffer
+        self.buffer = queue.Queue(maxsize=size)
+        self.stopped = threading.Event()
+        self.reader = threading.Thread(target=self._read_ahead, name='frame-read-ahead', daemon=True)
+        self.reader.start()
+
+    def isOpened(self):
+        return self.source.isOpened()
+
+    def _read_ahead(self):
+        while not self.stopped.is_set():
+            ret, frame = self.source.read()
+            item = (ret, frame, self.source.timestamp, self.source.current_name)
+            while not self.stopped.is_set():
+                try:
+                    self.buffer.put(item, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+            if not ret:
+                break
+
+    def _read(self):
+        item = self.buffer.get()
+        ret, frame, self._next_timestamp, self._current_name = item
+        if not ret:
+            # Keep reporting the end of the source on later reads
+            self.buffer.put(item)
+        return ret, frame
+
+    @property
+    def current_name(self):
+        return self._current_name
+
+    def _media_time(self):
+        return self._next_timestamp
+
+    def release(self):
+        self.stopped.set()
+        self.reader.join(timeout=1)
+        self.source.release()
+
+
+def open_frame_source(spec=0, pacing='fast', read_ahead=0, loop=False, capture=None, **options):
+    """Create a frame source from a spec (device index, file, directory or "synthetic")
+    
+    capture settings (resolution, FOURCC, FPS, buffer size) only apply to live cameras.
+    """
+    if isinstance(spec, FrameSource):
+        source = spec
+    elif isinstance(spec, int) or (isinstance(spec, str) and spec.isdigit()):
+        source = DeviceSource(int(spec), capture)
+    elif isinstance(spec, str) and spec.startswith('synthetic'):
+        if ':' in spec:
+            width, height = spec.split(':', 1)[1].lower().split('x')
+            options.setdefault('width', int(width))
+            options.setdefault('height', int(height))
+        source = SyntheticSource(pacing=pacing, **options)
+    elif os.path.isdir(spec) or str(spec).lower().endswith(IMAGE_EXTENSIONS):
+        source = ImageSequenceSource(spec, pacing=pacing, loop=loop, **options)
+    else:
+        source = VideoFileSource(spec, pacing=pacing, loop=loop)
+
+    # Live cameras are never read ahead: buffering would only add latency
+    if read_ahead and not isinstance(source, DeviceSource):
+        source = BufferedSource(source, read_ahead)
+    return source
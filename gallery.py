@@ -0,0 +1,374 @@
+############################################# GALLERY MODULE ################################################
+"""
+Compact gallery storage for LBPH recognition.
+
+OpenCV's LBPH recognizer keeps one 16,384-bin float histogram (256 patterns x 8x8
+grid cells) per training sample. QuantizedGallery stores the same histograms in one
+contiguous array as uint8 (with a per-sample scale) or float16, and can reduce
+each student to k medoid samples. Predictions use the same LBP features and
+chi-square distance as OpenCV, so confidences keep their meaning (lower is better).
+
+With a shortlist, prediction runs in two stages. A coarse index holds one
+descriptor per student: the mean of the student's square-rooted histograms,
+projected onto its top principal components (Euclidean distance between
+square-rooted histograms is the Hellinger distance, which tracks chi-square).
+The query is projected the same way, the closest students are shortlisted,
+and the exact chi-square search runs only over their samples. The cost of a
+prediction then depends on the shortlist, not on how many students are enrolled.
+"""
+
+import os
+import csv
+import time
+import datetime
+import tempfile
+import numpy as np
+
+GALLERY_FILE = "TrainingImageLabel/Gallery.npz"
+
+
+def lbph_histogram(gray, radius=1, neighbors=8, grid_x=8, grid_y=8):
+    """LBPH spatial histogram of a grey image, matching OpenCV's LBPHFaceRecognizer"""
+    src = np.asarray(gray, dtype=np.float32)
+    rows, cols = src.shape
+    center = src[radius:rows - radius, radius:cols - radius]
+    codes = np.zeros(center.shape, dtype=np.int32)
+    eps = np.finfo(np.float32).eps
+
+    # Circular neighbourhood sampled with bilinear interpolation
+    for n in range(neighbors):
+        x = np.float32(radius * np.cos(2.0 * np.pi * n / neighbors))
+        y = np.float32(-radius * np.sin(2.0 * np.pi * n / neighbors))
+        fx, fy = int(np.floor(x)), int(np.floor(y))
+        cx, cy = int(np.ceil(x)), int(np.ceil(y))
+        tx, ty = np.float32(x - fx), np.float32(y - fy)
+        w1, w2 = np.float32((1 - tx) * (1 - ty)), np.float32(tx * (1 - ty))
+        w3, w4 = np.float32((1 - tx) * ty), np.float32(tx * ty)
+
+        def shifted(dy, dx):
+            return src[radius + dy:rows - radius + dy, radius + dx:cols - radius + dx]
+
+        t = w1 * shifted(fy, fx) + w2 * shifted(fy, cx) + w3 * shifted(cy, fx) + w4 * shifted(cy, cx)
+        codes += ((t > center) | (np.abs(t - center) < eps)).astype(np.int32) << n
+
+    # One normalized histogram per grid cell, concatenated row by row
+    patterns = 2 ** neighbors
+    height, width = codes.shape[0] // grid_y, codes.shape[1] // grid_x
+    cells = codes[:height * grid_y, :width * grid_x].reshape(grid_y, height, grid_x, width)
+    cell_index = np.arange(grid_y * grid_x, dtype=np.int32).reshape(grid_y, 1, grid_x, 1)
+    counts = np.bincount((cell_index * patterns + cells).ravel(), minlength=grid_y * grid_x * patterns)
+    return (counts / np.float32(height * width)).astype(np.float32)
+
+
+def chi_square(sampled, values, sample_sums):
+    """Partial OpenCV HISTCMP_CHISQR_ALT distances over a subset of bins
+
+    sampled holds the chosen bins (rows) of every sample (columns) and values the
+    query's entries for them. Bins where the query is zero contribute exactly
+    the sample's own value, so distance = sum of these terms over the query's
+    non-zero bins + (sample total - sample sum over those bins), doubled.
+    """
+    diff = sampled - values[:, None]
+    return (diff * diff / (sampled + values[:, None])).sum(axis=0) - sampled.sum(axis=0)
+
+
+class QuantizedGallery:
+    """LBPH training histograms in one contiguous, optionally quantized array
+
+    The array is bin-major (bins x samples): a prediction only reads the bins
+    that are non-zero in the query, and in this layout those are whole
+    contiguous rows instead of a strided gather across every sample.
+    """
+
+    def __init__(self, histograms, labels, dtype='uint8', radius=1, neighbors=8, grid_x=8, grid_y=8,
+                 threshold=float('inf'), block_elements=1 << 22, shortlist=None, index_dims=64):
+        # shortlist: students passed from the coarse index to the exact search; None searches everyone
+        self.dtype = dtype
+        self.labels = np.asarray(labels, dtype=np.int32)
+        self.params = {'radius': radius, 'neighbors': neighbors, 'grid_x': grid_x, 'grid_y': grid_y}
+        self.threshold = threshold
+        self.block_elements = block_elements
+        self.medoids = None
+        self.shortlist = shortlist
+        self.index_dims = index_dims
+        self.set_histograms(np.asarray(histograms, dtype=np.float32))
+
+    def set_histograms(self, histograms):
+        """Store (samples x bins) float32 histograms in the gallery's dtype and layout"""
+        if self.dtype == 'uint8':
+            # Per-sample scale keeps the full 0-255 range for every histogram
+            peaks = histograms.max(axis=1)
+            self.scales = np.where(peaks > 0, peaks / 255.0, 1.0).astype(np.float32)
+            histograms = np.rint(histograms / self.scales[:, None])
+        else:
+            self.scales = None
+        self.data = np.ascontiguousarray(histograms.T.astype(self.dtype))
+        self.sample_sums = self.samples(slice(None)).sum(axis=1)
+        self.build_index()
+
+    def group_students(self):
+        """Distinct labels and, for each, the indices of its samples"""
+        order = np.argsort(self.labels, kind='stable')
+        students, starts = np.unique(self.labels[order], return_index=True)
+        self.students = students
+        self.student_rows = np.split(order, starts[1:])
+
+    def build_index(self):
+        """Project each student's mean square-rooted histogram onto its top principal components
+
+        The components come from the student means themselves. With no more
+        students than index_dims they span all the means, and ranking by
+        projected distance is exactly ranking by Hellinger distance to the means.
+        """
+        self.group_students()
+        bins = self.data.shape[0]
+        if not len(self):
+            self.index_mean = np.zeros(bins, dtype=np.float32)
+            self.index_basis = np.zeros((bins, 0), dtype=np.float32)
+            self.index_points = np.zeros((0, 0), dtype=np.float32)
+            return
+        means = np.stack([np.sqrt(self.samples(rows)).mean(axis=0) for rows in self.student_rows])
+        self.index_mean = means.mean(axis=0)
+        centered = (means - self.index_mean).astype(np.float64)
+        # Eigenvectors of the small students x students Gram matrix give the components
+        values, vectors = np.linalg.eigh(centered @ centered.T)
+        keep = np.argsort(values)[::-1][:self.index_dims]
+        keep = keep[values[keep] > values.max() * 1e-6]
+        self.index_basis = (centered.T @ (vectors[:, keep] / np.sqrt(values[keep]))).astype(np.float32)
+        self.index_points = (centered @ self.index_basis).astype(np.float32)
+
+    @classmethod
+    def from_recognizer(cls, recognizer, dtype='uint8'):
+        """Build a gallery from a trained cv2 LBPH recognizer"""
+        histograms = np.vstack([h.reshape(1, -1) for h in recognizer.getHistograms()])
+        return cls(histograms, np.asarray(recognizer.getLabels()).ravel(), dtype=dtype,
+                   radius=recognizer.getRadius(), neighbors=recognizer.getNeighbors(),
+                   grid_x=recognizer.getGridX(), grid_y=recognizer.getGridY(),
+                   threshold=recognizer.getThreshold())
+
+    def __len__(self):
+        return self.data.shape[1]
+
+    def samples(self, index):
+        """Dequantized (samples x bins) float32 histograms for a slice or index array"""
+        values = self.data[:, index].T.astype(np.float32)
+        if self.scales is not None:
+            values *= self.scales[index][:, None]
+        return values
+
+    def distances(self, query, index=None):
+        """Chi-square distance from a query histogram to every sample, or to the given sample indices
+
+        Face histograms leave most LBP patterns unused, so only the query's
+        non-zero bins are read, a block of bins at a time.
+        """
+        columns = slice(None) if index is None else index
+        sums = self.sample_sums[columns]
+        scales = self.scales[columns] if self.scales is not None else None
+        bins = np.flatnonzero(query)
+        step = max(1, self.block_elements // max(1, len(sums)))
+        total = np.zeros(len(sums), dtype=np.float64)
+        for start in range(0, len(bins), step):
+            block = bins[start:start + step]
+            if index is None or 4 * len(index) > len(self):
+                sampled = self.data[block][:, columns].astype(np.float32)
+            else:
+                # A short candidate list gathers only its own samples instead of whole bin rows
+                sampled = self.data[np.ix_(block, index)].astype(np.float32)
+            if scales is not None:
+                sampled *= scales
+            total += chi_square(sampled, query[block], sums)
+        return 2.0 * (total + sums)
+
+    def candidates(self, query):
+        """Sample indices of the students closest to a query in the coarse index, or None for all"""
+        if not self.shortlist or len(self.students) <= self.shortlist:
+            return None
+        point = (np.sqrt(query) - self.index_mean) @ self.index_basis
+        coarse = ((self.index_points - point) ** 2).sum(axis=1)
+        nearest = np.argpartition(coarse, self.shortlist - 1)[:self.shortlist]
+        return np.sort(np.concatenate([self.student_rows[n] for n in nearest]))
+
+    def predict(self, gray):
+        """Return (label, confidence) like LBPHFaceRecognizer.predict"""
+        query = lbph_histogram(gray, **self.params)
+        if len(self) == 0:
+            return -1, float('inf')
+        index = self.candidates(query)
+        distances = self.distances(query, index)
+        best = int(np.argmin(distances))
+        if float(distances[best]) >= self.threshold:
+            return -1, float('inf')
+        sample = best if index is None else int(index[best])
+        return int(self.labels[sample]), float(distances[best])
+
+    def reduce_to_medoids(self, k):
+        """Keep at most k representative samples per student
+
+        Medoids are picked greedily under the Hellinger distance (Euclidean on
+        square-rooted histograms), which tracks chi-square closely and can be
+        computed for all pairs with one matrix product per student.
+        """
+        keep = []
+        for label in np.unique(self.labels):
+            rows = np.flatnonzero(self.labels == label)
+            if len(rows) <= k:
+                keep.extend(rows)
+                continue
+            roots = np.sqrt(self.samples(rows))
+            squares = (roots * roots).sum(axis=1)
+            dist = np.sqrt(np.maximum(squares[:, None] + squares[None, :] - 2.0 * roots @ roots.T, 0.0))
+
+            chosen = [int(np.argmin(dist.sum(axis=1)))]
+            nearest = dist[chosen[0]].copy()
+            while len(chosen) < k:
+                gains = np.maximum(nearest[None, :] - dist, 0.0).sum(axis=1)
+                gains[chosen] = -1.0
+                candidate = int(np.argmax(gains))
+                chosen.append(candidate)
+                nearest = np.minimum(nearest, dist[candidate])
+            keep.extend(rows[chosen])
+
+        keep = np.sort(np.asarray(keep, dtype=np.int64))
+        self.data = np.ascontiguousarray(self.data[:, keep])
+        self.labels = self.labels[keep]
+        if self.scales is not None:
+            self.scales = self.scales[keep]
+        self.sample_sums = self.sample_sums[keep]
+        self.medoids = k
+        self.build_index()
+        return len(keep)
+
+    @property
+    def memory_bytes(self):
+        total = self.data.nbytes + self.labels.nbytes + self.sample_sums.nbytes
+        total += self.index_mean.nbytes + self.index_basis.nbytes + self.index_points.nbytes
+        return total + (self.scales.nbytes if self.scales is not None else 0)
+
+    def save(self, path=GALLERY_FILE):
+        """Write the gallery as an uncompressed .npz for fast loading"""
+        np.savez(path, data=self.data, labels=self.labels, sample_sums=self.sample_sums,
+                 scales=self.scales if self.scales is not None else np.empty(0, np.float32),
+                 dtype=self.dtype, medoids=-1 if self.medoids is None else self.medoids,
+                 threshold=self.threshold, index_mean=self.index_mean, index_basis=self.index_basis,
+                 index_points=self.index_points, **self.params)
+
+    @classmethod
+    def load(cls, path=GALLERY_FILE, shortlist=None, index_dims=64):
+        """Load a gallery saved with save()"""
+        with np.load(path) as stored:
+            gallery = cls.__new__(cls)
+            gallery.dtype = str(stored['dtype'])
+            gallery.data = stored['data']
+            gallery.labels = stored['labels']
+            gallery.sample_sums = stored['sample_sums']
+            gallery.scales = stored['scales'] if stored['scales'].size else None
+            gallery.medoids = None if int(stored['medoids']) < 0 else int(stored['medoids'])
+            gallery.threshold = float(stored['threshold'])
+            gallery.params = {key: int(stored[key]) for key in ('radius', 'neighbors', 'grid_x', 'grid_y')}
+            gallery.block_elements = 1 << 22
+            gallery.shortlist = shortlist
+            gallery.index_dims = index_dims
+            if 'index_basis' in stored:
+                gallery.index_mean = stored['index_mean']
+                gallery.index_basis = stored['index_basis']
+                gallery.index_points = stored['index_points']
+                gallery.group_students()
+            else:
+                # Saved before the coarse index existed
+                gallery.build_index()
+        return gallery
+
+    def get_stats(self):
+        return {
+            'dtype': self.dtype,
+            'samples': len(self),
+            'students': int(len(np.unique(self.labels))),
+            'medoids': self.medoids,
+            'shortlist': self.shortlist,
+            'index_dims': int(self.index_basis.shape[1]),
+            'memory_mb': round(self.memory_bytes / 1024 / 1024, 2)
+        }
+
+
+def evaluate_galleries(attendance_system, holdout_every=5, configs=None, max_queries=None):
+    """Compare gallery configurations against the OpenCV recognizer on held-out samples
+
+    Every holdout_every-th training image of each student is held out; the rest
+    train a fresh LBPH model that each configuration is built from. Returns one
+    row per configuration with memory, load time, predict latency and accuracy.
+    """
+    # (dtype, medoids per student, shortlist of students)
+    configs = configs or [('float32', None, None), ('float16', None, None), ('uint8', None, None),
+                          ('uint8', 10, None), ('uint8', 5, None), ('uint8', None, 10), ('uint8', None, 3)]
+    system = attendance_system
+    paths = system.get_training_image_paths("TrainingImage")
+    seen = {}
+    train_paths, test_paths = [], []
+    for path in paths:
+        sample = os.path.basename(path).split('_')
+        key = sample[2] if len(sample) > 2 else ''
+        seen[key] = seen.get(key, 0) + 1
+        (test_paths if seen[key] % holdout_every == 0 else train_paths).append(path)
+    if not train_paths or not test_paths:
+        return []
+
+    recognizer = system.create_recognizer()
+    for n, (faces, ids, _) in enumerate(system.iter_training_chunks(train_paths, system.training_memory_mb * 1024 * 1024)):
+        (recognizer.train if n == 0 else recognizer.update)(faces, np.array(ids))
+
+    queries = [s for s in (system.load_training_image(p) for p in test_paths[:max_queries]) if s is not None]
+    rows = []
+
+    def measure(name, predictor, memory_bytes, load_ms):
+        start = time.perf_counter()
+        predictions = [predictor.predict(face) for face, _ in queries]
+        latency = (time.perf_counter() - start) * 1000 / len(queries)
+        correct = sum(1 for (label, _), (_, truth) in zip(predictions, queries) if label == truth)
+        rows.append({'config': name, 'memory_mb': round(memory_bytes / 1024 / 1024, 2),
+                     'load_ms': round(load_ms, 1), 'predict_ms': round(latency, 2),
+                     'accuracy': round(correct / len(queries) * 100, 1)})
+        return predictions
+
+    with tempfile.TemporaryDirectory() as tmp:
+        model_path = os.path.join(tmp, "model.yml")
+        recognizer.write(model_path)
+        start = time.perf_counter()
+        reloaded = system.create_recognizer()
+        reloaded.read(model_path)
+        load_ms = (time.perf_counter() - start) * 1000
+        # OpenCV holds each histogram as float32 internally
+        baseline_bytes = sum(h.nbytes for h in recognizer.getHistograms())
+        baseline = measure('opencv', reloaded, baseline_bytes, load_ms)
+
+        for dtype, medoids, shortlist in configs:
+            gallery = QuantizedGallery.from_recognizer(recognizer, dtype)
+            if medoids:
+                gallery.reduce_to_medoids(medoids)
+            path = os.path.join(tmp, f"gallery_{dtype}_{medoids}.npz")
+            gallery.save(path)
+            start = time.perf_counter()
+            loaded = QuantizedGallery.load(path, shortlist=shortlist)
+            load_ms = (time.perf_counter() - start) * 1000
+            name = dtype + (f"+{medoids}medoids" if medoids else '') + (f"+top{shortlist}" if shortlist else '')
+            predictions = measure(name, loaded, loaded.memory_bytes, load_ms)
+            agree = sum(1 for a, b in zip(predictions, baseline) if a[0] == b[0])
+            rows[-1]['agreement'] = round(agree / len(queries) * 100, 1)
+
+    rows[0]['agreement'] = 100.0
+    for row in rows:
+        row['queries'] = len(queries)
+        row['train_samples'] = len(train_paths)
+    return rows
+
+
+def write_gallery_report(rows):
+    """Save evaluate_galleries() rows as a CSV report and return its path"""
+    os.makedirs("Reports", exist_ok=True)
+    filename = f"Reports/Gallery_Report_{datetime.datetime.now().strftime('%d_%m_%Y_%H%M%S')}.csv"
+    with open(filename, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=['config', 'memory_mb', 'load_ms', 'predict_ms', 'accuracy',
+                                                  'agreement', 'queries', 'train_samples'])
+        writer.writeheader()
+        writer.writerows(rows)
+    return filename
@@ -4,9 +4,13 @@ from tkinter import ttk, messagebox as mess
 import tkinter.simpledialog as tsd
 from datetime import datetime
 import os
+import sys
 import csv
+import queue
+import threading
 import pandas as pd
 from core_logic import AttendanceSystem
+from event_bus import SESSION_STARTED, SESSION_STOPPED, ATTENDANCE_RECORDED, MODEL_SWAPPED
 
 class ModernAttendanceGUI:
     def __init__(self):
@@ -16,6 +20,7 @@ class ModernAttendanceGUI:
             self.setup_styles()
             self.create_widgets()
             self.load_initial_data()
+            self.subscribe_events()
         except Exception as e:
             print(f"Error initializing GUI: {e}")
             # Show error message and exit gracefully
@@ -49,6 +54,9 @@ class ModernAttendanceGUI:
         # Set minimum size
         self.root.minsize(1200, 800)
         
+        # Toggle a profiling capture at runtime
+        self.root.bind('<Control-P>', lambda event: self.toggle_profiling())
+        
     def setup_styles(self):
         """Setup modern color scheme and styles"""
         self.COLORS = {
@@ -345,13 +353,144 @@ class ModernAttendanceGUI:
                                font=('Segoe UI', 18, 'bold'))
         header_label.pack(pady=20)
         
-        # Placeholder for analytics content
-        placeholder = tk.Label(analytics_container, 
-                              text="📊 Analytics and Reports will be displayed here", 
-                              fg=self.COLORS['dark'], 
-                              bg=self.COLORS['background'], 
-                              font=('Segoe UI', 14))
-        placeholder.pack(expand=True)
+        # Overall figures
+        totals_frame = tk.Frame(analytics_container, bg=self.COLORS['background'])
+        totals_frame.pack(fill='x', pady=(0, 10))
+        self.create_stat_card(totals_frame, "Total Records", "-", self.COLORS['secondary'], 0, 0)
+        self.create_stat_card(totals_frame, "Days Recorded", "-", self.COLORS['success'], 0, 1)
+        self.create_stat_card(totals_frame, "Sessions Held", "-", self.COLORS['warning'], 0, 2)
+        self.create_stat_card(totals_frame, "Overall Rate", "-", self.COLORS['info'], 0, 3)
+        
+        # Daily chart
+        chart_frame = tk.Frame(analytics_container, bg=self.COLORS['white'], relief='flat', bd=1)
+        chart_frame.pack(fill='x', pady=(0, 10))
+        self.analytics_chart = tk.Canvas(chart_frame, height=180, bg=self.COLORS['white'], highlightthickness=0)
+        self.analytics_chart.pack(fill='x', padx=20, pady=10)
+        self.analytics_chart.bind('<Configure>', lambda event: self.draw_analytics_chart())
+        
+        # Breakdown tables
+        tables_frame = tk.Frame(analytics_container, bg=self.COLORS['background'])
+        tables_frame.pack(fill='both', expand=True)
+        self.analytics_tables = {}
+        for col, (key, title, columns) in enumerate((
+                ('subjects', "📖 Subjects", ('Subject', 'Records', 'Sessions', 'Rate')),
+                ('departments', "🏛️ Departments", ('Department', 'Records', 'Rate')),
+                ('students', "👤 Lowest Attendance", ('PRN', 'Name', 'Attended', 'Rate')))):
+            frame = tk.Frame(tables_frame, bg=self.COLORS['white'], relief='flat', bd=1)
+            frame.grid(row=0, column=col, padx=5, sticky='nsew')
+            tables_frame.grid_columnconfigure(col, weight=1)
+            tk.Label(frame, text=title, fg=self.COLORS['primary'], bg=self.COLORS['white'],
+                    font=('Segoe UI', 12, 'bold')).pack(pady=(10, 5))
+            tree = ttk.Treeview(frame, columns=columns, show='headings', height=8)
+            for column in columns:
+                tree.heading(column, text=column)
+                tree.column(column, width=90)
+            tree.pack(fill='both', expand=True, padx=10, pady=(0, 10))
+            self.analytics_tables[key] = tree
+        tables_frame.grid_rowconfigure(0, weight=1)
+        
+        self.analytics_status = tk.Label(analytics_container, text="", fg=self.COLORS['dark'],
+                                        bg=self.COLORS['background'], font=('Segoe UI', 9))
+        self.analytics_status.pack(anchor='w', pady=(5, 0))
+        
+        # Aggregates are refreshed on a worker thread; the Tk thread only draws the results
+        self.analytics_view = None
+        self.analytics_results = queue.Queue()
+        self.analytics_busy = False
+        self.analytics_after = None
+        self.analytics_frame = analytics_frame
+        self.notebook.bind('<<NotebookTabChanged>>', lambda event: self.auto_refresh_analytics())
+        
+    def auto_refresh_analytics(self):
+        """Refresh analytics when its tab is shown, and every 30 seconds while it stays open"""
+        if self.notebook.select() == str(self.analytics_frame):
+            self.refresh_analytics()
+            
+    def refresh_analytics(self):
+        """Start a background refresh of the analytics aggregates"""
+        if self.analytics_busy:
+            return
+        self.analytics_busy = True
+        self.analytics_status.config(text="Updating analytics...")
+        threading.Thread(target=self.compute_analytics, name='analytics-refresh', daemon=True).start()
+        self.root.after(100, self.poll_analytics)
+        
+    def compute_analytics(self):
+        """Worker thread: update the aggregates and prepare everything the tab displays"""
+        try:
+            analytics = self.attendance_system.get_analytics()
+            changed = analytics.refresh()
+            summary = analytics.get_summary()
+            
+            def rows(table, columns, limit=200):
+                table = table.reset_index().head(limit)
+                table['Rate'] = table['Rate'].map(lambda rate: '-' if pd.isna(rate) else f"{rate}%")
+                return [tuple(row) for row in table[list(columns)].itertuples(index=False)]
+                
+            daily = summary['daily'].tail(30)
+            view = {
+                'totals': summary['totals'],
+                'daily': list(zip(daily.index, daily['Records'], daily['Rate'])),
+                'subjects': rows(summary['subjects'], ('Subject', 'Records', 'Sessions', 'Rate')),
+                'departments': rows(summary['departments'], ('Department', 'Records', 'Rate')),
+                'students': rows(summary['students'], ('PRN', 'Name', 'Attended', 'Rate')),
+                'status': f"Updated {datetime.now().strftime('%H:%M:%S')} ({changed} file(s) read)"
+            }
+        except Exception as e:
+            view = {'status': f"Error updating analytics: {e}"}
+        self.analytics_results.put(view)
+        
+    def poll_analytics(self):
+        """Tk thread: show finished analytics results"""
+        try:
+            view = self.analytics_results.get_nowait()
+        except queue.Empty:
+            self.root.after(100, self.poll_analytics)
+            return
+        self.analytics_busy = False
+        if self.analytics_after is not None:
+            self.root.after_cancel(self.analytics_after)
+        self.analytics_after = self.root.after(30000, self.auto_refresh_analytics)
+        self.analytics_status.config(text=view['status'])
+        if 'totals' not in view:
+            return
+        self.analytics_view = view
+        
+        totals = view['totals']
+        self.stat_total_records.config(text=str(totals['records']))
+        self.stat_days_recorded.config(text=str(totals['days']))
+        self.stat_sessions_held.config(text=str(totals['sessions']))
+        rate = totals['attendance_rate']
+        self.stat_overall_rate.config(text='-' if rate is None else f"{rate}%")
+        for key, tree in self.analytics_tables.items():
+            tree.delete(*tree.get_children())
+            for row in view[key]:
+                tree.insert('', 'end', values=row)
+        self.draw_analytics_chart()
+        
+    def draw_analytics_chart(self):
+        """Bar chart of the last 30 days: attendance rate where known, else record counts"""
+        canvas = self.analytics_chart
+        canvas.delete('all')
+        if not self.analytics_view or not self.analytics_view['daily']:
+            return
+        daily = self.analytics_view['daily']
+        width, height = canvas.winfo_width(), int(canvas['height'])
+        top, bottom, left = 20, height - 30, 10
+        use_rate = any(not pd.isna(rate) for _, _, rate in daily)
+        values = [0 if pd.isna(rate) else rate for _, _, rate in daily] if use_rate else [records for _, records, _ in daily]
+        peak = 100 if use_rate else max(max(values), 1)
+        step = (width - 2 * left) / len(values)
+        
+        canvas.create_text(left, 8, anchor='w', fill=self.COLORS['dark'], font=('Segoe UI', 9, 'bold'),
+                           text="Daily attendance rate (%)" if use_rate else "Daily attendance records")
+        for n, ((date, _, _), value) in enumerate(zip(daily, values)):
+            x = left + n * step
+            y = bottom - (bottom - top) * value / peak
+            canvas.create_rectangle(x + 2, y, x + step - 2, bottom, fill=self.COLORS['secondary'], outline='')
+            if len(values) <= 10 or n % 5 == 0:
+                canvas.create_text(x + step / 2, bottom + 12, text=date[:5], fill=self.COLORS['dark'],
+                                   font=('Segoe UI', 8))
         
     def create_footer(self):
         """Create the footer section"""
@@ -381,7 +520,8 @@ class ModernAttendanceGUI:
         value_label.pack(pady=(0, 15))
         
         # Store reference for updates
-        clean_title = title.replace(" ", "_").replace("'", "").lower()
+        # Icons are left out of the name, e.g. "📅 Today's Attendance" -> stat_todays_attendance
+        clean_title = ''.join(c for c in title if c.isascii()).strip().replace(" ", "_").replace("'", "").lower()
         attr_name = f'stat_{clean_title}'
         setattr(self, attr_name, value_label)
         
@@ -688,6 +828,10 @@ class ModernAttendanceGUI:
         """Update the time display"""
         current_time = datetime.now().strftime('%H:%M:%S')
         self.time_label.config(text=f"🕐 {current_time}")
+        
+        # Profiling requests (SIGUSR1 or Ctrl+Shift+P) start on the Tk thread only when no
+        # session is running; otherwise the session loop starts them on its own thread
+        self.attendance_system.profiler.tick(can_start=not self.attendance_system.is_attendance_active)
         self.root.after(1000, self.update_time)
         
     def load_initial_data(self):
@@ -695,6 +839,54 @@ class ModernAttendanceGUI:
         # This will be implemented to load data from the core logic
         pass
         
+    def subscribe_events(self):
+        """Follow attendance events instead of re-reading the files after every change"""
+        self.dashboard_events = self.attendance_system.events.subscribe(
+            'dashboard', types=(SESSION_STARTED, SESSION_STOPPED, ATTENDANCE_RECORDED, MODEL_SWAPPED), maxsize=500)
+        self.dashboard_dropped = 0
+        self.session_results = queue.Queue()
+        self.session_thread = None
+        self.root.after(500, self.poll_events)
+        
+    def poll_events(self):
+        """Tk thread: apply queued attendance events to the dashboard and the attendance table"""
+        refresh = False
+        for event in self.dashboard_events.drain():
+            if event.type == ATTENDANCE_RECORDED:
+                self.show_attendance_event(event.data)
+            elif event.type == SESSION_STARTED:
+                self.att_status_label.config(
+                    text=f"Session running: {event.data['subject']} "
+                         f"({event.data['attended']} of {event.data['expected']} marked)",
+                    fg=self.COLORS['info'])
+                refresh = True
+            else:
+                refresh = True
+        # Events were lost while the dashboard was busy: fall back to the files once
+        if self.dashboard_events.dropped != self.dashboard_dropped:
+            self.dashboard_dropped = self.dashboard_events.dropped
+            self.refresh_attendance_table()
+            refresh = True
+        if refresh:
+            self.update_statistics()
+        try:
+            result = self.session_results.get_nowait()
+            self.att_status_label.config(text=result, fg=self.COLORS['accent' if result.startswith("Error") else 'success'])
+        except queue.Empty:
+            pass
+        self.root.after(500, self.poll_events)
+        
+    def show_attendance_event(self, data):
+        """Add a newly recorded student to today's count and, if it matches the filters, the table"""
+        row = data['row']
+        if data['date'] == datetime.now().strftime('%d/%m/%Y') and hasattr(self, 'stat_todays_attendance'):
+            count = self.stat_todays_attendance.cget('text')
+            self.stat_todays_attendance.config(text=str(int(count) + 1 if count.isdigit() else 1))
+        subject = self.filter_subject.get()
+        if data['date'] == self.filter_date.get() and (not subject or subject == "All" or subject == data['subject']):
+            self.attendance_tree.insert('', 'end', values=(row[0], f"{row[1]} {row[2]}".strip(), row[3], row[4],
+                                                           row[5], row[6], 'Present'))
+        
     def clear_registration_form(self):
         """Clear the registration form"""
         # Clear entry fields
@@ -772,24 +964,42 @@ class ModernAttendanceGUI:
         if not self.validate_attendance_form():
             return
             
-        try:
-            result = self.attendance_system.start_attendance(
-                subject=self.subject_var.get(),
-                faculty=self.faculty_entry.get(),
-                date=self.attendance_date.get(),
-                time=self.attendance_time.get()
-            )
-            self.att_status_label.config(text=result, fg=self.COLORS['success'])
-        except Exception as e:
-            self.att_status_label.config(text=f"Error: {str(e)}", fg=self.COLORS['accent'])
+        session = {
+            'subject': self.subject_var.get(),
+            'faculty': self.faculty_entry.get(),
+            'date': self.attendance_date.get(),
+            'time': self.attendance_time.get()
+        }
+        if sys.platform == 'darwin':
+            # HighGUI windows must be created on the main thread there, so the session blocks the GUI
+            try:
+                result = self.attendance_system.start_attendance(**session)
+                self.att_status_label.config(text=result, fg=self.COLORS['success'])
+            except Exception as e:
+                self.att_status_label.config(text=f"Error: {str(e)}", fg=self.COLORS['accent'])
+            return
+            
+        # The session runs on its own thread; the dashboard follows it through the event bus
+        if self.session_thread is not None and self.session_thread.is_alive():
+            self.att_status_label.config(text="A session is already running", fg=self.COLORS['accent'])
+            return
+        self.att_status_label.config(text="Starting camera...", fg=self.COLORS['info'])
+        
+        def run_session():
+            try:
+                self.session_results.put(self.attendance_system.start_attendance(**session))
+            except Exception as e:
+                self.session_results.put(f"Error: {str(e)}")
+                
+        self.session_thread = threading.Thread(target=run_session, name='attendance-session', daemon=True)
+        self.session_thread.start()
             
     def stop_attendance(self):
         """Stop taking attendance"""
         try:
             result = self.attendance_system.stop_attendance()
             self.att_status_label.config(text=result, fg=self.COLORS['success'])
-            self.update_statistics()
-            self.refresh_attendance_table()
+            # The session's summary and statistics follow with its session_stopped event
         except Exception as e:
             self.att_status_label.config(text=f"Error: {str(e)}", fg=self.COLORS['accent'])
             
@@ -867,6 +1077,11 @@ class ModernAttendanceGUI:
         except Exception as e:
             print(f"Error updating statistics: {e}")
             
+    def toggle_profiling(self):
+        """Start or stop profiling the running application"""
+        result = self.attendance_system.toggle_profiling()
+        self.att_status_label.config(text=result, fg=self.COLORS['info'])
+        
     def show_settings(self):
         """Show settings dialog"""
         mess.showinfo("Settings", "Settings dialog will be implemented here")
@@ -0,0 +1,269 @@
+############################################# LOAD TEST MODULE ################################################
+"""
+Load-testing harness for concurrent attendance sessions.
+
+Each simulated session is a separate process with its own AttendanceSystem,
+fed by synthetic frames (with training crops pasted in as faces) or a recorded
+video played at camera speed. Every frame goes through the same
+AttendanceSystem.process_frame() call as a live session: motion gate, frame
+budget, detection, recognition and journaled attendance writes.
+
+Sessions run in a scratch directory holding the trained model and a generated
+registry, so the real StudentDetails and Attendance files are never touched.
+The saturation search doubles the session count until a step fails to keep
+up, then bisects between the last passing and the first failing count.
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import shutil
+import datetime
+import tempfile
+import multiprocessing as mp
+
+
+def _percentile(values, percent):
+    if not values:
+        return 0
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))], 2)
+
+
+def _usage():
+    """(cpu seconds, peak rss MB) of the calling process"""
+    try:
+        import resource
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        # ru_maxrss is in KiB on Linux and bytes on macOS
+        scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+        return usage.ru_utime + usage.ru_stime, usage.ru_maxrss / scale
+    except ImportError:
+        times = os.times()
+        return times.user + times.system, None
+
+
+def _training_labels(image_dir):
+    """Map each serial in the training images to the sorted list of its image paths"""
+    labels = {}
+    for filename in sorted(os.listdir(image_dir)):
+        parts = filename.split('_')
+        if filename.endswith('.jpg') and len(parts) > 2 and parts[2].isdigit():
+            labels.setdefault(int(parts[2]), []).append(os.path.join(image_dir, filename))
+    return labels
+
+
+def prepare_workdir(roster_size, base_dir="."):
+    """Create a scratch directory with the model, the cascade and a generated registry
+
+    The first roster_size serials known to the model form the expected cohort;
+    if the roster is larger than the model, the extra students can never be
+    recognized and show up as absentees, as they would in a real room.
+    """
+    workdir = tempfile.mkdtemp(prefix="attendance_loadtest_")
+    os.makedirs(os.path.join(workdir, "TrainingImageLabel"))
+    os.makedirs(os.path.join(workdir, "StudentDetails"))
+    model = os.path.abspath(os.path.join(base_dir, "TrainingImageLabel", "Trainner.yml"))
+    try:
+        os.symlink(model, os.path.join(workdir, "TrainingImageLabel", "Trainner.yml"))
+    except OSError:
+        shutil.copy2(model, os.path.join(workdir, "TrainingImageLabel"))
+    # The gallery is copied, not linked, so a session rebuilding it cannot touch the real one
+    gallery = os.path.join(base_dir, "TrainingImageLabel", "Gallery.npz")
+    if os.path.isfile(gallery):
+        shutil.copy2(gallery, os.path.join(workdir, "TrainingImageLabel"))
+    # Without the crop settings the sessions would feed raw crops to a model trained on normalized ones
+    normalization = os.path.join(base_dir, "TrainingImageLabel", "Normalization.json")
+    if os.path.isfile(normalization):
+        shutil.copy2(normalization, os.path.join(workdir, "TrainingImageLabel"))
+    shutil.copy(os.path.join(base_dir, "haarcascade_frontalface_default.xml"), workdir)
+
+    serials = sorted(_training_labels(os.path.join(base_dir, "TrainingImage")))
+    extra = range(max(serials, default=0) + 1, max(serials, default=0) + 1 + max(0, roster_size - len(serials)))
+    with open(os.path.join(workdir, "StudentDetails", "StudentDetails.csv"), 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['Serial', 'PRN', 'First Name', 'Last Name', 'Gender', 'Date of Birth', 'Roll Number',
+                         'Email', 'Phone Number', 'Department', 'Course', 'Year', 'Semester', 'Registration Date'])
+        for n, serial in enumerate(list(serials) + list(extra)):
+            department = "Load Test" if n < roster_size else "Other"
+            writer.writerow([serial, f"LT{serial}", "Student", str(serial), '', '', '', '', '',
+                             department, '', '1', '1', ''])
+    return workdir
+
+
+def session_worker(index, options, workdir, base_dir, barrier, results):
+    """Run one simulated session and put its metrics on the results queue"""
+    import cv2
+    from core_logic import AttendanceSystem
+    from frame_sources import open_frame_source
+
+    metrics = {'session': index}
+    try:
+        os.chdir(workdir)
+        system = AttendanceSystem(interactive=False, recognition_workers=options['recognition_workers'],
+                                  gallery_dtype=options['gallery'], background_compaction=False)
+        if options['source']:
+            source = open_frame_source(os.path.join(base_dir, options['source']) if not os.path.isabs(options['source'])
+                                       else options['source'], pacing='realtime', read_ahead=8, loop=True)
+        else:
+            # Each session shows its own students; density sets how many faces are in view
+            labels = _training_labels(os.path.join(base_dir, "TrainingImage"))
+            serials = sorted(labels)[:options['roster_size']]
+            faces = []
+            for n in range(options['faces']):
+                if serials:
+                    paths = labels[serials[(index * options['faces'] + n) % len(serials)]]
+                    faces.append(cv2.imread(paths[index % len(paths)], cv2.IMREAD_GRAYSCALE))
+            source = open_frame_source('synthetic', pacing='realtime', read_ahead=8, count=None,
+                                       fps=options['fps'], face_images=[f for f in faces if f is not None],
+                                       seed=index)
+
+        subject = f"Load Test {index}"
+        date = datetime.datetime.now().strftime('%d/%m/%Y')
+        clock = datetime.datetime.now().strftime('%H:%M:%S')
+        system.begin_session(subject, "Load Test", date, clock, department="Load Test")
+        barrier.wait(timeout=300)
+
+        latencies, frames, scanned, levels = [], 0, 0, []
+        cpu_start, _ = _usage()
+        start = time.perf_counter()
+        while time.perf_counter() - start < options['duration']:
+            ret, frame = source.read()
+            if not ret:
+                break
+            system.frame_scheduler.begin_frame()
+            began = time.perf_counter()
+            if system.process_frame(frame, subject, "Load Test", date, clock, source.timestamp) is not None:
+                scanned += 1
+            latencies.append((time.perf_counter() - began) * 1000)
+            system.frame_scheduler.end_frame()
+            levels.append(system.frame_scheduler.level)
+            frames += 1
+        elapsed = time.perf_counter() - start
+        cpu_end, peak_rss = _usage()
+
+        roster = system.current_session['roster']
+        system.end_session()
+        source.release()
+        metrics.update({
+            'frames': frames,
+            'frames_scanned': scanned,
+            'fps': round(frames / elapsed, 1) if elapsed else 0,
+            'latency_ms': {'p50': _percentile(latencies, 50), 'p95': _percentile(latencies, 95),
+                           'p99': _percentile(latencies, 99), 'max': round(max(latencies, default=0), 2)},
+            'cpu_percent': round((cpu_end - cpu_start) / elapsed * 100, 1) if elapsed else 0,
+            'peak_rss_mb': round(peak_rss, 1) if peak_rss is not None else None,
+            'max_load_level': max(levels, default=0),
+            'recognition': system.recognition_pool.get_stats(),
+            'attendance': roster.get_stats()
+        })
+    except Exception as e:
+        # Release the other sessions instead of leaving them waiting at the barrier
+        barrier.abort()
+        metrics['error'] = str(e) or type(e).__name__
+    results.put(metrics)
+
+
+class LoadTest:
+    """Runs steps of N concurrent sessions and searches for the saturation point"""
+
+    def __init__(self, duration=20.0, fps=15.0, faces=4, roster_size=60, source=None,
+                 recognition_workers=1, gallery=None, min_fps_ratio=0.9):
+        self.options = {
+            'duration': duration,
+            'fps': fps,
+            'faces': faces,
+            'roster_size': roster_size,
+            'source': source,
+            'recognition_workers': recognition_workers,
+            'gallery': gallery
+        }
+        self.min_fps_ratio = min_fps_ratio
+        self.steps = []
+
+    def run_step(self, sessions):
+        """Run the given number of sessions at once and return the step summary"""
+        base_dir = os.getcwd()
+        workdir = prepare_workdir(self.options['roster_size'], base_dir)
+        ctx = mp.get_context('spawn')
+        barrier = ctx.Barrier(sessions)
+        results = ctx.Queue()
+        workers = [ctx.Process(target=session_worker,
+                               args=(n, self.options, workdir, base_dir, barrier, results), daemon=True)
+                   for n in range(sessions)]
+        print(f"Load test: {sessions} session(s) for {self.options['duration']:.0f}s")
+        try:
+            for worker in workers:
+                worker.start()
+            per_session = []
+            for _ in workers:
+                try:
+                    per_session.append(results.get(timeout=self.options['duration'] + 120))
+                except Exception:
+                    per_session.append({'error': "Session did not report"})
+            for worker in workers:
+                worker.join(timeout=5)
+        finally:
+            for worker in workers:
+                if worker.is_alive():
+                    worker.terminate()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        step = self.summarize(sessions, per_session)
+        self.steps.append(step)
+        return step
+
+    def summarize(self, sessions, per_session):
+        """Aggregate per-session metrics and decide whether the step kept up"""
+        ok = [m for m in per_session if 'error' not in m]
+        target = self.options['fps'] * self.min_fps_ratio
+        budget_ms = 1000.0 / self.options['fps']
+        worst_fps = min((m['fps'] for m in ok), default=0)
+        worst_p95 = max((m['latency_ms']['p95'] for m in ok), default=0)
+        # A session keeps up when it reads frames at camera speed without the
+        # scheduler having to shed work and its p95 frame fits the frame budget
+        saturated = (len(ok) < sessions or worst_fps < target or worst_p95 > budget_ms
+                     or any(m['max_load_level'] > 1 for m in ok))
+        return {
+            'sessions': sessions,
+            'saturated': saturated,
+            'throughput_fps': round(sum(m['fps'] for m in ok), 1),
+            'worst_session_fps': worst_fps,
+            'worst_p95_ms': worst_p95,
+            'worst_p99_ms': max((m['latency_ms']['p99'] for m in ok), default=0),
+            'total_cpu_percent': round(sum(m['cpu_percent'] for m in ok), 1),
+            'total_rss_mb': round(sum(m['peak_rss_mb'] or 0 for m in ok), 1),
+            'errors': [m['error'] for m in per_session if 'error' in m],
+            'per_session': per_session
+        }
+
+    def find_saturation(self, max_sessions=64):
+        """Double the session count until a step saturates, then bisect; returns the largest passing count"""
+        passing, failing = 0, None
+        sessions = 1
+        while sessions <= max_sessions:
+            if self.run_step(sessions)['saturated']:
+                failing = sessions
+                break
+            passing = sessions
+            sessions *= 2
+        if failing is None:
+            return passing
+        while failing - passing > 1:
+            middle = (passing + failing) // 2
+            if self.run_step(middle)['saturated']:
+                failing = middle
+            else:
+                passing = middle
+        return passing
+
+    def write_results(self, saturation=None):
+        """Save the configuration and every step to Reports/ and return the path"""
+        os.makedirs("Reports", exist_ok=True)
+        filename = f"Reports/Load_Test_{datetime.datetime.now().strftime('%d_%m_%Y_%H%M%S')}.json"
+        with open(filename, 'w') as file:
+            json.dump({'options': self.options, 'cpu_count': os.cpu_count(),
+                       'saturation_sessions': saturation, 'steps': self.steps}, file, indent=2)
+        return filename
@@ -6,11 +6,21 @@ Main launcher for the face recognition attendance system
 
 import sys
 import os
-from gui import ModernAttendanceGUI
 
 def main():
     """Main entry point for the application"""
+    # Opt-in profiling: ATTENDANCE_PROFILE=sample,cprofile,memory or SIGUSR1 at runtime
+    from profiling import get_profiler
+    get_profiler().install_signal_toggle()
+    
+    # Any arguments select a headless command; the GUI (and Tk) is never loaded for them
+    if len(sys.argv) > 1:
+        from cli import main as cli_main
+        sys.exit(cli_main(sys.argv[1:]))
+        
     try:
+        from gui import ModernAttendanceGUI
+        
         # Check if required files exist
         if not os.path.exists("haarcascade_frontalface_default.xml"):
             print("Error: haarcascade_frontalface_default.xml not found!")
@@ -0,0 +1,138 @@
+############################################# PREVIEW MODULE ################################################
+"""
+Rate-limited preview window, decoupled from frame processing.
+
+The attendance loop hands each processed frame and its results to
+PreviewWindow.submit(), which only keeps one every 1/fps seconds. A display
+thread draws the overlays on the frames it actually shows, calls imshow and
+polls the keyboard, and passes key presses back through a queue, so the
+processing loop never waits on HighGUI. With fps=0 no window is opened at all
+and sessions are stopped through stop_attendance() or by the source ending.
+
+macOS only allows HighGUI on the main thread; there the same rate limit is
+applied but the frame is shown from the caller's thread.
+"""
+
+import sys
+import time
+import queue
+import threading
+import cv2
+
+
+class PreviewWindow:
+    """Shows at most fps frames per second, drawing overlays only for shown frames"""
+
+    def __init__(self, title, fps=10.0, draw=None, threaded=None):
+        # draw: callable(frame, state) that puts the overlays on a frame about to be shown
+        self.title = title
+        self.fps = fps or 0
+        self.interval = 1.0 / self.fps if self.fps > 0 else None
+        self.draw = draw
+        self.threaded = sys.platform != 'darwin' if threaded is None else threaded
+        self.keys = queue.SimpleQueue()
+        self.latest = None
+        self.ready = threading.Condition()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.last_submit = 0.0
+        self.frames_submitted = 0
+        self.frames_shown = 0
+        self.render_ms = 0.0
+
+    @property
+    def enabled(self):
+        return self.interval is not None
+
+    def start(self):
+        if self.enabled and self.threaded:
+            self.thread = threading.Thread(target=self._run, name='preview', daemon=True)
+            self.thread.start()
+        return self
+
+    def submit(self, frame, state=None):
+        """Offer a processed frame for display; frames inside the rate limit are dropped at once"""
+        if not self.enabled:
+            return
+        self.frames_submitted += 1
+        now = time.monotonic()
+        if now - self.last_submit < self.interval:
+            return
+        self.last_submit = now
+        if self.threaded:
+            with self.ready:
+                # Only the newest frame is kept; the display never falls behind
+                self.latest = (frame, state)
+                self.ready.notify()
+        else:
+            try:
+                self._show(frame, state)
+                self._poll_key(1)
+            except cv2.error as e:
+                print(f"Error: preview window unavailable, continuing without it ({e.err})")
+                self.interval = None
+
+    def pending_keys(self):
+        """Keys pressed in the window since the last call"""
+        keys = []
+        while True:
+            try:
+                keys.append(self.keys.get_nowait())
+            except queue.Empty:
+                return keys
+
+    def _show(self, frame, state):
+        start = time.perf_counter()
+        # The overlays go on a copy, leaving the caller's frame untouched
+        frame = frame.copy()
+        if self.draw is not None:
+            self.draw(frame, state)
+        cv2.imshow(self.title, frame)
+        self.frames_shown += 1
+        self.render_ms += (time.perf_counter() - start) * 1000
+
+    def _poll_key(self, delay_ms):
+        key = cv2.waitKey(delay_ms) & 0xFF
+        if key != 0xFF:
+            self.keys.put(key)
+
+    def _run(self):
+        try:
+            while not self.stopped.is_set():
+                with self.ready:
+                    if self.latest is None:
+                        self.ready.wait(self.interval)
+                    item, self.latest = self.latest, None
+                if item is not None:
+                    self._show(*item)
+                # Keeps the window responsive and reads keys even when no frame arrives
+                self._poll_key(1)
+        except cv2.error as e:
+            # No display (e.g. a headless OpenCV build): the session carries on without a window
+            print(f"Error: preview window unavailable, continuing without it ({e.err})")
+            self.interval = None
+        finally:
+            # HighGUI windows belong to the thread that created them
+            if self.frames_shown:
+                cv2.destroyWindow(self.title)
+                cv2.waitKey(1)
+
+    def close(self):
+        """Stop the display thread and close the window"""
+        self.stopped.set()
+        if self.thread is not None:
+            with self.ready:
+                self.ready.notify()
+            self.thread.join(timeout=2)
+            self.thread = None
+        elif self.enabled and self.frames_shown:
+            cv2.destroyWindow(self.title)
+            cv2.waitKey(1)
+
+    def get_stats(self):
+        return {
+            'fps_limit': self.fps,
+            'frames_submitted': self.frames_submitted,
+            'frames_shown': self.frames_shown,
+            'avg_render_ms': round(self.render_ms / self.frames_shown, 2) if self.frames_shown else 0
+        }
@@ -0,0 +1,232 @@
+############################################# PROFILING MODULE ################################################
+"""
+Opt-in profiling for the live application.
+
+Modes (any combination):
+    sample   - background stack sampler over all threads, written as collapsed
+               stacks ("a;b;c 42") for flamegraph.pl or speedscope
+    cprofile - cProfile of the attendance loop thread, written as a .pstats file
+    memory   - tracemalloc snapshots, with the top allocation growth written as text
+
+Enable at startup with ATTENDANCE_PROFILE=sample,cprofile,memory (and optionally
+ATTENDANCE_PROFILE_SECONDS=30), or toggle at runtime by sending SIGUSR1 to the
+process on POSIX systems. Each capture runs for a bounded window and writes its
+files to Profiles/.
+"""
+
+import os
+import sys
+import time
+import signal
+import cProfile
+import datetime
+import threading
+import tracemalloc
+from collections import Counter
+
+MODES = ('sample', 'cprofile', 'memory')
+
+
+class Profiler:
+    """Bounded-window profiler that can be started and stopped while the app runs"""
+
+    def __init__(self, output_dir="Profiles", modes=('sample',), window=30.0, sample_interval=0.005):
+        self.output_dir = output_dir
+        self.modes = tuple(modes)
+        self.window = window
+        self.sample_interval = sample_interval
+        self.lock = threading.Lock()
+        self.requested = None  # True to start, False to stop, None for no change
+        self.active = False
+        self.started_at = 0.0
+        self.profile = None
+        self.profile_thread = None
+        self.profile_path = None
+        self.profile_outputs = []
+        self.sampler = None
+        self.stacks = Counter()
+        self.memory_start = None
+        self.last_outputs = []
+
+    @classmethod
+    def from_environment(cls):
+        """Create a profiler configured from ATTENDANCE_PROFILE, already requested to start if set"""
+        modes = [m.strip() for m in os.environ.get('ATTENDANCE_PROFILE', '').split(',') if m.strip() in MODES]
+        window = float(os.environ.get('ATTENDANCE_PROFILE_SECONDS', 30))
+        profiler = cls(modes=modes or ('sample',), window=window)
+        if modes:
+            profiler.request_start()
+        return profiler
+
+    def request_start(self):
+        """Ask for a capture to start on the next tick (safe from any thread or signal handler)"""
+        self.requested = True
+
+    def request_stop(self):
+        """Ask for the running capture to stop on the next tick"""
+        self.requested = False
+
+    def toggle(self, *_):
+        """Start a capture if none is running, otherwise stop it"""
+        self.requested = not self.active
+
+    def install_signal_toggle(self):
+        """Toggle profiling on SIGUSR1; only possible from the main thread on POSIX"""
+        if hasattr(signal, 'SIGUSR1') and threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGUSR1, self.toggle)
+            return True
+        return False
+
+    def tick(self, can_start=True):
+        """Apply pending requests and end the window when it expires
+
+        Called regularly from the thread to be profiled (the attendance loop or
+        the Tk event loop), since cProfile only sees the thread that enabled it.
+        A thread that should not own the capture, such as the Tk loop while a
+        session is running, passes can_start=False and leaves start requests to
+        the session's own tick. A cProfile capture stopped from another thread is
+        written here, by its own thread.
+        """
+        if self.profile_path is not None and threading.current_thread() is self.profile_thread:
+            with self.lock:
+                if self.profile is not None:
+                    self._write_profile(self.profile_path)
+        requested = self.requested
+        if requested is True and not can_start:
+            requested = None
+        else:
+            self.requested = None
+        if requested is True and not self.active:
+            self.start()
+        elif self.active and (requested is False or time.monotonic() - self.started_at >= self.window):
+            return self.stop()
+        return None
+
+    def start(self):
+        """Start capturing in the calling thread"""
+        with self.lock:
+            if self.active:
+                return
+            self.active = True
+            self.started_at = time.monotonic()
+            self.stacks = Counter()
+            self.profile_outputs = []
+
+            if 'memory' in self.modes:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start(25)
+                self.memory_start = tracemalloc.take_snapshot()
+            if 'sample' in self.modes:
+                self.sampler = threading.Thread(target=self._sample_loop, name='stack-sampler', daemon=True)
+                self.sampler.start()
+            if 'cprofile' in self.modes:
+                self.profile = cProfile.Profile()
+                self.profile_thread = threading.current_thread()
+                self.profile.enable()
+        print(f"Profiling started ({', '.join(self.modes)}) for up to {self.window:.0f}s")
+
+    def _sample_loop(self):
+        own_id = threading.get_ident()
+        names = {}
+        while self.active:
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[';'.join(reversed(stack))] += 1
+            time.sleep(self.sample_interval)
+
+    def stop(self):
+        """Stop capturing and write the output files, returning their paths"""
+        with self.lock:
+            if not self.active:
+                return []
+            self.active = False
+            os.makedirs(self.output_dir, exist_ok=True)
+            stamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+            outputs = list(self.profile_outputs)
+
+            if self.profile is not None:
+                path = os.path.join(self.output_dir, f"profile_{stamp}.pstats")
+                outputs.append(path)
+                if threading.current_thread() is self.profile_thread or not self.profile_thread.is_alive():
+                    self._write_profile(path)
+                else:
+                    # Only the thread that enabled cProfile can disable it; it writes the file on its next tick
+                    self.profile_path = path
+
+            if self.sampler is not None:
+                self.sampler.join()
+                self.sampler = None
+                path = os.path.join(self.output_dir, f"stacks_{stamp}.collapsed")
+                with open(path, 'w') as file:
+                    for stack, count in self.stacks.most_common():
+                        file.write(f"{stack} {count}\n")
+                outputs.append(path)
+
+            if self.memory_start is not None:
+                snapshot = tracemalloc.take_snapshot()
+                snapshot.dump(os.path.join(self.output_dir, f"memory_{stamp}.snapshot"))
+                path = os.path.join(self.output_dir, f"memory_{stamp}.txt")
+                with open(path, 'w') as file:
+                    current, peak = tracemalloc.get_traced_memory()
+                    file.write(f"Traced memory: current {current / 1e6:.1f} MB, peak {peak / 1e6:.1f} MB\n\n")
+                    file.write("Top allocation growth since profiling started:\n")
+                    for stat in snapshot.compare_to(self.memory_start, 'lineno')[:25]:
+                        file.write(f"{stat}\n")
+                outputs.append(path)
+                self.memory_start = None
+                tracemalloc.stop()
+
+        self.last_outputs = outputs
+        print(f"Profiling stopped, wrote {', '.join(outputs) if outputs else 'nothing'}")
+        return outputs
+
+    def _write_profile(self, path):
+        """Disable cProfile and dump its stats; called with the lock held"""
+        self.profile.disable()
+        self.profile.dump_stats(path)
+        self.profile = None
+        self.profile_thread = None
+        self.profile_path = None
+
+    def release_thread(self):
+        """Write the cProfile capture now if the calling thread owns it, before that thread ends"""
+        with self.lock:
+            if self.profile is None or threading.current_thread() is not self.profile_thread:
+                return
+            path = self.profile_path
+            if path is None:
+                os.makedirs(self.output_dir, exist_ok=True)
+                stamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+                path = os.path.join(self.output_dir, f"profile_{stamp}.pstats")
+                self.profile_outputs.append(path)
+            self._write_profile(path)
+
+    def get_status(self):
+        """Get whether a capture is running and the files from the last one"""
+        return {
+            'active': self.active,
+            'modes': list(self.modes),
+            'window_seconds': self.window,
+            'elapsed_seconds': round(time.monotonic() - self.started_at, 1) if self.active else 0,
+            'last_outputs': self.last_outputs
+        }
+
+
+_profiler = None
+
+
+def get_profiler():
+    """Process-wide profiler shared by the launcher, the GUI and the attendance loop"""
+    global _profiler
+    if _profiler is None:
+        _profiler = Profiler.from_environment()
+    return _profiler
@@ -0,0 +1,353 @@
+############################################# RECOGNITION SERVICE MODULE ################################################
+"""
+Shared recognition daemon for the processes on one machine.
+
+Every GUI or camera process normally loads its own copy of the trained model.
+RecognitionServer loads it once and listens on a Unix domain socket; each
+client sends the face crops of a frame in one request. Requests that arrive
+within a short window (5 ms by default) are gathered into one batch and run
+through the recognition thread pool together, so the model is held in memory
+once and the pool stays busy when many cameras are active.
+
+Messages are a fixed header (JSON length, payload length) followed by a JSON
+header and raw uint8 pixels, so nothing received from the socket is unpickled.
+The server reloads the model when Trainner.yml or Gallery.npz change on disk.
+
+AttendanceSystem(recognition_service=...) or the ATTENDANCE_RECOGNITION_SERVICE
+environment variable (a socket path, or "1" for the default) switches a process
+to client mode; if the daemon cannot be reached the process loads the model
+itself.
+"""
+
+import os
+import json
+import time
+import queue
+import socket
+import struct
+import threading
+import numpy as np
+from gallery import GALLERY_FILE
+
+SOCKET_PATH = "Sessions/recognition.sock"
+MODEL_FILE = "TrainingImageLabel/Trainner.yml"
+HEADER = struct.Struct('!II')
+
+
+def service_path(setting):
+    """Socket path for a recognition_service setting: a path, True/"1" for the default, or None"""
+    if setting is None:
+        setting = os.environ.get('ATTENDANCE_RECOGNITION_SERVICE', '')
+    if setting is True or str(setting).lower() in ('1', 'true', 'yes'):
+        return SOCKET_PATH
+    return setting or None
+
+
+def _recv_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def send_message(sock, header, payload=b''):
+    data = json.dumps(header).encode()
+    sock.sendall(HEADER.pack(len(data), len(payload)) + data + payload)
+
+
+def recv_message(sock):
+    """Read one message and return (header, payload), or None when the peer closed the connection"""
+    sizes = _recv_exact(sock, HEADER.size)
+    if sizes is None:
+        return None
+    header_size, payload_size = HEADER.unpack(sizes)
+    header = _recv_exact(sock, header_size)
+    payload = _recv_exact(sock, payload_size) if payload_size else b''
+    if header is None or payload is None:
+        return None
+    return json.loads(header), payload
+
+
+def pack_crops(crops):
+    """Shapes and concatenated pixels of grey uint8 crops"""
+    arrays = [np.ascontiguousarray(crop, dtype=np.uint8) for crop in crops]
+    return [list(a.shape) for a in arrays], b''.join(a.tobytes() for a in arrays)
+
+
+def unpack_crops(shapes, payload):
+    crops, offset = [], 0
+    for height, width in shapes:
+        size = height * width
+        if offset + size > len(payload):
+            raise ValueError("Crop data is shorter than its shapes")
+        crops.append(np.frombuffer(payload, dtype=np.uint8, count=size, offset=offset).reshape(height, width))
+        offset += size
+    return crops
+
+
+class PendingRequest:
+    """One client's crops waiting for the next batch"""
+
+    def __init__(self, crops):
+        self.crops = crops
+        self.predictions = None
+        self.done = threading.Event()
+
+
+class RecognitionServer:
+    """Loads the model once and serves micro-batched predictions over a Unix socket"""
+
+    def __init__(self, attendance_system, socket_path=SOCKET_PATH, batch_window=0.005, max_batch=64,
+                 reload_interval=1.0):
+        # batch_window: how long the first request of a batch waits for others to join it
+        # max_batch:    crops after which a batch is run without waiting out the window
+        self.system = attendance_system
+        self.socket_path = socket_path
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.reload_interval = reload_interval
+        self.pending = queue.Queue()
+        self.stopped = threading.Event()
+        self.listener = None
+        self.model_signature = self.current_signature()
+        self.last_model_check = time.monotonic()
+        self.clients = 0
+        self.requests = 0
+        self.batches = 0
+        self.crops = 0
+        self.batch_ms = 0.0
+        self.largest_batch = 0
+        self.stats_lock = threading.Lock()
+
+    @staticmethod
+    def current_signature():
+        return tuple(os.stat(path).st_mtime_ns if os.path.isfile(path) else None
+                     for path in (MODEL_FILE, GALLERY_FILE))
+
+    def bind(self):
+        """Create the listening socket, replacing a socket file left behind by a dead server"""
+        if not hasattr(socket, 'AF_UNIX'):
+            raise OSError("Unix domain sockets are not supported on this platform")
+        if os.path.exists(self.socket_path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.socket_path)
+                raise OSError(f"A recognition service is already listening on {self.socket_path}")
+            except (ConnectionRefusedError, FileNotFoundError):
+                os.remove(self.socket_path)
+            finally:
+                probe.close()
+        os.makedirs(os.path.dirname(self.socket_path) or '.', exist_ok=True)
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(self.socket_path)
+        os.chmod(self.socket_path, 0o660)
+        self.listener.listen(64)
+
+    def serve_forever(self):
+        """Accept clients until stop() is called"""
+        if self.listener is None:
+            self.bind()
+        batcher = threading.Thread(target=self.batch_loop, name='recognition-batcher', daemon=True)
+        batcher.start()
+        print(f"Recognition service listening on {self.socket_path}")
+        try:
+            while not self.stopped.is_set():
+                try:
+                    conn, _ = self.listener.accept()
+                except OSError:
+                    break
+                threading.Thread(target=self.handle_client, args=(conn,),
+                                 name='recognition-client', daemon=True).start()
+        finally:
+            self.stop()
+            batcher.join(timeout=5)
+
+    def stop(self):
+        self.stopped.set()
+        if self.listener is not None:
+            try:
+                self.listener.close()
+            except OSError:
+                pass
+            self.listener = None
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+    def handle_client(self, conn):
+        """Answer one client's requests in order until it disconnects"""
+        with self.stats_lock:
+            self.clients += 1
+        try:
+            while not self.stopped.is_set():
+                message = recv_message(conn)
+                if message is None:
+                    break
+                header, payload = message
+                op = header.get('op')
+                if op == 'predict':
+                    request = PendingRequest(unpack_crops(header.get('shapes', []), payload))
+                    self.pending.put(request)
+                    request.done.wait()
+                    send_message(conn, {'predictions': request.predictions})
+                elif op == 'stats':
+                    send_message(conn, self.get_stats())
+                else:
+                    send_message(conn, {'error': f"Unknown operation: {op}"})
+        except (OSError, ValueError) as e:
+            print(f"Error serving recognition client: {e}")
+        finally:
+            conn.close()
+            with self.stats_lock:
+                self.clients -= 1
+
+    def batch_loop(self):
+        """Gather requests arriving within the batch window and predict them together"""
+        while not self.stopped.is_set():
+            try:
+                first = self.pending.get(timeout=0.5)
+            except queue.Empty:
+                self.check_model()
+                continue
+            batch, count = [first], len(first.crops)
+            deadline = time.monotonic() + self.batch_window
+            while count < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self.pending.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(request)
+                count += len(request.crops)
+            try:
+                self.run_batch(batch)
+            except Exception as e:
+                # Never leave clients waiting on a batch that failed
+                print(f"Error in recognition batch: {e}")
+                for request in batch:
+                    if not request.done.is_set():
+                        request.predictions = [None] * len(request.crops)
+                        request.done.set()
+
+    def run_batch(self, batch):
+        self.check_model()
+        start = time.perf_counter()
+        crops = [crop for request in batch for crop in request.crops]
+        predictions = self.system.recognition_pool.predict_all(self.system.predictor, crops)
+        offset = 0
+        for request in batch:
+            request.predictions = [None if p is None else [int(p[0]), float(p[1])]
+                                   for p in predictions[offset:offset + len(request.crops)]]
+            offset += len(request.crops)
+            request.done.set()
+        with self.stats_lock:
+            self.batch_ms += (time.perf_counter() - start) * 1000
+            self.requests += len(batch)
+            self.batches += 1
+            self.crops += len(crops)
+            self.largest_batch = max(self.largest_batch, len(crops))
+
+    def check_model(self):
+        """Reload the model when a training run in another process has replaced it"""
+        now = time.monotonic()
+        if now - self.last_model_check < self.reload_interval:
+            return
+        self.last_model_check = now
+        signature = self.current_signature()
+        # A model saved less than a check interval ago may still be being written
+        if signature != self.model_signature and time.time() - (signature[0] or 0) / 1e9 >= self.reload_interval:
+            print("Recognition service: model changed on disk, reloading")
+            if self.system.load_face_recognizer():
+                # Rebuilding the gallery may have rewritten it; that is not a new change
+                self.model_signature = self.current_signature()
+
+    def get_stats(self):
+        with self.stats_lock:
+            return {
+                'clients': self.clients,
+                'requests': self.requests,
+                'batches': self.batches,
+                'crops': self.crops,
+                'avg_batch_crops': round(self.crops / self.batches, 2) if self.batches else 0,
+                'avg_requests_per_batch': round(self.requests / self.batches, 2) if self.batches else 0,
+                'largest_batch': self.largest_batch,
+                'avg_batch_ms': round(self.batch_ms / self.batches, 2) if self.batches else 0,
+                'predictor': type(self.system.predictor).__name__
+            }
+
+
+class RecognitionClient:
+    """Predictor that forwards crops to a RecognitionServer
+
+    Used in place of the recognizer: RecognitionPool sends all crops of a frame
+    through predict_many() in one round trip. If the service goes away the
+    client reconnects once and otherwise switches to the predictor returned by
+    fallback(), normally the process's own copy of the model.
+    """
+
+    def __init__(self, socket_path=SOCKET_PATH, timeout=10.0, fallback=None):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.fallback = fallback
+        self.local = None
+        self.sock = None
+        self.lock = threading.Lock()
+
+    def connect(self):
+        """Open the connection, returning False if no service is listening"""
+        if not hasattr(socket, 'AF_UNIX'):
+            return False
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            return False
+        self.sock = sock
+        return True
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def request(self, header, payload=b''):
+        if self.sock is None and not self.connect():
+            raise ConnectionError(f"No recognition service on {self.socket_path}")
+        send_message(self.sock, header, payload)
+        reply = recv_message(self.sock)
+        if reply is None:
+            raise ConnectionError("Recognition service closed the connection")
+        return reply[0]
+
+    def predict_many(self, crops):
+        """(label, confidence) per crop, or None where prediction failed"""
+        if self.local is not None:
+            return [self.local.predict(crop) for crop in crops]
+        shapes, payload = pack_crops(crops)
+        with self.lock:
+            for attempt in range(2):
+                try:
+                    reply = self.request({'op': 'predict', 'shapes': shapes}, payload)
+                    return [None if p is None else (p[0], p[1]) for p in reply['predictions']]
+                except (OSError, ValueError, KeyError) as e:
+                    self.close()
+                    error = e
+        if self.fallback is None:
+            raise ConnectionError(f"Recognition service unavailable: {error}")
+        print(f"Error: recognition service unavailable ({error}); using the local model")
+        self.local = self.fallback()
+        return [self.local.predict(crop) for crop in crops]
+
+    def predict(self, gray):
+        return self.predict_many([gray])[0]
+
+    def get_stats(self):
+        with self.lock:
+            return self.request({'op': 'stats'})
@@ -0,0 +1,198 @@
+############################################# SESSION JOURNAL MODULE ################################################
+"""
+Append-only journal for an attendance session.
+
+Every attendance (and throttled recognition) event is appended as one JSON line.
+Lines are buffered and written by a background thread that fsyncs once per
+batch (group commit), so the video loop never waits on the disk. There is one
+journal per subject and day, locked by the session that has it open. If the
+process dies, starting the same subject again that day replays the journal to
+rebuild the set of students already marked. When the session ends the journal
+is compacted into the attendance CSV and removed.
+"""
+
+import os
+import json
+import time
+import threading
+from file_locks import FileLock
+
+
+class SessionJournal:
+    """Append-only event log for one attendance session"""
+
+    def __init__(self, path, commit_interval=0.2, batch_size=64, recognition_interval=30.0):
+        # commit_interval:      longest time an event waits in memory before fsync
+        # batch_size:           pending events that trigger an early commit
+        # recognition_interval: seconds between logged recognitions of the same student
+        self.path = path
+        self.commit_interval = commit_interval
+        self.batch_size = batch_size
+        self.recognition_interval = recognition_interval
+        self.attended = set()
+        self.rows = []
+        self.last_recognized = {}
+        self.pending = []
+        self.file = None
+        self.owner = None
+        self.lock = threading.Lock()
+        self.wakeup = threading.Condition(self.lock)
+        self.flusher = None
+        self.closing = False
+        self.commits = 0
+        self.replayed_events = 0
+
+    @staticmethod
+    def session_path(directory, subject, date):
+        """Journal file name for a subject's session on a date, safe on every platform
+
+        The start time is not part of the name, so a session restarted after a
+        crash finds the journal of the one it replaces.
+        """
+        key = f"{date}_{subject}"
+        for char in '/\\: ':
+            key = key.replace(char, '_')
+        return os.path.join(directory, f"Session_{key}.journal")
+
+    @staticmethod
+    def claim(path):
+        """Lock a journal for this session, or return None if a live session already has it"""
+        owner = FileLock(path, timeout=0)
+        try:
+            owner.acquire()
+        except TimeoutError:
+            return None
+        return owner
+
+    def open(self, header=None):
+        """Replay any existing journal, then start appending to it
+
+        Raises RuntimeError if another live session has the journal open.
+        """
+        self.owner = self.claim(self.path)
+        if self.owner is None:
+            raise RuntimeError(f"{self.path} is in use by another session")
+        try:
+            resumed = os.path.isfile(self.path)
+            if resumed:
+                self.replay()
+            self.file = open(self.path, 'a', encoding='utf-8')
+        except Exception:
+            self.owner.release()
+            self.owner = None
+            raise
+        self.flusher = threading.Thread(target=self._flush_loop, name='journal-flusher', daemon=True)
+        self.flusher.start()
+
+        self.append({'type': 'session_resume' if resumed else 'session_start', **(header or {})})
+        return resumed
+
+    def replay(self):
+        """Rebuild session state from the journal on disk"""
+        with open(self.path, 'r', encoding='utf-8') as file:
+            for line in file:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    # A crash can leave a partially written last line
+                    continue
+                self.replayed_events += 1
+                if event.get('type') == 'attendance' and event['student_id'] not in self.attended:
+                    self.attended.add(event['student_id'])
+                    self.rows.append(event['row'])
+        return self.attended
+
+    def append(self, event):
+        """Queue an event for the next group commit"""
+        event.setdefault('ts', time.time())
+        line = json.dumps(event, separators=(',', ':')) + '\n'
+        with self.lock:
+            self.pending.append(line)
+            if len(self.pending) >= self.batch_size:
+                self.wakeup.notify()
+
+    def record_attendance(self, student_id, row):
+        """Journal a new attendance row; returns False if the student is already marked"""
+        if student_id in self.attended:
+            return False
+        self.attended.add(student_id)
+        self.rows.append(row)
+        self.append({'type': 'attendance', 'student_id': student_id, 'row': row})
+        return True
+
+    def record_recognition(self, student_id, confidence):
+        """Journal a recognition, at most once per interval for each student"""
+        now = time.monotonic()
+        if now - self.last_recognized.get(student_id, -self.recognition_interval) < self.recognition_interval:
+            return
+        self.last_recognized[student_id] = now
+        self.append({'type': 'recognized', 'student_id': student_id, 'confidence': round(float(confidence), 2)})
+
+    def commit(self):
+        """Write pending events and fsync them in one batch"""
+        with self.lock:
+            lines, self.pending = self.pending, []
+        if not lines or self.file is None:
+            return
+        self.file.write(''.join(lines))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.commits += 1
+
+    def _flush_loop(self):
+        while True:
+            with self.lock:
+                # Wait for a full batch or the commit interval, whichever comes first
+                if not self.closing and len(self.pending) < self.batch_size:
+                    self.wakeup.wait(self.commit_interval)
+                closing = self.closing
+            self.commit()
+            if closing:
+                break
+
+    def close(self):
+        """Commit everything still pending and stop the flusher"""
+        if self.file is None:
+            return
+        with self.lock:
+            self.closing = True
+            self.wakeup.notify()
+        if self.flusher is not None:
+            self.flusher.join()
+        self.commit()
+        self.file.close()
+        self.file = None
+        if self.owner is not None:
+            self.owner.release()
+            self.owner = None
+
+    @staticmethod
+    def read_header(path):
+        """Return the first event of a journal file (the session details)"""
+        with open(path, 'r', encoding='utf-8') as file:
+            try:
+                return json.loads(file.readline())
+            except ValueError:
+                return {}
+
+    def compact(self, write_rows):
+        """Hand all attendance rows to write_rows in one call, then remove the journal"""
+        self.append({'type': 'session_end', 'attended': len(self.attended)})
+        # Held until the journal is gone, so startup recovery elsewhere leaves it alone
+        owner, self.owner = self.owner, None
+        self.close()
+        try:
+            write_rows(self.rows)
+            os.remove(self.path)
+        finally:
+            if owner is not None:
+                owner.release()
+
+    def get_stats(self):
+        """Get journal counters"""
+        return {
+            'path': self.path,
+            'attended': len(self.attended),
+            'commits': self.commits,
+            'replayed_events': self.replayed_events
+        }
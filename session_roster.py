@@ -0,0 +1,144 @@
+############################################# SESSION ROSTER MODULE ################################################
+"""
+Expected-student rosters for attendance sessions.
+
+StudentIndex keeps the registry in memory and re-reads StudentDetails.csv only
+when the file changes. When a session starts, SessionRoster resolves the
+students expected for it (by department, year and semester, taken from the
+session or from the subject's cohort in SubjectCohorts.csv) into an in-memory
+set, so identity lookups, the live "attended N of M" count and the absentee
+list never touch the disk while frames are being processed.
+
+SubjectCohorts.csv is optional and maps each subject to the cohort that takes it:
+
+    Subject,Department,Year,Semester
+    Data Structures,Computer Engineering,2,3
+"""
+
+import os
+import csv
+
+SERIAL_KEYS = ('Serial', 'SERIAL NO.', 'serial', 'SERIAL')
+COHORT_FIELDS = ('Department', 'Year', 'Semester')
+
+
+def student_key(student_info, serial=''):
+    """Identifier used for attendance: the PRN, or the legacy ID column"""
+    return student_info.get('PRN', student_info.get('ID', str(serial)))
+
+
+class StudentIndex:
+    """Registry rows by serial number, reloaded only when the CSV changes"""
+
+    def __init__(self, csv_file="StudentDetails/StudentDetails.csv"):
+        self.csv_file = csv_file
+        self.signature = None
+        self.by_serial = {}
+
+    def refresh(self):
+        """Re-read the registry if it changed since the last read and return the index"""
+        try:
+            stat = os.stat(self.csv_file)
+            signature = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            signature = None
+        if signature == self.signature:
+            return self.by_serial
+
+        by_serial = {}
+        if signature is not None:
+            try:
+                with open(self.csv_file, 'r', newline='') as file:
+                    for row in csv.DictReader(file):
+                        # Try different possible column names for serial
+                        for key in SERIAL_KEYS:
+                            if key in row and row[key] and row[key].strip():
+                                try:
+                                    by_serial[int(row[key])] = row
+                                except ValueError:
+                                    # One bad row must not make every lookup re-read the file
+                                    print(f"Skipping student row with invalid serial {row[key]!r}")
+                                break
+            except Exception as e:
+                print(f"Error reading student info: {e}")
+                return self.by_serial
+        self.by_serial = by_serial
+        self.signature = signature
+        return by_serial
+
+    def get(self, serial_id):
+        return self.refresh().get(int(serial_id))
+
+
+def load_subject_cohorts(csv_file="StudentDetails/SubjectCohorts.csv"):
+    """Map each subject to its cohort filters, or return {} if no mapping file exists"""
+    cohorts = {}
+    if os.path.isfile(csv_file):
+        try:
+            with open(csv_file, 'r', newline='') as file:
+                for row in csv.DictReader(file):
+                    subject = (row.get('Subject') or '').strip()
+                    if subject:
+                        cohorts[subject] = {field: (row.get(field) or '').strip() for field in COHORT_FIELDS}
+        except Exception as e:
+            print(f"Error reading subject cohorts: {e}")
+    return cohorts
+
+
+def resolve_cohort(subject, department=None, year=None, semester=None, cohorts=None):
+    """Cohort filters for a session: explicit values win over the subject's mapping"""
+    cohort = dict((cohorts if cohorts is not None else load_subject_cohorts()).get(subject, {}))
+    for field, value in zip(COHORT_FIELDS, (department, year, semester)):
+        if value:
+            cohort[field] = str(value).strip()
+    return {field: value for field, value in cohort.items() if value}
+
+
+class SessionRoster:
+    """Expected students of one session and who of them has attended so far"""
+
+    def __init__(self, students_by_serial, cohort=None):
+        self.students = students_by_serial
+        self.cohort = cohort or {}
+        wanted = {field: value.lower() for field, value in self.cohort.items()}
+        self.expected = {}
+        for serial, row in students_by_serial.items():
+            if all((row.get(field) or '').strip().lower() == value for field, value in wanted.items()):
+                self.expected[student_key(row, serial)] = row
+        self.attended = set()
+        self.attended_expected = 0
+
+    def lookup(self, serial_id):
+        """Registry row for a recognized serial number, from memory"""
+        return self.students.get(int(serial_id))
+
+    def mark(self, student_id):
+        """Record that a student attended, returning False if they were already marked"""
+        if student_id in self.attended:
+            return False
+        self.attended.add(student_id)
+        if student_id in self.expected:
+            self.attended_expected += 1
+        return True
+
+    def absentees(self):
+        """Expected students who have not attended, in registry order"""
+        return [row for key, row in self.expected.items() if key not in self.attended]
+
+    def unexpected(self):
+        """Attended students who are not on this session's roster"""
+        return sorted(self.attended - self.expected.keys())
+
+    @property
+    def rate(self):
+        return round(self.attended_expected / len(self.expected) * 100, 1) if self.expected else 0
+
+    def get_stats(self):
+        return {
+            'cohort': self.cohort,
+            'expected': len(self.expected),
+            'attended': self.attended_expected,
+            'unexpected': len(self.attended) - self.attended_expected,
+            'absent': len(self.expected) - self.attended_expected,
+            'attendance_rate': self.rate
+        }
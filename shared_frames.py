@@ -0,0 +1,312 @@
+############################################# SHARED FRAME RING MODULE ################################################
+"""
+Multi-process attendance pipeline.
+
+A capture process writes camera frames into a ring of slots in shared memory and
+hands out slot indices to N recognition worker processes. Workers map the slot
+directly (no pickling of frames) and send back only small recognition results,
+which the parent process turns into attendance records as the single writer.
+"""
+
+import os
+import queue
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import cv2
+import numpy as np
+from frame_pipeline import MotionGate, detect_faces
+from frame_sources import open_frame_source
+from face_crops import FaceNormalizer
+
+# Slot states in the metadata table
+SLOT_FREE = 0
+SLOT_READY = 1
+
+# Metadata columns per slot
+META_STATE, META_SEQ, META_HEIGHT, META_WIDTH, META_CHANNELS = range(5)
+
+
+class SharedFrameRing:
+    """Fixed set of frame slots in shared memory plus a small metadata table"""
+
+    def __init__(self, slots=8, max_width=1920, max_height=1080, channels=3, name=None, create=True):
+        self.slots = slots
+        self.max_width = max_width
+        self.max_height = max_height
+        self.channels = channels
+        self.slot_bytes = max_width * max_height * channels
+        self.owner = create
+
+        if create:
+            self.frames_shm = shared_memory.SharedMemory(create=True, size=self.slot_bytes * slots)
+            self.meta_shm = shared_memory.SharedMemory(create=True, size=slots * 5 * 8)
+        else:
+            self.frames_shm = shared_memory.SharedMemory(name=name[0])
+            self.meta_shm = shared_memory.SharedMemory(name=name[1])
+
+        self.buffer = np.ndarray((slots, self.slot_bytes), dtype=np.uint8, buffer=self.frames_shm.buf)
+        self.meta = np.ndarray((slots, 5), dtype=np.int64, buffer=self.meta_shm.buf)
+        if create:
+            self.meta[:] = 0
+        self.next_slot = 0
+
+    @property
+    def names(self):
+        return (self.frames_shm.name, self.meta_shm.name)
+
+    def layout(self):
+        """Arguments needed to attach to this ring from another process"""
+        return {
+            'slots': self.slots,
+            'max_width': self.max_width,
+            'max_height': self.max_height,
+            'channels': self.channels,
+            'name': self.names
+        }
+
+    @classmethod
+    def attach(cls, layout):
+        """Attach to a ring created by another process"""
+        return cls(create=False, **layout)
+
+    def write(self, frame, seq):
+        """Copy a frame into the next free slot and return its index, or None if all are busy"""
+        h, w = frame.shape[:2]
+        if w > self.max_width or h > self.max_height:
+            scale = min(self.max_width / w, self.max_height / h)
+            frame = cv2.resize(frame, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+            h, w = frame.shape[:2]
+        if frame.ndim == 2:
+            frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+
+        for offset in range(self.slots):
+            slot = (self.next_slot + offset) % self.slots
+            if self.meta[slot, META_STATE] == SLOT_FREE:
+                self.view(slot, h, w)[:] = frame
+                self.meta[slot, META_SEQ] = seq
+                self.meta[slot, META_HEIGHT] = h
+                self.meta[slot, META_WIDTH] = w
+                self.meta[slot, META_CHANNELS] = self.channels
+                self.meta[slot, META_STATE] = SLOT_READY
+                self.next_slot = (slot + 1) % self.slots
+                return slot
+        return None
+
+    def view(self, slot, height=None, width=None):
+        """Return an ndarray view of a slot without copying"""
+        if height is None:
+            height = int(self.meta[slot, META_HEIGHT])
+            width = int(self.meta[slot, META_WIDTH])
+        size = height * width * self.channels
+        return self.buffer[slot, :size].reshape(height, width, self.channels)
+
+    def release(self, slot):
+        """Hand a slot back to the capture process"""
+        self.meta[slot, META_STATE] = SLOT_FREE
+
+    def close(self):
+        """Detach from shared memory, removing it if this process created it"""
+        del self.buffer, self.meta
+        self.frames_shm.close()
+        self.meta_shm.close()
+        if self.owner:
+            self.frames_shm.unlink()
+            self.meta_shm.unlink()
+
+
+def capture_process(source, layout, task_queue, stats_queue, stop_event, worker_count, use_motion_gate,
+                    capture_settings=None):
+    """Read frames from the camera into the ring and queue their slot indices"""
+    ring = SharedFrameRing.attach(layout)
+    camera = open_frame_source(source, capture=capture_settings)
+    motion_gate = MotionGate() if use_motion_gate else None
+    captured = dropped = static = 0
+
+    try:
+        while not stop_event.is_set():
+            ret, frame = camera.read()
+            if not ret:
+                break
+            captured += 1
+
+            if motion_gate is not None:
+                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                if not motion_gate.should_process(gray, camera.timestamp):
+                    static += 1
+                    continue
+
+            # Workers are behind when every slot is still in use; drop the frame
+            # rather than block, so recognition always works on recent footage
+            slot = ring.write(frame, captured)
+            if slot is None:
+                dropped += 1
+                continue
+            task_queue.put((slot, captured))
+    finally:
+        camera.release()
+        for _ in range(worker_count):
+            task_queue.put(None)
+        stats_queue.put({'frames_captured': captured, 'frames_dropped': dropped, 'frames_static': static})
+        ring.close()
+
+
+def load_predictor(spec):
+    """Predictor for a worker process, as described by ParallelAttendanceSession.predictor_spec()"""
+    if spec['mode'] == 'service':
+        from recognition_service import RecognitionClient
+        client = RecognitionClient(spec['socket'], fallback=lambda: load_predictor(spec['fallback']))
+        if client.connect():
+            return client
+        spec = spec['fallback']
+    if spec['mode'] == 'gallery':
+        from gallery import QuantizedGallery
+        return QuantizedGallery.load(spec['path'], shortlist=spec['shortlist'])
+    try:
+        recognizer = cv2.face.LBPHFaceRecognizer_create()
+    except AttributeError:
+        recognizer = cv2.face_LBPHFaceRecognizer.create()
+    recognizer.read(spec['path'])
+    return recognizer
+
+
+def recognition_worker(layout, task_queue, result_queue, predictor_spec, cascade_path, detector, crop_settings):
+    """Detect and recognize faces in ring slots and send back the predictions
+
+    Results are (seq, predictions); a worker that fails sends (None, error)
+    instead. Either way it ends with a None sentinel, so the parent never waits
+    for a worker that is gone.
+    """
+    ring = None
+    try:
+        ring = SharedFrameRing.attach(layout)
+        face_cascade = cv2.CascadeClassifier(cascade_path)
+        predictor = load_predictor(predictor_spec)
+        normalizer = FaceNormalizer.from_settings(crop_settings)
+
+        while True:
+            task = task_queue.get()
+            if task is None:
+                break
+            slot, seq = task
+
+            # The grey conversion is the only copy; the slot is free again right after
+            gray = cv2.cvtColor(ring.view(slot), cv2.COLOR_BGR2GRAY)
+            ring.release(slot)
+
+            boxes = [tuple(int(v) for v in box) for box in detect_faces(face_cascade, gray, **detector)]
+            crops = [normalizer.crop(gray, box) for box in boxes]
+            predictions = []
+            try:
+                # The recognition service answers all faces of a frame in one round trip
+                if hasattr(predictor, 'predict_many'):
+                    results = predictor.predict_many(crops) if crops else []
+                else:
+                    results = [predictor.predict(crop) for crop in crops]
+                for box, result in zip(boxes, results):
+                    if result is not None:
+                        predictions.append((int(result[0]), float(result[1]), box))
+            except Exception as e:
+                print(f"Error in face recognition (worker {os.getpid()}): {e}")
+            result_queue.put((seq, predictions))
+    except Exception as e:
+        result_queue.put((None, f"{type(e).__name__}: {e}"))
+    finally:
+        result_queue.put(None)
+        if ring is not None:
+            ring.close()
+
+
+class ParallelAttendanceSession:
+    """Runs capture and recognition in separate processes and records attendance in the parent"""
+
+    def __init__(self, attendance_system, workers=None, slots=None, source=0,
+                 max_width=1920, max_height=1080, use_motion_gate=True):
+        self.system = attendance_system
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.slots = slots or self.workers * 2
+        self.source = source
+        self.max_width = max_width
+        self.max_height = max_height
+        self.use_motion_gate = use_motion_gate
+        self.stats = {}
+
+    def predictor_spec(self, model_path):
+        """How workers load the predictor the parent uses: the recognition service, the gallery or the model"""
+        local = {'mode': 'model', 'path': model_path}
+        if self.system.gallery is not None:
+            from gallery import GALLERY_FILE
+            local = {'mode': 'gallery', 'path': GALLERY_FILE, 'shortlist': self.system.gallery_shortlist}
+        if self.system.recognition_client is not None:
+            return {'mode': 'service', 'socket': self.system.recognition_client.socket_path, 'fallback': local}
+        return local
+
+    def run(self, subject, faculty, date, time, model_path="TrainingImageLabel/Trainner.yml",
+            cascade_path="haarcascade_frontalface_default.xml"):
+        """Run the session until the system is stopped or the source ends"""
+        ctx = mp.get_context('spawn')
+        ring = SharedFrameRing(self.slots, self.max_width, self.max_height)
+        task_queue = ctx.Queue(maxsize=self.slots)
+        result_queue = ctx.Queue()
+        stats_queue = ctx.Queue()
+        stop_event = ctx.Event()
+
+        capture = ctx.Process(target=capture_process,
+                              args=(self.source, ring.layout(), task_queue, stats_queue,
+                                    stop_event, self.workers, self.use_motion_gate,
+                                    self.system.capture_config),
+                              daemon=True)
+        workers = [ctx.Process(target=recognition_worker,
+                               args=(ring.layout(), task_queue, result_queue,
+                                     self.predictor_spec(model_path), cascade_path, self.system.detector_config,
+                                     self.system.face_normalizer.settings()),
+                               daemon=True)
+                   for _ in range(self.workers)]
+
+        processed = 0
+        finished_workers = 0
+        errors = []
+        try:
+            capture.start()
+            for worker in workers:
+                worker.start()
+
+            while finished_workers < len(workers):
+                if not self.system.is_attendance_active:
+                    stop_event.set()
+                self.system.profiler.tick()
+                try:
+                    item = result_queue.get(timeout=0.5)
+                except queue.Empty:
+                    # Workers killed outright send nothing; without any, nothing is left to wait for
+                    if not any(w.is_alive() for w in workers):
+                        break
+                    continue
+                if item is None:
+                    finished_workers += 1
+                    continue
+                if item[0] is None:
+                    print(f"Error in recognition worker: {item[1]}")
+                    errors.append(item[1])
+                    continue
+
+                processed += 1
+                _, predictions = item
+                for label, confidence, _ in predictions:
+                    self.system.record_prediction(label, confidence, subject, faculty, date, time)
+        finally:
+            self.system.profiler.release_thread()
+            stop_event.set()
+            for worker in workers:
+                worker.join(timeout=5)
+            capture.join(timeout=5)
+            if capture.is_alive():
+                # Blocked on a full task queue that no worker is left to drain
+                capture.terminate()
+            try:
+                self.stats = stats_queue.get(timeout=1)
+            except queue.Empty:
+                self.stats = {}
+            ring.close()
+
+        self.stats.update(frames_processed=processed, workers=self.workers, slots=self.slots, worker_errors=errors)
+        return self.stats
@@ -0,0 +1,440 @@
+############################################# STATUS API MODULE ################################################
+"""
+Local HTTP status and query API, served from memory.
+
+StatusServer runs inside the attendance process on the standard library's HTTP
+server, with requests handled by a small thread pool. It binds to 127.0.0.1 by
+default, since it has no authentication. All responses are JSON:
+
+    GET /status                 live session state and today's totals
+    GET /session                the running session's roster, with absentees
+    GET /attendance             today's attendance (?date=dd-mm-yyyy, ?subject=...)
+    GET /students               every registered student with attendance totals
+    GET /students/<prn>         one student's totals, subjects and today's sessions
+    GET /metrics                pipeline, recognition and event bus metrics
+
+AttendanceIndex answers the attendance and student queries without touching
+the CSV files. It reads the store once at startup, then follows the
+attendance_recorded events on the system's event bus, and re-reads today's
+partition only when another process has changed it. Every change bumps a
+version. Responses carry an ETag derived from it, so a dashboard polling with
+If-None-Match gets a bodiless 304 until something happens.
+
+AttendanceSystem(status_api=...) or the ATTENDANCE_STATUS_API environment
+variable ("1" for the default port 8765, a port, or host:port) starts it.
+"""
+
+import os
+import json
+import time
+import hashlib
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs, unquote
+from attendance_store import parse_date, format_date, row_key
+from session_roster import student_key
+from event_bus import SESSION_STARTED, SESSION_STOPPED, ATTENDANCE_RECORDED, MODEL_SWAPPED
+
+API_HOST = "127.0.0.1"
+API_PORT = 8765
+
+
+def api_address(setting):
+    """(host, port) for a status_api setting: "host:port", a port, True/"1" for the default, or None"""
+    if setting is None:
+        setting = os.environ.get('ATTENDANCE_STATUS_API', '')
+    if setting is True or str(setting).lower() in ('1', 'true', 'yes'):
+        return API_HOST, API_PORT
+    if not setting or str(setting).lower() in ('0', 'false', 'no'):
+        return None
+    host, _, port = str(setting).rpartition(':')
+    return host or API_HOST, int(port)
+
+
+class AttendanceIndex:
+    """Recent attendance rows and per-student totals in memory, kept current from the event bus"""
+
+    def __init__(self, system, window_days=31, check_interval=30.0):
+        # window_days:    days whose rows are kept for /attendance; older days are read from the store
+        # check_interval: seconds between checks of today's partition for rows from other processes
+        self.system = system
+        self.window_days = window_days
+        self.check_interval = check_interval
+        self.lock = threading.RLock()
+        self.days = {}
+        self.keys = set()
+        self.students = {}
+        self.version = 0
+        self.loaded = False
+        self.partition_signature = None
+        self.last_check = 0.0
+        # Subscribed before loading, so nothing recorded meanwhile is missed; rows are de-duplicated
+        self.subscription = system.events.subscribe(
+            'status-index', self.handle, types=(ATTENDANCE_RECORDED, SESSION_STARTED, SESSION_STOPPED, MODEL_SWAPPED),
+            maxsize=10000, policy='block')
+
+    def load(self):
+        """Read every stored day once, a month at a time"""
+        store = self.system.attendance_store
+        manifest = store.load_manifest()
+        stored = [parse_date(d) for entry in manifest['segments'].values() for d in entry['days']]
+        stored.extend(store.daily_files())
+        today = datetime.date.today()
+        month = min([d for d in stored if d] + [today]).replace(day=1)
+        while month <= today:
+            following = (month + datetime.timedelta(days=32)).replace(day=1)
+            last = min(today, following - datetime.timedelta(days=1))
+            for row in store.read(format_date(month), format_date(last)):
+                self.add_row(row)
+            month = following
+        self.check_partition(force=True)
+        with self.lock:
+            self.loaded = True
+            self.version += 1
+
+    def add_row(self, row):
+        """Count one attendance row, once; returns whether it was new"""
+        day = parse_date(row[5])
+        if day is None:
+            return False
+        recent = day >= datetime.date.today() - datetime.timedelta(days=self.window_days)
+        with self.lock:
+            key = row_key(row)
+            if key in self.keys:
+                return False
+            if recent:
+                # Older days cannot be written twice through events, so only recent keys are kept
+                self.keys.add(key)
+                self.days.setdefault(day, []).append(list(row))
+            student = self.students.setdefault(row[0], {'records': 0, 'subjects': {}, 'first_seen': None,
+                                                         'last_seen': None})
+            student['name'] = f"{row[1]} {row[2]}".strip() or student.get('name', '')
+            student['records'] += 1
+            student['subjects'][row[3]] = student['subjects'].get(row[3], 0) + 1
+            stamp = (day, row[6])
+            if student['first_seen'] is None or stamp < student['first_seen']:
+                student['first_seen'] = stamp
+            if student['last_seen'] is None or stamp > student['last_seen']:
+                student['last_seen'] = stamp
+            self.version += 1
+            return True
+
+    def handle(self, event):
+        """Event subscriber: count new rows and move the version on session and model changes"""
+        if event.type == ATTENDANCE_RECORDED:
+            self.add_row(event.data['row'])
+            return
+        if event.type == SESSION_STARTED:
+            # A resumed session's earlier rows come from its journal, not from events
+            journal = self.system.journal
+            for row in list(journal.rows) if journal else []:
+                self.add_row(row)
+        with self.lock:
+            self.version += 1
+
+    def check_partition(self, force=False):
+        """Pick up rows other processes appended to today's partition since the last check"""
+        now = time.monotonic()
+        if not force and now - self.last_check < self.check_interval:
+            return
+        self.last_check = now
+        today = format_date(datetime.date.today())
+        path = self.system.attendance_store.daily_path(today)
+        try:
+            stat = os.stat(path)
+            signature = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            signature = None
+        if signature == self.partition_signature:
+            return
+        self.partition_signature = signature
+        if signature is not None:
+            for row in self.system.attendance_store.read_file(path):
+                self.add_row(row)
+        # Days that left the window are dropped; their totals stay
+        horizon = datetime.date.today() - datetime.timedelta(days=self.window_days)
+        with self.lock:
+            for day in [d for d in self.days if d < horizon]:
+                for row in self.days.pop(day):
+                    self.keys.discard(row_key(row))
+
+    def records(self, day, subject=None):
+        """Rows of a day: from memory inside the window, else from the store"""
+        if day < datetime.date.today() - datetime.timedelta(days=self.window_days):
+            return self.system.attendance_store.read(format_date(day), subject=subject)
+        with self.lock:
+            rows = list(self.days.get(day, []))
+        if subject and subject != "All":
+            rows = [r for r in rows if r[3] == subject]
+        return rows
+
+    def student_summary(self, prn):
+        with self.lock:
+            student = self.students.get(prn)
+            if student is None:
+                return {'records': 0, 'subjects': {}, 'first_seen': None, 'last_seen': None}
+            return {
+                'name': student['name'],
+                'records': student['records'],
+                'subjects': dict(student['subjects']),
+                'first_seen': f"{format_date(student['first_seen'][0])} {student['first_seen'][1]}",
+                'last_seen': f"{format_date(student['last_seen'][0])} {student['last_seen'][1]}"
+            }
+
+
+def record_json(row):
+    return {'prn': row[0], 'name': f"{row[1]} {row[2]}".strip(), 'subject': row[3], 'faculty': row[4],
+            'date': row[5], 'time': row[6], 'department': row[7], 'year': row[8]}
+
+
+class PooledHTTPServer(HTTPServer):
+    """HTTPServer that hands each connection to a fixed pool of threads"""
+
+    def __init__(self, address, handler, workers=4):
+        super().__init__(address, handler)
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='status-api')
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=False)
+
+
+class StatusRequestHandler(BaseHTTPRequestHandler):
+    """Routes GET requests to the StatusServer and answers conditional requests"""
+
+    protocol_version = 'HTTP/1.1'
+    # Idle keep-alive connections give their pool thread back after this many seconds
+    timeout = 5
+
+    def do_GET(self):
+        api = self.server.api
+        api.requests += 1
+        url = urlsplit(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            status, etag, build = api.route(url.path.rstrip('/') or '/', query)
+        except ValueError as e:
+            message = str(e)
+            status, etag, build = 400, None, lambda: {'error': message}
+        if self.not_modified(etag):
+            return
+        body = json.dumps(build(), default=str).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-cache')
+        if etag is not None:
+            self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def not_modified(self, etag):
+        """Answer 304 if the client already has this version"""
+        if etag is None or etag not in self.headers.get('If-None-Match', ''):
+            return False
+        self.server.api.not_modified += 1
+        self.send_response(304)
+        self.send_header('ETag', etag)
+        self.end_headers()
+        return True
+
+    def log_message(self, format, *args):
+        # Polling dashboards would flood the console; errors still go through log_error
+        pass
+
+    def log_error(self, format, *args):
+        print(f"Error in status API: {format % args}")
+
+
+class StatusServer:
+    """Embedded JSON status API over an AttendanceIndex"""
+
+    def __init__(self, attendance_system, host=API_HOST, port=API_PORT, workers=4):
+        self.system = attendance_system
+        self.index = AttendanceIndex(attendance_system)
+        self.httpd = PooledHTTPServer((host, port), StatusRequestHandler, workers)
+        self.httpd.api = self
+        self.address = self.httpd.server_address
+        self.thread = None
+        self.stopped = threading.Event()
+        self.requests = 0
+        self.not_modified = 0
+        self.registry = (None, {})
+        if host not in ('127.0.0.1', 'localhost', '::1'):
+            print(f"Warning: the status API has no authentication and is listening on {host}")
+
+    def start(self):
+        """Load the index and serve on a background thread"""
+        self.thread = threading.Thread(target=self.serve_forever, name='status-api', daemon=True)
+        self.thread.start()
+        return self
+
+    def serve_forever(self):
+        try:
+            self.index.load()
+        except Exception as e:
+            print(f"Error loading the attendance index: {e}")
+        print(f"Status API listening on http://{self.address[0]}:{self.address[1]}")
+        maintenance = threading.Thread(target=self._maintain, name='status-api-index', daemon=True)
+        maintenance.start()
+        self.httpd.serve_forever(poll_interval=0.5)
+
+    def _maintain(self):
+        while not self.stopped.wait(self.index.check_interval):
+            try:
+                self.index.check_partition()
+            except Exception as e:
+                print(f"Error refreshing the attendance index: {e}")
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.httpd.shutdown()
+            self.thread.join(timeout=5)
+            self.thread = None
+        self.httpd.server_close()
+        self.system.events.unsubscribe(self.index.subscription)
+
+    def etag(self, name, *parts):
+        return f'"{name}-{self.index.version}' + ''.join(f'-{p}' for p in parts) + '"'
+
+    def route(self, path, query):
+        """(status, etag, body builder) for a request; bodies are only built when they will be sent"""
+        if not self.index.loaded and path != '/metrics':
+            return 503, None, lambda: {'error': "The attendance index is still loading"}
+        if path in ('/', '/status'):
+            return 200, self.etag('status'), self.status
+        if path == '/session':
+            return 200, self.etag('session'), self.session
+        if path == '/attendance':
+            day = parse_date(query['date']) if 'date' in query else datetime.date.today()
+            if day is None:
+                raise ValueError("date must be dd-mm-yyyy")
+            subject = query.get('subject')
+            return 200, self.etag('attendance', format_date(day).replace('/', ''), hashlib.sha1(
+                str(subject).encode()).hexdigest()[:8]), lambda: self.attendance(day, subject)
+        if path == '/students':
+            return 200, self.etag('students', self.registry_version()), self.students
+        if path.startswith('/students/'):
+            prn = unquote(path[len('/students/'):])
+            if prn not in self.registered() and prn not in self.index.students:
+                return 404, None, lambda: {'error': f"No student with PRN {prn}"}
+            return 200, self.etag('student', self.registry_version()), lambda: self.student(prn)
+        if path == '/metrics':
+            # Live counters have no version; their content is the validator
+            metrics = self.metrics()
+            digest = hashlib.sha1(json.dumps(metrics, sort_keys=True, default=str).encode()).hexdigest()[:16]
+            return 200, f'"metrics-{digest}"', lambda: {**metrics, 'api': self.get_stats()}
+        return 404, None, lambda: {'error': f"Unknown path {path}"}
+
+    def registry_version(self):
+        self.system.student_index.refresh()
+        signature = self.system.student_index.signature
+        return hashlib.sha1(repr(signature).encode()).hexdigest()[:8]
+
+    def registered(self):
+        """Registry rows by PRN, rebuilt only when the registry file has changed"""
+        by_serial = self.system.student_index.refresh()
+        if self.registry[0] is not by_serial:
+            self.registry = (by_serial, {student_key(info, serial): info for serial, info in by_serial.items()})
+        return self.registry[1]
+
+    def status(self):
+        system = self.system
+        session = system.current_session
+        today = self.index.records(datetime.date.today())
+        return {
+            'active': system.is_attendance_active,
+            'session': None if not session else {
+                'subject': session['subject'], 'faculty': session['faculty'],
+                'date': session['date'], 'time': session['time'],
+                'started': session['start_time'].strftime('%d/%m/%Y %H:%M:%S'),
+                **{key: value for key, value in session['roster'].get_stats().items() if key != 'cohort'}
+            },
+            'today': {'records': len(today), 'students': len({r[0] for r in today}),
+                      'subjects': sorted({r[3] for r in today})},
+            'predictor': type(system.predictor).__name__ if system.predictor is not None else None,
+            'version': self.index.version
+        }
+
+    def session(self):
+        session = self.system.current_session
+        if not session:
+            return {'active': False}
+        roster = session['roster']
+        return {
+            'active': self.system.is_attendance_active,
+            'subject': session['subject'], 'faculty': session['faculty'],
+            'date': session['date'], 'time': session['time'],
+            **roster.get_stats(),
+            'absentees': [{'prn': s.get('PRN', s.get('ID', '')),
+                           'name': f"{s.get('First Name', s.get('NAME', ''))} {s.get('Last Name', '')}".strip()}
+                          for s in roster.absentees()]
+        }
+
+    def attendance(self, day, subject):
+        rows = self.index.records(day, subject)
+        return {'date': format_date(day), 'subject': subject or 'All', 'count': len(rows),
+                'records': [record_json(r) for r in rows]}
+
+    def student(self, prn):
+        info = self.registered().get(prn)
+        summary = self.index.student_summary(prn)
+        if info is None and not summary['records']:
+            return None
+        today = [r for r in self.index.records(datetime.date.today()) if r[0] == prn]
+        session = self.system.current_session
+        return {
+            'prn': prn,
+            'name': (f"{info.get('First Name', info.get('NAME', ''))} {info.get('Last Name', '')}".strip()
+                     if info else summary.get('name', '')),
+            'department': info.get('Department', '') if info else '',
+            'year': info.get('Year', '') if info else '',
+            'registered': info is not None,
+            **{key: value for key, value in summary.items() if key != 'name'},
+            'today': [{'subject': r[3], 'time': r[6]} for r in today],
+            'in_current_session': bool(session and prn in session['roster'].attended)
+        }
+
+    def students(self):
+        registered = self.registered()
+        prns = sorted(set(registered) | set(self.index.students))
+        return {'count': len(prns), 'students': [
+            {'prn': prn, 'registered': prn in registered, **self.index.student_summary(prn)} for prn in prns]}
+
+    def metrics(self):
+        system = self.system
+        return {
+            'frame_budget': system.frame_scheduler.get_stats(),
+            'motion_gate': system.motion_gate.get_stats(),
+            'recognition': system.recognition_pool.get_stats(),
+            'recognition_cache': system.recognition_cache.get_stats(),
+            'preview': system.preview.get_stats() if system.preview else None,
+            'gallery': system.gallery.get_stats() if system.gallery is not None else None,
+            'event_bus': system.events.get_stats(),
+            **system.event_metrics.get_stats()
+        }
+
+    def get_stats(self):
+        return {
+            'address': f"{self.address[0]}:{self.address[1]}",
+            'requests': self.requests,
+            'not_modified': self.not_modified,
+            'index_version': self.index.version,
+            'index_loaded': self.index.loaded,
+            'students_indexed': len(self.index.students),
+            'days_in_memory': len(self.index.days)
+        }
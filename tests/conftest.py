@@ -0,0 +1,14 @@
+import os
+import sys
+
+import pytest
+
+# The application is a set of flat modules next to main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Run in an empty directory; the modules use paths relative to the working directory"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
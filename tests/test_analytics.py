@@ -0,0 +1,84 @@
+import csv
+import os
+
+import pytest
+
+import analytics
+from analytics import AttendanceAnalytics, COLUMNS
+
+
+@pytest.fixture
+def attendance(workdir, monkeypatch):
+    monkeypatch.setenv('ATTENDANCE_CACHE_DIR', str(workdir / "cache"))
+    os.makedirs("Attendance")
+    return workdir
+
+
+def append_rows(path, rows):
+    new = not os.path.exists(path)
+    with open(path, 'a', newline='') as file:
+        writer = csv.writer(file)
+        if new:
+            writer.writerow(COLUMNS)
+        writer.writerows(rows)
+
+
+def row(prn, date='01/02/2025', subject='Maths'):
+    return [prn, 'First', 'Last', subject, 'Dr X', date, '10:00', 'CE', '2']
+
+
+def test_appended_rows_are_read_from_the_last_offset(attendance, monkeypatch):
+    path = "Attendance/Attendance_01_02_2025.csv"
+    append_rows(path, [row("P1"), row("P2")])
+    view = AttendanceAnalytics()
+    view.refresh()
+    offset = view.partials[path].offset
+    assert offset == os.path.getsize(path)
+
+    parsed = []
+    original = analytics.read_attendance_frame
+    monkeypatch.setattr(analytics, 'read_attendance_frame',
+                        lambda text, header: parsed.append(text) or original(text, header))
+    append_rows(path, [row("P3", subject='Physics')])
+    assert view.refresh_file(path, {}) == 'appended'
+    assert parsed == [",".join(row("P3", subject='Physics')) + "\r\n"]
+    assert view.refresh() == 0
+    assert view.get_summary()['totals']['records'] == 3
+
+
+def test_partly_written_line_waits_for_the_next_refresh(attendance):
+    path = "Attendance/Attendance_01_02_2025.csv"
+    append_rows(path, [row("P1")])
+    with open(path, 'a') as file:
+        file.write("P2,First,La")
+    view = AttendanceAnalytics()
+    view.refresh()
+    assert view.get_summary()['totals']['records'] == 1
+    with open(path, 'a') as file:
+        file.write("st,Maths,Dr X,01/02/2025,10:00,CE,2\r\n")
+    view.refresh()
+    assert view.get_summary()['totals']['records'] == 2
+
+
+def test_rewritten_file_is_read_again(attendance):
+    path = "Attendance/Attendance_01_02_2025.csv"
+    append_rows(path, [row("P1"), row("P2"), row("P3")])
+    view = AttendanceAnalytics()
+    view.refresh()
+    # Replaced by rename, as compaction does, with fewer rows
+    append_rows(path + ".new", [row("P1")])
+    os.replace(path + ".new", path)
+    assert view.refresh_file(path, {}) == 'rebuilt'
+    summary = view.get_summary()
+    assert summary['totals']['records'] == 1
+    assert view.totals.day_students == {'01/02/2025': {'P1'}}
+
+
+def test_cache_is_per_user_and_reloaded(attendance):
+    append_rows("Attendance/Attendance_01_02_2025.csv", [row("P1")])
+    AttendanceAnalytics().refresh()
+    assert os.listdir("Attendance") == ["Attendance_01_02_2025.csv"]
+    cached = AttendanceAnalytics()
+    assert cached.cache_file.startswith(str(attendance / "cache"))
+    assert cached.refresh() == 0
+    assert cached.get_summary()['totals']['records'] == 1
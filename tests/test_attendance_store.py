@@ -0,0 +1,126 @@
+import csv
+import datetime
+import json
+import os
+
+from attendance_store import AttendanceStore, COLUMNS, day_key
+
+
+def write_partition(store, date, rows, header=COLUMNS):
+    os.makedirs(store.root, exist_ok=True)
+    path = store.daily_path(date)
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(header)
+        writer.writerows(rows)
+    return path
+
+
+def row(prn, date, subject='Maths', time='10:00'):
+    return [prn, 'First', 'Last', subject, 'Dr X', date, time, 'CE', '2']
+
+
+def test_day_key_normalizes_dates():
+    assert day_key("1/2/2025") == "01/02/2025"
+    assert day_key("01-02-2025") == "01/02/2025"
+    assert day_key("not a date") is None
+
+
+def test_compact_moves_partitions_into_segment(workdir):
+    store = AttendanceStore()
+    first = write_partition(store, "01/02/2025", [row("P1", "01/02/2025"), row("P2", "01/02/2025")])
+    second = write_partition(store, "02/02/2025", [row("P1", "02/02/2025", 'Physics')])
+
+    assert store.compact(before="01/03/2025") == 2
+    assert not os.path.exists(first) and not os.path.exists(second)
+    entry = store.load_manifest()['segments']['2025-02']
+    assert entry['rows'] == 3
+    assert set(entry['days']) == {"01/02/2025", "02/02/2025"}
+
+    assert [r[0] for r in store.read("01/02/2025")] == ["P1", "P2"]
+    assert store.read("02/02/2025") == [row("P1", "02/02/2025", 'Physics')]
+    assert len(store.read("01/02/2025", "28/02/2025")) == 3
+    assert len(store.read("01/02/2025", "28/02/2025", subject='Physics')) == 1
+
+
+def test_compact_keeps_today(workdir):
+    store = AttendanceStore()
+    today = datetime.date.today().strftime('%d/%m/%Y')
+    path = write_partition(store, today, [row("P1", today)])
+    assert store.compact() == 0
+    assert os.path.exists(path)
+    assert store.read(today) == [row("P1", today)]
+
+
+def test_read_returns_rows_in_segment_and_partition_once(workdir):
+    store = AttendanceStore()
+    write_partition(store, "01/02/2025", [row("P1", "01/02/2025")])
+    store.compact(before="01/03/2025")
+    # A crash between writing the segment and removing the partition leaves both
+    write_partition(store, "01/02/2025", [row("P1", "01/02/2025"), row("P2", "01/02/2025")])
+    assert sorted(r[0] for r in store.read("01/02/2025")) == ["P1", "P2"]
+
+
+def test_compaction_is_repeatable(workdir):
+    store = AttendanceStore()
+    write_partition(store, "01/02/2025", [row("P1", "01/02/2025")])
+    store.compact(before="01/03/2025")
+    write_partition(store, "01/02/2025", [row("P1", "01/02/2025"), row("P2", "01/02/2025")])
+    store.compact(before="01/03/2025")
+    assert store.load_manifest()['segments']['2025-02']['rows'] == 2
+
+
+def test_unpadded_dates_are_indexed_under_their_canonical_day(workdir):
+    store = AttendanceStore()
+    write_partition(store, "01/02/2025", [row("P1", "1/2/2025"), row("P2", "01/02/2025"),
+                                          row("P3", "garbage")])
+    store.compact(before="01/03/2025")
+    assert list(store.load_manifest()['segments']['2025-02']['days']) == ["01/02/2025"]
+    rows = store.read("01/02/2025")
+    assert sorted(r[0] for r in rows) == ["P1", "P2"]
+    assert {r[5] for r in rows} == {"01/02/2025"}
+
+
+def test_unreadable_manifest_keys_are_skipped(workdir):
+    store = AttendanceStore()
+    write_partition(store, "01/02/2025", [row("P1", "01/02/2025")])
+    store.compact(before="01/03/2025")
+    manifest = store.load_manifest()
+    manifest['segments']['2025-02']['days']['junk'] = [0, 10, 1]
+    with open(store.manifest_path, 'w') as file:
+        json.dump(manifest, file)
+    assert [r[0] for r in store.read("01/02/2025", "28/02/2025")] == ["P1"]
+
+
+def test_legacy_files_are_read_and_kept(workdir):
+    store = AttendanceStore()
+    write_partition(store, "01/02/2025", [["7", "Old Name", "01-02-2025", "09:00"]],
+                    header=['Id', 'Name', 'Date', 'Time'])
+    assert store.read("01/02/2025")[0][:2] == ["7", "Old Name"]
+    store.compact(before="01/03/2025")
+    assert os.listdir(store.legacy_dir) == ["Attendance_01_02_2025.csv"]
+    assert store.read("01/02/2025")[0][5] == "01/02/2025"
+
+
+def test_rebuild_manifest(workdir):
+    store = AttendanceStore()
+    write_partition(store, "01/02/2025", [row("P1", "01/02/2025")])
+    write_partition(store, "03/03/2025", [row("P2", "03/03/2025")])
+    store.compact(before="01/04/2025")
+    os.remove(store.manifest_path)
+    assert store.read("01/02/2025") == []
+    assert store.rebuild_manifest() == 2
+    assert [r[0] for r in store.read("01/02/2025", "31/03/2025")] == ["P1", "P2"]
+
+
+def test_spans_hold_for_non_ascii_rows(workdir):
+    store = AttendanceStore()
+    rows = [['P1', 'Zoë', 'Müller', 'Maths', 'Dr X', '01/02/2025', '10:00', 'CE', '2'],
+            row("P2", "02/02/2025")]
+    write_partition(store, "01/02/2025", rows[:1])
+    write_partition(store, "02/02/2025", rows[1:])
+    store.compact(before="01/03/2025")
+    with open(store.segment_path('2025-02'), 'rb') as file:
+        assert b'\r\n' in file.read()
+    assert store.read("01/02/2025") == rows[:1]
+    assert store.read("02/02/2025") == rows[1:]
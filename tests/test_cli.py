@@ -0,0 +1,52 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import cli
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run(capsys, *argv):
+    code = cli.main(list(argv))
+    output = json.loads(capsys.readouterr().out)
+    assert output['command'] == argv[0] and output['ok'] == (code == 0)
+    return code, output['result']
+
+
+def test_success_exits_zero(workdir, capsys):
+    code, result = run(capsys, 'compact')
+    assert code == 0 and result == {'files_merged': 0, 'segments': {}}
+    code, result = run(capsys, 'rebuild-index')
+    assert code == 0 and result['next_serial'] == 1
+
+
+def test_failed_operation_exits_one(workdir, capsys):
+    code, result = run(capsys, 'recognize', 'missing.mp4')
+    assert code == 1 and result['message'].startswith("Error:")
+    code, result = run(capsys, 'train')
+    assert code == 1 and "No training images" in result['message']
+
+
+@pytest.mark.parametrize('argv', [[], ['bogus'], ['compact', '--before', 'someday'],
+                                  ['export', '--date', '31/02/2025'], ['train', '--max-memory-mb', 'lots']])
+def test_invalid_arguments_exit_two(workdir, capsys, argv):
+    with pytest.raises(SystemExit) as exit_info:
+        cli.main(argv)
+    assert exit_info.value.code == 2
+    assert capsys.readouterr().out == ''
+
+
+def test_dates_are_accepted_in_any_separator(workdir, capsys):
+    assert run(capsys, 'compact', '--before', '1-3-2025')[0] == 0
+
+
+def test_commands_do_not_load_tk(workdir):
+    script = ("import sys; sys.path.insert(0, %r); import cli; cli.main(['compact']); "
+              "print('tkinter' in sys.modules, file=sys.stderr)" % ROOT)
+    process = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, timeout=60)
+    assert process.returncode == 0
+    assert process.stderr.strip().endswith("False")
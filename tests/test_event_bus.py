@@ -0,0 +1,111 @@
+import threading
+import time
+
+import pytest
+
+from event_bus import EventBus, EventMetrics, Subscription, ATTENDANCE_RECORDED, SESSION_STARTED
+
+
+def test_handler_receives_events_in_order():
+    bus = EventBus()
+    received = []
+    subscription = bus.subscribe('writer', lambda event: received.append(event.data['n']))
+    for n in range(100):
+        bus.publish(ATTENDANCE_RECORDED, n=n)
+    subscription.flush()
+    assert received == list(range(100))
+    bus.close()
+
+
+def test_subscribers_only_get_their_types():
+    bus = EventBus()
+    poll = bus.subscribe('dashboard', types=(SESSION_STARTED,))
+    bus.publish(ATTENDANCE_RECORDED, n=1)
+    bus.publish(SESSION_STARTED, subject='Maths')
+    events = poll.drain()
+    assert [e.type for e in events] == [SESSION_STARTED]
+    assert events[0].to_dict()['subject'] == 'Maths'
+    assert bus.published == 2
+
+
+def test_drop_oldest_keeps_the_newest_events():
+    subscription = Subscription('display', maxsize=3, policy='drop_oldest')
+    bus = EventBus()
+    bus.subscriptions.append(subscription)
+    for n in range(10):
+        bus.publish(ATTENDANCE_RECORDED, n=n)
+    assert [e.data['n'] for e in subscription.drain()] == [7, 8, 9]
+    assert subscription.dropped == 7
+
+
+def test_block_policy_loses_nothing_under_a_slow_handler():
+    bus = EventBus()
+    received = []
+
+    def slow(event):
+        time.sleep(0.002)
+        received.append(event.data['n'])
+
+    subscription = bus.subscribe('writer', slow, maxsize=4, policy='block')
+    publishers = [threading.Thread(target=lambda start=start: [bus.publish(ATTENDANCE_RECORDED, n=n)
+                                                               for n in range(start, start + 50)])
+                  for start in (0, 50)]
+    for publisher in publishers:
+        publisher.start()
+    for publisher in publishers:
+        publisher.join()
+    subscription.flush()
+    assert sorted(received) == list(range(100))
+    assert subscription.dropped == 0
+    assert subscription.blocked_ms > 0
+    bus.close()
+
+
+def test_handler_errors_are_counted_and_delivery_continues():
+    bus = EventBus()
+    received = []
+
+    def handler(event):
+        if event.data['n'] == 1:
+            raise ValueError("bad event")
+        received.append(event.data['n'])
+
+    subscription = bus.subscribe('writer', handler)
+    for n in range(3):
+        bus.publish(ATTENDANCE_RECORDED, n=n)
+    subscription.flush()
+    assert received == [0, 2]
+    assert subscription.get_stats()['errors'] == 1
+    bus.close()
+
+
+def test_close_processes_queued_events_first():
+    bus = EventBus()
+    received = []
+    subscription = bus.subscribe('writer', lambda event: (time.sleep(0.001), received.append(event)))
+    for n in range(20):
+        bus.publish(ATTENDANCE_RECORDED, n=n)
+    bus.close()
+    assert len(received) == 20
+    assert subscription.thread is None
+    # Closed subscribers get nothing more
+    bus.subscriptions.append(subscription)
+    bus.publish(ATTENDANCE_RECORDED, n=99)
+    assert subscription.queue.qsize() == 0
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        Subscription('x', policy='drop_newest')
+
+
+def test_event_metrics_count_by_type():
+    bus = EventBus()
+    metrics = EventMetrics()
+    subscription = bus.subscribe('metrics', metrics.handle)
+    bus.publish(ATTENDANCE_RECORDED, n=1)
+    bus.publish(ATTENDANCE_RECORDED, n=2)
+    bus.publish(SESSION_STARTED)
+    subscription.flush()
+    assert metrics.get_stats()['events'] == {ATTENDANCE_RECORDED: 2, SESSION_STARTED: 1}
+    bus.close()
@@ -0,0 +1,121 @@
+import os
+
+import cv2
+import numpy as np
+
+from face_crops import FaceNormalizer, CropCache
+
+
+def face_image(path, value):
+    image = np.full((120, 90), value, dtype=np.uint8)
+    cv2.imwrite(path, image)
+    return image
+
+
+def test_crops_have_the_fixed_size():
+    normalizer = FaceNormalizer(size=50)
+    gray = np.random.default_rng(0).integers(0, 255, (240, 320), dtype=np.uint8)
+    for box in [(10, 10, 40, 40), (100, 50, 150, 90), (0, 0, 320, 240)]:
+        crop = normalizer.crop(gray, box)
+        assert crop.shape == (50, 50) and crop.dtype == np.uint8
+
+
+def test_region_is_padded_where_it_leaves_the_frame():
+    normalizer = FaceNormalizer(size=50)
+    gray = np.zeros((100, 100), dtype=np.uint8)
+    assert normalizer.region(gray, (80, 80, 40, 20)).shape == (40, 40)
+
+
+def test_size_none_passes_crops_through():
+    normalizer = FaceNormalizer(size=None)
+    gray = np.arange(100 * 100, dtype=np.uint32).reshape(100, 100).astype(np.uint8)
+    crop = normalizer.crop(gray, (10, 20, 30, 40))
+    assert crop.shape == (40, 30)
+    assert np.array_equal(crop, gray[20:60, 10:40])
+
+
+def test_crop_all_reuses_its_buffers():
+    normalizer = FaceNormalizer(size=32)
+    gray = np.random.default_rng(1).integers(0, 255, (200, 200), dtype=np.uint8)
+    first = normalizer.crop_all(gray, [(0, 0, 50, 50), (60, 60, 50, 50)])
+    second = normalizer.crop_all(gray, [(100, 100, 50, 50)])
+    assert np.shares_memory(first[0], second[0])
+
+
+def test_settings_round_trip(workdir):
+    normalizer = FaceNormalizer(size=64, equalize=False, margin=0.1)
+    normalizer.save("Normalization.json")
+    assert FaceNormalizer.for_model("Normalization.json").settings() == normalizer.settings()
+    assert FaceNormalizer.for_model("missing.json").size is None
+
+
+def test_cache_round_trip_and_invalidation(workdir):
+    normalizer = FaceNormalizer(size=40)
+    paths = [f"face_{n}.jpg" for n in range(3)]
+    crops = [normalizer.normalize(face_image(path, 50 * n)) for n, path in enumerate(paths)]
+
+    cache = CropCache(normalizer, "Cache")
+    for path, crop in zip(paths, crops):
+        assert cache.get(path) is None
+        cache.add(path, crop)
+    cache.flush()
+    assert cache.pending == []
+
+    cache = CropCache(normalizer, "Cache")
+    for path, crop in zip(paths, crops):
+        assert np.array_equal(cache.get(path), crop)
+    assert cache.hits == 3
+
+    # A changed image or other crop settings make the cached crop stale
+    stat = os.stat(paths[0])
+    os.utime(paths[0], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert cache.get(paths[0]) is None
+    assert CropCache(FaceNormalizer(size=40, equalize=False), "Cache").get(paths[1]) is None
+
+
+def test_cache_flush_appends_between_chunks(workdir):
+    normalizer = FaceNormalizer(size=20)
+    cache = CropCache(normalizer, "Cache")
+    for chunk in range(3):
+        for n in range(4):
+            path = f"face_{chunk}_{n}.jpg"
+            face_image(path, chunk * 10 + n)
+            cache.add(path, normalizer.normalize(cv2.imread(path, cv2.IMREAD_GRAYSCALE)))
+        cache.flush()
+        # Nothing is held in memory between chunks
+        assert cache.pending == []
+        assert cache.rows == 4 * (chunk + 1)
+    assert os.path.getsize("Cache.bin") == 12 * 20 * 20
+
+
+def test_cache_save_drops_images_no_longer_trained_on(workdir):
+    normalizer = FaceNormalizer(size=20)
+    cache = CropCache(normalizer, "Cache")
+    paths = [f"face_{n}.jpg" for n in range(6)]
+    for n, path in enumerate(paths):
+        cache.add(path, normalizer.normalize(face_image(path, n * 20)))
+    cache.flush()
+
+    cache.save(keep={paths[4], paths[5]})
+    assert cache.rows == 2
+    assert os.path.getsize("Cache.bin") == 2 * 20 * 20
+    assert cache.get(paths[0]) is None
+    assert np.array_equal(cache.get(paths[5]), normalizer.normalize(cv2.imread(paths[5], cv2.IMREAD_GRAYSCALE)))
+
+
+def test_compaction_leaves_mapped_readers_intact(workdir):
+    normalizer = FaceNormalizer(size=20)
+    writer = CropCache(normalizer, "Cache")
+    paths = [f"face_{n}.jpg" for n in range(6)]
+    crops = [normalizer.normalize(face_image(path, n * 20)) for n, path in enumerate(paths)]
+    for path, crop in zip(paths, crops):
+        writer.add(path, crop)
+    writer.flush()
+
+    reader = CropCache(normalizer, "Cache")
+    writer.save(keep={paths[5]})
+    assert os.path.getsize("Cache.bin") == 20 * 20
+    # The reader still maps the file it loaded, with every row where its index says
+    assert all(np.array_equal(reader.get(path), crop) for path, crop in zip(paths, crops))
+    assert np.array_equal(CropCache(normalizer, "Cache").get(paths[5]), crops[5])
+    assert sorted(os.listdir(".")) == sorted(paths + ["Cache.bin", "Cache.json"])
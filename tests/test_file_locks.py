@@ -0,0 +1,112 @@
+import multiprocessing
+import os
+import threading
+import time
+
+import pytest
+
+from file_locks import FileLock, SerialCounter, atomic_write, load_profile, save_profile
+
+
+def add_under_lock(path, times):
+    for _ in range(times):
+        with FileLock(path):
+            with open(path) as file:
+                value = int(file.read())
+            with open(path, 'w') as file:
+                file.write(str(value + 1))
+
+
+def allocate_serials(directory, times, results):
+    os.chdir(directory)
+    for _ in range(times):
+        with FileLock("registry.csv"):
+            results.put(SerialCounter("counter.txt").allocate(2))
+
+
+def test_lock_excludes_other_processes(workdir):
+    with open("count.txt", 'w') as file:
+        file.write("0")
+    processes = [multiprocessing.Process(target=add_under_lock, args=("count.txt", 50)) for _ in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    with open("count.txt") as file:
+        assert int(file.read()) == 200
+
+
+def test_lock_times_out(workdir):
+    with FileLock("data.csv"):
+        with pytest.raises(TimeoutError):
+            FileLock("data.csv", timeout=0.05).acquire()
+    with FileLock("data.csv", timeout=0.05):
+        pass
+
+
+def test_serial_counter_hands_out_each_serial_once(workdir):
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=allocate_serials, args=(str(workdir), 25, results))
+                 for _ in range(4)]
+    for process in processes:
+        process.start()
+    firsts = [results.get(timeout=30) for _ in range(100)]
+    for process in processes:
+        process.join()
+    serials = [first + n for first in firsts for n in range(2)]
+    assert sorted(serials) == list(range(1, 201))
+
+
+def test_serial_counter_starts_at_floor(workdir):
+    counter = SerialCounter("counter.txt")
+    assert counter.allocate(floor=41) == 41
+    assert counter.allocate(3, floor=41) == 42
+    assert counter.allocate() == 45
+
+
+def test_atomic_write_replaces_contents(workdir):
+    atomic_write("file.json", "first")
+    atomic_write("file.json", "second")
+    with open("file.json") as file:
+        assert file.read() == "second"
+    assert os.listdir(".") == ["file.json"]
+
+
+def test_atomic_write_keeps_line_endings_and_utf8(workdir):
+    atomic_write("file.csv", "Zoë,1\r\nAnn,2\n")
+    with open("file.csv", 'rb') as file:
+        assert file.read() == "Zoë,1\r\nAnn,2\n".encode('utf-8')
+
+
+def test_sidecar_is_removed_on_release(workdir):
+    with FileLock("data.csv"):
+        assert os.path.exists("data.csv.lock")
+    assert not os.path.exists("data.csv.lock")
+
+
+def test_waiter_relocks_a_sidecar_removed_by_the_holder(workdir):
+    holder = FileLock("data.csv")
+    holder.acquire()
+    waiter = FileLock("data.csv")
+    acquired = threading.Event()
+    thread = threading.Thread(target=lambda: (waiter.acquire(), acquired.set()))
+    thread.start()
+    # Let the waiter open the sidecar the holder is about to remove
+    time.sleep(0.1)
+    holder.release()
+    assert acquired.wait(5)
+    with pytest.raises(TimeoutError):
+        FileLock("data.csv", timeout=0.05).acquire()
+    waiter.release()
+    thread.join()
+
+
+def test_profiles_keep_each_other(workdir):
+    assert load_profile(0, "Calibration/Profiles.json") is None
+    save_profile(0, {'capture': {'fps': 30}}, "Calibration/Profiles.json")
+    save_profile("room-101", {'capture': {'fps': 60}}, "Calibration/Profiles.json")
+    assert load_profile("0", "Calibration/Profiles.json") == {'capture': {'fps': 30}}
+    assert load_profile("room-101", "Calibration/Profiles.json") == {'capture': {'fps': 60}}
+    with open("Calibration/Profiles.json", 'w') as file:
+        file.write("[1, 2]")
+    assert load_profile(0, "Calibration/Profiles.json") is None
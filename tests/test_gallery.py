@@ -0,0 +1,81 @@
+import cv2
+import numpy as np
+import pytest
+
+from gallery import QuantizedGallery, lbph_histogram
+
+
+def noisy(face, rng, amount=25):
+    return np.clip(face.astype(int) + rng.integers(-amount, amount, face.shape), 0, 255).astype(np.uint8)
+
+
+@pytest.fixture(scope='module')
+def trained():
+    """An LBPH model of 8 students with 4 samples each, and fresh queries of every student"""
+    rng = np.random.default_rng(0)
+    faces = [cv2.GaussianBlur(rng.integers(0, 255, (48, 48), dtype=np.uint8), (5, 5), 0) for _ in range(8)]
+    images, labels = [], []
+    for label, face in enumerate(faces, 1):
+        for _ in range(4):
+            images.append(noisy(face, rng))
+            labels.append(label)
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    recognizer.train(images, np.array(labels))
+    queries = [(label, noisy(face, rng)) for label, face in enumerate(faces, 1) for _ in range(2)]
+    return recognizer, images, queries
+
+
+def test_histograms_match_opencv(trained):
+    recognizer, images, _ = trained
+    for image, histogram in zip(images[:4], recognizer.getHistograms()):
+        assert np.allclose(lbph_histogram(image), histogram.ravel(), atol=1e-6)
+
+
+@pytest.mark.parametrize('dtype, tolerance', [('float32', 1e-4), ('float16', 1e-2), ('uint8', 5e-2)])
+@pytest.mark.parametrize('shortlist', [None, 3])
+def test_predictions_match_opencv(trained, dtype, tolerance, shortlist):
+    recognizer, _, queries = trained
+    gallery = QuantizedGallery.from_recognizer(recognizer, dtype=dtype)
+    gallery.shortlist = shortlist
+    for label, query in queries:
+        expected_label, expected_confidence = recognizer.predict(query)
+        predicted_label, confidence = gallery.predict(query)
+        assert predicted_label == expected_label == label
+        assert confidence == pytest.approx(expected_confidence, rel=tolerance)
+
+
+def test_shortlist_searches_only_the_nearest_students(trained):
+    recognizer, _, queries = trained
+    gallery = QuantizedGallery.from_recognizer(recognizer, dtype='float32')
+    gallery.shortlist = 3
+    label, query = queries[0]
+    candidates = gallery.candidates(lbph_histogram(query))
+    assert len(candidates) == 3 * 4
+    assert label in set(gallery.labels[candidates])
+    gallery.shortlist = 8
+    assert gallery.candidates(lbph_histogram(query)) is None
+
+
+def test_quantized_storage_is_smaller(trained):
+    recognizer, _, _ = trained
+    sizes = {dtype: QuantizedGallery.from_recognizer(recognizer, dtype=dtype).data.nbytes
+             for dtype in ('float32', 'float16', 'uint8')}
+    assert sizes['float16'] * 2 == sizes['float32'] == sizes['uint8'] * 4
+
+
+def test_medoids_keep_k_samples_per_student(trained):
+    recognizer, _, queries = trained
+    gallery = QuantizedGallery.from_recognizer(recognizer, dtype='uint8')
+    assert gallery.reduce_to_medoids(2) == 16
+    assert all(np.sum(gallery.labels == label) == 2 for label in range(1, 9))
+    assert all(gallery.predict(query)[0] == label for label, query in queries)
+
+
+def test_save_and_load(trained, tmp_path):
+    recognizer, _, queries = trained
+    gallery = QuantizedGallery.from_recognizer(recognizer, dtype='uint8')
+    gallery.save(str(tmp_path / "Gallery.npz"))
+    loaded = QuantizedGallery.load(str(tmp_path / "Gallery.npz"), shortlist=3)
+    assert loaded.get_stats()['samples'] == 32
+    for _, query in queries:
+        assert loaded.predict(query) == pytest.approx(gallery.predict(query), rel=1e-5)
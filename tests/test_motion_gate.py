@@ -0,0 +1,47 @@
+import numpy as np
+
+from frame_pipeline import MotionGate
+
+
+def scene(seed=0):
+    return np.random.default_rng(seed).integers(0, 255, (240, 320), dtype=np.uint8)
+
+
+def test_static_frames_are_skipped():
+    gate = MotionGate()
+    frame = scene()
+    assert gate.should_process(frame, 0.0)
+    for n in range(1, 10):
+        assert not gate.should_process(frame.copy(), n * 0.1)
+    stats = gate.get_stats()
+    assert stats['frames_scanned'] == 1 and stats['frames_skipped'] == 9
+
+
+def test_motion_is_processed():
+    gate = MotionGate()
+    frame = scene()
+    assert gate.should_process(frame, 0.0)
+    moved = frame.copy()
+    # A bright object entering one corner of the frame
+    moved[:80, :80] = 255
+    assert gate.should_process(moved, 0.1)
+    assert not gate.should_process(moved.copy(), 0.2)
+
+
+def test_static_scene_is_rescanned_after_force_interval():
+    gate = MotionGate(force_interval=2.0)
+    frame = scene()
+    assert gate.should_process(frame, 0.0)
+    assert not gate.should_process(frame, 1.9)
+    assert gate.should_process(frame, 2.0)
+    assert not gate.should_process(frame, 3.0)
+    assert gate.should_process(frame, 4.0)
+
+
+def test_reset_and_new_resolution_force_a_scan():
+    gate = MotionGate()
+    frame = scene()
+    gate.should_process(frame, 0.0)
+    gate.reset()
+    assert gate.should_process(frame, 0.1)
+    assert gate.should_process(scene()[:120, :160], 0.2)
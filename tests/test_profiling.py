@@ -0,0 +1,49 @@
+import os
+import threading
+
+from profiling import Profiler
+
+
+def test_start_request_waits_for_the_thread_that_may_own_it(workdir):
+    profiler = Profiler(modes=('cprofile',))
+    profiler.request_start()
+    # The Tk loop ticks while a session runs: the request is left for the session
+    profiler.tick(can_start=False)
+    assert not profiler.active and profiler.requested is True
+
+    owners = []
+
+    def session():
+        profiler.tick()
+        owners.append(profiler.profile_thread)
+        profiler.release_thread()
+
+    thread = threading.Thread(target=session, name='attendance-session')
+    thread.start()
+    thread.join()
+    assert owners[0].name == 'attendance-session'
+    assert profiler.active and profiler.requested is None
+
+
+def test_stop_from_another_thread_is_written_by_the_owner(workdir):
+    profiler = Profiler(modes=('cprofile',), output_dir="Profiles")
+    ticking = threading.Event()
+    stopped = threading.Event()
+
+    def session():
+        profiler.request_start()
+        profiler.tick()
+        ticking.set()
+        stopped.wait(5)
+        profiler.tick()
+
+    thread = threading.Thread(target=session)
+    thread.start()
+    ticking.wait(5)
+    profiler.request_stop()
+    outputs = profiler.tick(can_start=False)
+    # Only the session thread can disable its cProfile capture
+    assert not os.path.exists(outputs[0])
+    stopped.set()
+    thread.join()
+    assert os.path.exists(outputs[0])
@@ -0,0 +1,46 @@
+import numpy as np
+
+import frame_pipeline
+from frame_pipeline import RecognitionCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_near_identical_crops_hit(monkeypatch):
+    cache = RecognitionCache()
+    crop = np.random.default_rng(0).integers(0, 255, (100, 100), dtype=np.uint8)
+    cache.store(cache.fingerprint(crop), (7, 30.0))
+    noisy = np.clip(crop.astype(int) + 1, 0, 255).astype(np.uint8)
+    assert cache.lookup(cache.fingerprint(noisy)) == (7, 30.0)
+    other = np.random.default_rng(1).integers(0, 255, (100, 100), dtype=np.uint8)
+    assert cache.lookup(cache.fingerprint(other)) is None
+    assert cache.get_stats()['hits'] == 1 and cache.get_stats()['misses'] == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = RecognitionCache(capacity=2, max_distance=0)
+    cache.store(0b0001, (1, 10.0))
+    cache.store(0b0010, (2, 10.0))
+    assert cache.lookup(0b0001) == (1, 10.0)
+    cache.store(0b0100, (3, 10.0))
+    assert cache.lookup(0b0010) is None
+    assert cache.lookup(0b0001) == (1, 10.0)
+    assert cache.lookup(0b0100) == (3, 10.0)
+
+
+def test_entries_expire(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(frame_pipeline.time, 'monotonic', clock)
+    cache = RecognitionCache(ttl=2.0, max_distance=0)
+    cache.store(1, (1, 10.0))
+    clock.now += 1.5
+    assert cache.lookup(1) == (1, 10.0)
+    clock.now += 1.0
+    assert cache.lookup(1) is None
+    assert cache.get_stats()['expired'] == 1 and cache.get_stats()['size'] == 0
@@ -0,0 +1,91 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from frame_pipeline import RecognitionPool
+from recognition_service import RecognitionClient, RecognitionServer
+
+
+class MeanPredictor:
+    """Labels a crop with its mean grey level"""
+
+    def predict(self, gray):
+        return int(gray.mean()), float(gray.shape[0])
+
+
+class FakeSystem:
+    def __init__(self):
+        self.recognition_pool = RecognitionPool(2)
+        self.predictor = MeanPredictor()
+
+
+@pytest.fixture
+def serve(workdir):
+    servers = []
+
+    def start(**options):
+        server = RecognitionServer(FakeSystem(), str(workdir / "recognition.sock"), reload_interval=3600, **options)
+        server.bind()
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+def crop(value, size=20):
+    return np.full((size, size), value, dtype=np.uint8)
+
+
+def test_concurrent_requests_share_a_batch(serve):
+    server = serve(batch_window=0.5)
+    results = {}
+    barrier = threading.Barrier(4)
+
+    def client(n):
+        connection = RecognitionClient(server.socket_path)
+        barrier.wait()
+        results[n] = connection.predict_many([crop(n * 10), crop(n * 10 + 1, size=30)])
+        connection.close()
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Every client gets its own crops' predictions back, in order
+    assert results == {n: [(n * 10, 20.0), (n * 10 + 1, 30.0)] for n in range(4)}
+    stats = server.get_stats()
+    assert stats['requests'] == 4 and stats['crops'] == 8
+    assert stats['batches'] < 4 and stats['largest_batch'] > 2
+
+
+def test_full_batch_runs_without_waiting_out_the_window(serve):
+    server = serve(batch_window=5.0, max_batch=2)
+    connection = RecognitionClient(server.socket_path)
+    started = time.monotonic()
+    assert connection.predict_many([crop(1), crop(2)]) == [(1, 20.0), (2, 20.0)]
+    assert connection.predict_many([crop(3, size=10), crop(4)]) == [(3, 10.0), (4, 20.0)]
+    assert time.monotonic() - started < 2.0
+    assert connection.get_stats()['batches'] == 2
+    connection.close()
+
+
+def test_unknown_operation_is_an_error(serve):
+    server = serve()
+    connection = RecognitionClient(server.socket_path)
+    assert 'error' in connection.request({'op': 'train'})
+    connection.close()
+
+
+def test_client_falls_back_to_the_local_model(workdir):
+    connection = RecognitionClient(str(workdir / "missing.sock"), fallback=MeanPredictor)
+    assert connection.predict_many([crop(7)]) == [(7, 20.0)]
+    assert isinstance(connection.local, MeanPredictor)
+    with pytest.raises(ConnectionError):
+        RecognitionClient(str(workdir / "missing.sock")).predict(crop(7))
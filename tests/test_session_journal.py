@@ -0,0 +1,102 @@
+import json
+import os
+import threading
+
+import pytest
+
+from session_journal import SessionJournal
+
+
+def row(prn, time='10:00'):
+    return [prn, 'First', 'Last', 'Maths', 'Dr X', '01/02/2025', time, 'CE', '2']
+
+
+def test_session_path_ignores_start_time(workdir):
+    path = SessionJournal.session_path("Sessions", "Data Structures", "01/02/2025")
+    assert path == os.path.join("Sessions", "Session_01_02_2025_Data_Structures.journal")
+
+
+def test_group_commit_writes_every_event(workdir):
+    journal = SessionJournal("s.journal", commit_interval=0.05, batch_size=8)
+    journal.open({'subject': 'Maths'})
+
+    def mark(start):
+        for n in range(start, start + 50):
+            journal.record_attendance(f"P{n}", row(f"P{n}"))
+
+    threads = [threading.Thread(target=mark, args=(n * 50,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    journal.close()
+
+    with open("s.journal") as file:
+        events = [json.loads(line) for line in file]
+    assert events[0]['type'] == 'session_start'
+    assert sorted(e['student_id'] for e in events if e['type'] == 'attendance') == \
+        sorted(f"P{n}" for n in range(200))
+    # Batched: far fewer fsyncs than events
+    assert journal.commits < len(events)
+
+
+def test_record_attendance_marks_each_student_once(workdir):
+    journal = SessionJournal("s.journal")
+    journal.open()
+    assert journal.record_attendance("P1", row("P1"))
+    assert not journal.record_attendance("P1", row("P1", '10:05'))
+    journal.close()
+    assert journal.rows == [row("P1")]
+
+
+def test_recognitions_are_throttled(workdir):
+    journal = SessionJournal("s.journal", recognition_interval=60)
+    journal.open()
+    for _ in range(5):
+        journal.record_recognition("P1", 30.0)
+    journal.close()
+    with open("s.journal") as file:
+        assert sum(json.loads(line)['type'] == 'recognized' for line in file) == 1
+
+
+def test_reopen_replays_marked_students(workdir):
+    first = SessionJournal("s.journal")
+    first.open({'subject': 'Maths'})
+    first.record_attendance("P1", row("P1"))
+    first.record_attendance("P2", row("P2"))
+    first.close()
+    # A crash can leave a partially written line behind
+    with open("s.journal", 'a') as file:
+        file.write('{"type": "attendance", "student_id": "P3"')
+
+    second = SessionJournal("s.journal")
+    assert second.open({'subject': 'Maths'}) is True
+    assert second.attended == {"P1", "P2"}
+    assert not second.record_attendance("P1", row("P1"))
+    second.close()
+
+
+def test_open_journal_is_claimed(workdir):
+    journal = SessionJournal("s.journal")
+    journal.open()
+    assert SessionJournal.claim("s.journal") is None
+    with pytest.raises(RuntimeError):
+        SessionJournal("s.journal").open()
+    journal.close()
+
+    owner = SessionJournal.claim("s.journal")
+    assert owner is not None
+    owner.release()
+
+
+def test_compact_hands_over_rows_and_removes_journal(workdir):
+    journal = SessionJournal("s.journal")
+    journal.open()
+    journal.record_attendance("P1", row("P1"))
+    written = []
+    journal.compact(written.extend)
+    assert written == [row("P1")]
+    assert not os.path.exists("s.journal")
+    owner = SessionJournal.claim("s.journal")
+    assert owner is not None
+    owner.release()
@@ -0,0 +1,73 @@
+import csv
+
+from session_roster import SessionRoster, StudentIndex, load_subject_cohorts, resolve_cohort
+
+HEADER = ['Serial', 'PRN', 'First Name', 'Last Name', 'Department', 'Year', 'Semester']
+
+
+def write_registry(rows, path="StudentDetails.csv"):
+    with open(path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(HEADER)
+        writer.writerows(rows)
+
+
+STUDENTS = [
+    [1, 'P1', 'Ann', 'A', 'Computer Engineering', '2', '3'],
+    [2, 'P2', 'Bob', 'B', 'Computer Engineering', '2', '3'],
+    [3, 'P3', 'Cy', 'C', 'computer engineering ', '2', '3'],
+    [4, 'P4', 'Di', 'D', 'Mechanical', '2', '3'],
+]
+
+
+def test_index_reloads_only_when_the_registry_changes(workdir):
+    write_registry(STUDENTS)
+    index = StudentIndex("StudentDetails.csv")
+    first = index.refresh()
+    assert first[2]['PRN'] == 'P2'
+    assert index.refresh() is first
+    write_registry(STUDENTS + [[5, 'P5', 'Ed', 'E', 'Mechanical', '1', '1']])
+    assert index.get('5')['First Name'] == 'Ed'
+
+
+def test_rows_with_invalid_serials_are_skipped(workdir):
+    write_registry(STUDENTS[:1] + [['x', 'PX', 'Bad', 'Row', '', '', '']])
+    index = StudentIndex("StudentDetails.csv")
+    assert list(index.refresh()) == [1]
+    assert index.refresh() is index.by_serial
+
+
+def test_missing_registry_is_empty(workdir):
+    assert StudentIndex("missing.csv").refresh() == {}
+
+
+def test_roster_counts_expected_and_unexpected_attendance(workdir):
+    write_registry(STUDENTS)
+    roster = SessionRoster(StudentIndex("StudentDetails.csv").refresh(),
+                           {'Department': 'Computer Engineering', 'Year': '2'})
+    assert set(roster.expected) == {'P1', 'P2', 'P3'}
+    assert roster.mark('P1') and not roster.mark('P1')
+    assert roster.mark('P4')
+    assert [row['PRN'] for row in roster.absentees()] == ['P2', 'P3']
+    assert roster.unexpected() == ['P4']
+    assert roster.get_stats() == {'cohort': {'Department': 'Computer Engineering', 'Year': '2'},
+                                  'expected': 3, 'attended': 1, 'unexpected': 1, 'absent': 2,
+                                  'attendance_rate': 33.3}
+    assert roster.lookup('4')['PRN'] == 'P4'
+
+
+def test_roster_without_cohort_expects_everyone(workdir):
+    write_registry(STUDENTS)
+    roster = SessionRoster(StudentIndex("StudentDetails.csv").refresh())
+    assert len(roster.expected) == 4 and roster.rate == 0
+
+
+def test_explicit_cohort_values_override_the_subject_mapping(workdir):
+    with open("SubjectCohorts.csv", 'w', newline='') as file:
+        file.write("Subject,Department,Year,Semester\nData Structures,Computer Engineering,2,3\n")
+    cohorts = load_subject_cohorts("SubjectCohorts.csv")
+    assert resolve_cohort('Data Structures', cohorts=cohorts) == {
+        'Department': 'Computer Engineering', 'Year': '2', 'Semester': '3'}
+    assert resolve_cohort('Data Structures', year=1, cohorts=cohorts)['Year'] == '1'
+    assert resolve_cohort('Unknown', cohorts=cohorts) == {}
+    assert load_subject_cohorts("StudentDetails/SubjectCohorts.csv") == {}
@@ -0,0 +1,87 @@
+import csv
+import datetime
+import http.client
+import json
+import time
+
+import pytest
+
+from core_logic import AttendanceSystem
+from event_bus import ATTENDANCE_RECORDED
+from status_api import StatusServer, api_address
+
+
+@pytest.fixture
+def api(workdir):
+    system = AttendanceSystem(interactive=False, load_model=False, background_compaction=False, status_api=False)
+    with open("StudentDetails/StudentDetails.csv", 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['Serial', 'PRN', 'First Name', 'Last Name', 'Department', 'Year'])
+        writer.writerow([1, 'P1', 'Ann', 'A', 'CE', '2'])
+    server = StatusServer(system, '127.0.0.1', 0).start()
+    deadline = time.monotonic() + 5
+    while not server.index.loaded and time.monotonic() < deadline:
+        time.sleep(0.01)
+    yield server
+    server.stop()
+    system.events.close()
+
+
+def get(server, path, etag=None):
+    connection = http.client.HTTPConnection(*server.address, timeout=5)
+    connection.request('GET', path, headers={'If-None-Match': etag} if etag else {})
+    response = connection.getresponse()
+    body = response.read()
+    connection.close()
+    return response.status, response.getheader('ETag'), json.loads(body) if body else None
+
+
+def record(server, prn):
+    today = datetime.date.today().strftime('%d/%m/%Y')
+    server.system.events.publish(ATTENDANCE_RECORDED, row=[prn, 'Ann', 'A', 'Maths', 'Dr X', today, '10:00', 'CE', '2'])
+    server.index.subscription.flush()
+
+
+def test_unchanged_status_is_not_modified(api):
+    status, etag, body = get(api, '/status')
+    assert status == 200 and etag and body['today']['records'] == 0
+    assert get(api, '/status', etag) == (304, etag, None)
+
+    record(api, 'P1')
+    status, new_etag, body = get(api, '/status', etag)
+    assert status == 200 and new_etag != etag
+    assert body['today'] == {'records': 1, 'students': 1, 'subjects': ['Maths']}
+    assert api.get_stats()['not_modified'] == 1
+
+
+def test_student_etag_follows_the_registry(api):
+    assert get(api, '/students/P9')[0] == 404
+    status, etag, body = get(api, '/students/P1')
+    assert status == 200 and body['registered'] and body['records'] == 0
+    assert get(api, '/students/P1', etag)[0] == 304
+
+    time.sleep(0.01)
+    with open("StudentDetails/StudentDetails.csv", 'a', newline='') as file:
+        csv.writer(file).writerow([2, 'P2', 'Bob', 'B', 'CE', '2'])
+    status, new_etag, body = get(api, '/students/P1', etag)
+    assert status == 200 and new_etag != etag
+    assert get(api, '/students')[2]['count'] == 2
+
+
+def test_metrics_etag_ignores_the_api_counters(api):
+    status, etag, body = get(api, '/metrics')
+    assert status == 200 and 'api' in body
+    assert get(api, '/metrics', etag)[0] == 304
+
+
+def test_bad_query_is_rejected(api):
+    status, etag, body = get(api, '/attendance?date=yesterday')
+    assert status == 400 and etag is None and 'error' in body
+    assert get(api, '/nowhere')[0] == 404
+
+
+def test_api_address():
+    assert api_address('1') == ('127.0.0.1', 8765)
+    assert api_address('9000') == ('127.0.0.1', 9000)
+    assert api_address('0.0.0.0:9000') == ('0.0.0.0', 9000)
+    assert api_address('0') is None and api_address('') is None
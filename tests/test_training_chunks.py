@@ -0,0 +1,55 @@
+import os
+import shutil
+
+import cv2
+import numpy as np
+import pytest
+
+from core_logic import AttendanceSystem
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def system(workdir):
+    shutil.copy(os.path.join(ROOT, "haarcascade_frontalface_default.xml"), workdir)
+    os.makedirs("TrainingImage")
+    rng = np.random.default_rng(0)
+    for serial in range(1, 5):
+        face = rng.integers(0, 255, (60, 60), dtype=np.uint8)
+        for n in range(5):
+            noisy = np.clip(face.astype(int) + rng.integers(-20, 20, face.shape), 0, 255).astype(np.uint8)
+            cv2.imwrite(f"TrainingImage/s_x_{serial}_P{serial}_{n}.jpg", noisy)
+    return AttendanceSystem(interactive=False, face_size=32, background_compaction=False, status_api=False)
+
+
+def model_state(recognizer):
+    return recognizer.getLabels().ravel().tolist(), [h.copy() for h in recognizer.getHistograms()]
+
+
+def test_chunked_training_matches_one_shot(system):
+    paths = system.get_training_image_paths("TrainingImage")
+    # Three crops of 32x32 per chunk
+    assert system.train_in_chunks(paths, max_memory_mb=3 * 32 * 32 / 1024 / 1024) == 20
+    assert system.last_training_stats['chunks'] == 7
+    labels, histograms = model_state(system.recognizer)
+
+    one_shot = system.create_recognizer()
+    faces = [system.load_training_image(path, system.capture_normalizer) for path in paths]
+    one_shot.train([face for face, _ in faces], np.array([serial for _, serial in faces]))
+    expected_labels, expected_histograms = model_state(one_shot)
+
+    assert labels == expected_labels == [serial for serial in range(1, 5) for _ in range(5)]
+    assert all(np.array_equal(a, b) for a, b in zip(histograms, expected_histograms))
+
+
+def test_cached_crops_train_the_same_model(system):
+    paths = system.get_training_image_paths("TrainingImage")
+    system.train_in_chunks(paths)
+    first = model_state(system.recognizer)
+    system.recognizer = system.create_recognizer()
+    system.train_in_chunks(paths, max_memory_mb=4 * 32 * 32 / 1024 / 1024)
+    assert system.last_training_stats['cached_crops'] == 20
+    second = model_state(system.recognizer)
+    assert first[0] == second[0]
+    assert all(np.array_equal(a, b) for a, b in zip(first[1], second[1]))